@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from conftest import Benchmark
+
+from storcom.fake_server import serve, make_files
+
+_FILES = 20000
+_STORCOM = [sys.executable, '-c',
+            'from storcom.storage_commander import storcom; storcom(prog_name="storcom")']
+
+def bench_file_ls(benchmark: Benchmark, tmp_path: Path) -> None:
+    with serve(make_files(_FILES)) as server:
+        env = _get_env(tmp_path, server.url)
+        benchmark(lambda: _run([*_STORCOM, 'file', 'ls'], env), operations=_FILES)
+
+def bench_file_ll(benchmark: Benchmark, tmp_path: Path) -> None:
+    with serve(make_files(_FILES)) as server:
+        env = _get_env(tmp_path, server.url)
+        benchmark(lambda: _run([*_STORCOM, 'file', 'll'], env), operations=_FILES)
+
+def _run(command: List[str], env: Dict[str, str]) -> None:
+    subprocess.run(command, env=env, stdout=subprocess.DEVNULL, check=True)
+
+def _get_env(tmp_path: Path, url: str) -> Dict[str, str]:
+    (tmp_path / 'config.toml').write_text(f'[bench.fcc]\nstorage_url = "{url}"\n'
+                                          '[bench.fcc.tokens]\nsrv = "token"\n',
+                                          encoding='utf-8')
+    (tmp_path / '.context').write_text('environment=bench\nstorage=fcc\nservice=srv\nuser=usr\n',
+                                       encoding='utf-8')
+    return {**os.environ, 'STORCOM_HOME': str(tmp_path)}
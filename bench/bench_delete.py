@@ -0,0 +1,30 @@
+from typing import Any, Dict, List, Tuple
+
+from conftest import Benchmark
+
+from storcom.config import StorageConfig
+from storcom.context import Context
+from storcom.fake_server import FakeStorageServer, serve, make_files
+from storcom.storage import FccStorage
+
+_FILES = 2000
+_LATENCY = 0.005
+_WORKERS = 20
+
+def bench_delete_files(benchmark: Benchmark) -> None:
+    files = make_files(_FILES)
+    with serve(latency=_LATENCY) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token', workers=_WORKERS),
+                             Context(storage='fcc'))
+        report = benchmark(storage.delete_files,
+                           setup=lambda: _restore_files(server, files),
+                           rounds=3,
+                           operations=_FILES)
+        storage.close()
+    assert len(report.succeeded) == _FILES
+
+def _restore_files(server: FakeStorageServer,
+                   files: List[Dict[str, Any]]) -> Tuple[List[str]]:
+    with server.lock:
+        server.files.update((f['id'], f) for f in files)
+    return ([f['id'] for f in files],)
@@ -0,0 +1,33 @@
+import time
+from typing import Type
+
+import pytest
+
+from storcom.config import StorageConfig
+from storcom.context import Context
+from storcom.fake_server import serve, make_files
+from storcom.storage import FccStorage
+
+async_storage = pytest.importorskip('storcom.async_storage')
+
+_FILES = 2000
+_LATENCY = 0.02
+
+@pytest.mark.parametrize('workers', [5, 50, 200])
+def bench_delete_files_thread_vs_async_engine(workers: int) -> None:
+    thread_seconds = _measure_delete(FccStorage, workers)
+    async_seconds = _measure_delete(async_storage.AsyncFccStorage, workers)
+    print(f'\ndelete_files x{_FILES}, {_LATENCY * 1000:.0f}ms server latency, '
+          f'{workers} workers: thread {_FILES / thread_seconds:.0f} files/s, '
+          f'async {_FILES / async_seconds:.0f} files/s')
+
+def _measure_delete(storage_class: Type[FccStorage], workers: int) -> float:
+    with serve(make_files(_FILES), latency=_LATENCY) as server:
+        storage = storage_class(StorageConfig(server.url, 'token', workers=workers),
+                                Context(storage='fcc'))
+        start = time.perf_counter()
+        report = storage.delete_files(list(server.files))
+        elapsed = time.perf_counter() - start
+        storage.close()
+    assert len(report.succeeded) == _FILES
+    return elapsed
@@ -0,0 +1,53 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from conftest import Benchmark
+
+from storcom.config import StorageConfig
+from storcom.context import Context
+from storcom.fake_server import serve, make_files
+from storcom.storage import BaseStorage, FccStorage, CxStorage, to_tabular_rows
+from storcom.table import render_table
+
+_FILES = 20000
+
+@pytest.mark.parametrize('storage_class, context', [
+    (FccStorage, Context(storage='fcc', user='usr')),
+    (CxStorage, Context(storage='cx', user='container')),
+])
+def bench_list_files(benchmark: Benchmark, storage_class: type, context: Context) -> None:
+    with serve(make_files(_FILES)) as server:
+        files: BaseStorage = storage_class(StorageConfig(server.url, 'token'), context)
+        listed = benchmark(lambda: sum(len(page) for page in files.list_files_pages({})),
+                           operations=_FILES)
+    assert listed == _FILES
+
+def bench_list_files_rows(benchmark: Benchmark) -> None:
+    with serve(make_files(_FILES)) as server:
+        files = CxStorage(StorageConfig(server.url, 'token'),
+                          Context(storage='cx', user='container'))
+        fields = files.get_tabular_fields([])
+        listed = benchmark(lambda: sum(len(rows) for rows in files.list_files_rows({}, fields)),
+                           operations=_FILES)
+    assert listed == _FILES
+
+def bench_list_files_filtered(benchmark: Benchmark) -> None:
+    filters: Dict[str, Any] = {'type': 'audio', 'file_bytes': ('ge 512000',)}
+    with serve(make_files(_FILES)) as server:
+        files = CxStorage(StorageConfig(server.url, 'token'),
+                          Context(storage='cx', user='container'))
+        listed = benchmark(lambda: sum(len(page) for page in files.list_files_pages(filters)),
+                           operations=_FILES)
+    assert 0 < listed < _FILES
+
+def bench_render_table(benchmark: Benchmark) -> None:
+    pages: List[List[Dict[str, Any]]] = [make_files(_FILES)]
+    headers = ['id', 'name', 'batch', 'date_changed', 'date_created']
+    lines = benchmark(lambda: sum(1 for _ in render_table((row
+                                                           for rows in to_tabular_rows(pages,
+                                                                                       headers)
+                                                           for row in rows),
+                                                          headers)),
+                      operations=_FILES)
+    assert lines == _FILES + 2
@@ -0,0 +1,34 @@
+import time
+from typing import Callable, Any, List
+
+import requests
+
+from storcom.config import StorageConfig
+from storcom.context import Context
+from storcom.fake_server import serve, make_files
+from storcom.storage import FccStorage
+
+_REQUESTS = 500
+
+def bench_show_file_pooled_session_vs_connection_per_request() -> None:
+    with serve(make_files(_REQUESTS)) as server:
+        file_ids = list(server.files)
+        unpooled_latency = _measure_latency(
+            lambda file_id: requests.get(f'{server.url}/files/{file_id}', timeout=10),
+            file_ids)
+        unpooled_connections, server.connections = server.connections, 0
+        storage = FccStorage(StorageConfig(server.url, 'token'), Context(storage='fcc'))
+        pooled_latency = _measure_latency(storage.show_file, file_ids)
+        pooled_connections = server.connections
+    print(f'\nshow_file x{_REQUESTS}: '
+          f'connection per request {unpooled_latency * 1000:.3f}ms/request '
+          f'({unpooled_connections} connections), '
+          f'pooled session {pooled_latency * 1000:.3f}ms/request '
+          f'({pooled_connections} connections)')
+    assert pooled_connections < unpooled_connections
+
+def _measure_latency(request: Callable[[str], Any], file_ids: List[str]) -> float:
+    start = time.perf_counter()
+    for file_id in file_ids:
+        request(file_id)
+    return (time.perf_counter() - start) / len(file_ids)
@@ -0,0 +1,25 @@
+import pytest
+
+from conftest import Benchmark
+
+from storcom.config import StorageConfig
+from storcom.context import Context
+from storcom.fake_server import serve, make_files
+from storcom.storage import FccStorage
+
+_FILES = 1000
+_LATENCY = 0.005
+_WORKERS = 20
+
+@pytest.mark.parametrize('ordered', [False, True])
+def bench_show_files(benchmark: Benchmark, ordered: bool) -> None:
+    with serve(make_files(_FILES), latency=_LATENCY) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token', workers=_WORKERS),
+                             Context(storage='fcc'))
+        file_ids = list(server.files)
+        shown = benchmark(lambda: sum(r.error is None
+                                      for r in storage.show_files(file_ids, ordered)),
+                          rounds=3,
+                          operations=_FILES)
+        storage.close()
+    assert shown == _FILES
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from conftest import Benchmark
+
+_RUNS = 10
+_TOP_MODULES = 10
+_COMPLETION = {'_STORCOM_COMPLETE': 'bash_complete',
+               'COMP_WORDS': 'storcom file ',
+               'COMP_CWORD': '2'}
+
+def bench_import_time(tmp_path: Path) -> None:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import storcom.storage_commander'],
+                            env=_get_env(tmp_path), capture_output=True, text=True, check=True)
+    modules = _parse_import_time(result.stderr)
+    total = next(cumulative for module, cumulative in modules
+                 if module == 'storcom.storage_commander')
+    print(f'\nimport storcom.storage_commander: {total / 1000:.1f}ms cumulative, slowest:')
+    for module, cumulative in sorted(modules, key=lambda m: m[1], reverse=True)[:_TOP_MODULES]:
+        print(f'  {cumulative / 1000:8.1f}ms {module}')
+
+def bench_completion_latency(benchmark: Benchmark, tmp_path: Path) -> None:
+    command = [sys.executable, '-c',
+               'from storcom.storage_commander import storcom; storcom(prog_name="storcom")']
+    env = {**_get_env(tmp_path), **_COMPLETION}
+    benchmark(lambda: subprocess.run(command, env=env, capture_output=True, check=True),
+              rounds=_RUNS)
+
+def _get_env(tmp_path: Path) -> Dict[str, str]:
+    (tmp_path / 'config.toml').write_text('[shortcuts]\n', encoding='utf-8')
+    return {**os.environ, 'STORCOM_HOME': str(tmp_path)}
+
+def _parse_import_time(output: str) -> List[Tuple[str, int]]:
+    # import time: self [us] | cumulative | imported package
+    modules = []
+    for line in output.splitlines():
+        fields = line[len('import time:'):].split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            modules.append((fields[2].strip(), int(fields[1])))
+    return modules
@@ -0,0 +1,83 @@
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import pytest
+
+T = TypeVar('T')
+
+_DEFAULT_TOLERANCE = 0.25
+# median seconds by benchmark name, collected for the summary and --bench_save
+_medians: Dict[str, float] = {}
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup('storcom benchmarks')
+    group.addoption('--bench_save',
+                    metavar='PATH',
+                    help='Save the median timings to PATH as a baseline.')
+    group.addoption('--bench_compare',
+                    metavar='PATH',
+                    help='Fail the benchmarks slower than the baseline in PATH.')
+    group.addoption('--bench_tolerance',
+                    type=float,
+                    default=_DEFAULT_TOLERANCE,
+                    help='Allowed slowdown against the baseline, 0.25 is 25%%.')
+
+class Benchmark:
+    '''
+    Times a callable over rounds, the setup runs before each round and is not timed.
+    '''
+    def __init__(self, name: str, baseline: Optional[float], tolerance: float):
+        self._name = name
+        self._baseline = baseline
+        self._tolerance = tolerance
+        self.timings: List[float] = []
+
+    def __call__(self,
+                 function: Callable[..., T],
+                 *,
+                 setup: Optional[Callable[[], Tuple[Any, ...]]] = None,
+                 rounds: int = 5,
+                 operations: int = 1) -> T:
+        for _ in range(rounds):
+            args = setup() if setup else ()
+            started = time.perf_counter()
+            result = function(*args)
+            self.timings.append(time.perf_counter() - started)
+        median = statistics.median(self.timings)
+        _medians[self._name] = median
+        print(f'\n{self._name}: median {median * 1000:.1f}ms, best {min(self.timings) * 1000:.1f}ms'
+              f', {operations / median:.0f} operations/s')
+        if self._baseline and median > self._baseline * (1 + self._tolerance):
+            pytest.fail(f'{self._name} regressed: median {median * 1000:.1f}ms, '
+                        f'baseline {self._baseline * 1000:.1f}ms')
+        return result
+
+@pytest.fixture
+def benchmark(request: pytest.FixtureRequest) -> Iterator[Benchmark]:
+    baseline_path = request.config.getoption('bench_compare')
+    baselines = _load_baselines(Path(baseline_path)) if baseline_path else {}
+    name = request.node.name
+    yield Benchmark(name, baselines.get(name), request.config.getoption('bench_tolerance'))
+
+def pytest_terminal_summary(terminalreporter: Any, config: pytest.Config) -> None:
+    if not _medians:
+        return
+    terminalreporter.section('benchmarks')
+    for name, median in sorted(_medians.items()):
+        terminalreporter.write_line(f'{median * 1000:10.1f}ms  {name}')
+    save_path = config.getoption('bench_save')
+    if save_path:
+        # a partial run updates its own entries of the baseline
+        path = Path(save_path)
+        medians = {**(_load_baselines(path) if path.exists() else {}), **_medians}
+        path.write_text(json.dumps(medians, indent=2, sort_keys=True), encoding='utf-8')
+
+def _load_baselines(path: Path) -> Dict[str, float]:
+    try:
+        baselines: Dict[str, float] = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        raise pytest.UsageError(f"Can't read the benchmark baseline {path}: {e}") from e
+    return baselines
@@ -8,9 +8,14 @@ setup(
     install_requires=[
         'Click', 'requests', 'tomli', 'tabulate', 'curlify', 'python-dateutil',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+        'arrow': ['pyarrow'],
+    },
     entry_points={
         'console_scripts': [
-            'storcom = storcom.storage_commander:storcom',
+            'storcom = storcom.__main__:main',
         ],
     },
 )
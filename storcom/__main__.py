@@ -0,0 +1,18 @@
+import sys
+
+from storcom.daemon import forward
+
+def main() -> None:
+    '''
+    Entry point of storcom: the command runs in the daemon when one is serving, otherwise
+    in this process.
+    '''
+    exit_code = forward(sys.argv[1:])
+    if exit_code is None:
+        # pylint: disable=import-outside-toplevel
+        from storcom.storage_commander import storcom
+        storcom.main(prog_name='storcom')
+    sys.exit(exit_code)
+
+if __name__ == '__main__':
+    main()
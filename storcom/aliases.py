@@ -1,3 +1,7 @@
-from typing import Union, Optional, Tuple
+from typing import Union, Optional, Tuple, Dict, List
 
 QueryArg = Union[Optional[str], Tuple[str, ...]]
+File = Dict[str, str]
+FilesPage = List[File]
+# the values of the requested fields of a file, in their order
+Row = Tuple[str, ...]
@@ -0,0 +1,263 @@
+import asyncio
+import shlex
+import sys
+import time
+from collections import deque
+from typing import (Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List,
+                    Optional, Set, TypeVar)
+from urllib.parse import urlencode
+
+import aiohttp
+
+from storcom.aliases import QueryArg, FilesPage
+from storcom.bulk import BulkReport, BulkResult, Pacer, ProgressCallback, describe_error
+from storcom.config import StorageConfig
+from storcom.errors import BulkAbortedError, StorageInteractionError, StorcomError
+from storcom.jsonstream import loads
+from storcom.retry import Retrier
+from storcom.storage import (BaseStorage, FccStorage, CxStorage, REQUEST_TIMEOUT, to_file,
+                             validate_files_page)
+
+T = TypeVar('T')
+
+# mixed in front of the concrete storages which provide the urls and columns
+class AsyncBaseStorage(BaseStorage): # pylint: disable=abstract-method
+    '''
+    Storage which runs its requests on an asyncio event loop. The number of requests in flight
+    is bounded by the concurrency of the workers settings instead of the number of threads,
+    so it can be set to thousands.
+    '''
+    def __init__(self, config: StorageConfig, *args: Any, **kwargs: Any):
+        super().__init__(config, *args, **kwargs)
+        self._token = config.token
+        self._loop = asyncio.new_event_loop()
+        self._client: Optional[aiohttp.ClientSession] = None
+
+    def _list_pages(self,
+                    filters: Dict[str, QueryArg],
+                    fields: Optional[List[str]],
+                    to_record: Callable[[Any], T]) -> Iterator[List[T]]:
+        pages = self._list_pages_async(filters, fields, to_record)
+        try:
+            while True:
+                try:
+                    yield self._run(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(pages.aclose())
+
+    def show_file(self, file_id: str) -> str:
+        return self._run(self.show_file_async(file_id))
+
+    def show_files(self, file_ids: Iterable[str], ordered: bool = False) -> Iterator[BulkResult]:
+        results = self.show_files_async(file_ids, ordered)
+        try:
+            while True:
+                try:
+                    yield self._run(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(results.aclose())
+
+    def delete_files(self,
+                     file_ids: Iterable[str],
+                     on_progress: Optional[ProgressCallback] = None,
+                     rate: Optional[float] = None) -> BulkReport:
+        return self._run(self.delete_files_async(file_ids, on_progress, rate))
+
+    def close(self) -> None:
+        if self._client:
+            self._run(self._client.close())
+        self._loop.close()
+        super().close()
+
+    async def list_files_pages_async(
+            self, filters: Dict[str, QueryArg]) -> AsyncGenerator[FilesPage, None]:
+        async for page in self._list_pages_async(filters, None, to_file):
+            yield page
+
+    async def _list_pages_async(self,
+                                filters: Dict[str, QueryArg],
+                                fields: Optional[List[str]],
+                                to_record: Callable[[Any], T]) -> AsyncGenerator[List[T], None]:
+        cursor = self._get_first_page_cursor(filters, fields)
+        while cursor.url:
+            body = await self._request('GET', cursor.url, "Can't get list of files.", cursor.params)
+            page = validate_files_page(_decode_json(body))
+            try:
+                records = [to_record(item) for item in page['items']]
+            except ValueError as e:
+                raise StorageInteractionError('Invalid file list JSON.') from e
+            yield records
+            cursor.advance(page, len(records))
+
+    async def show_file_async(self, file_id: str) -> str:
+        return await self._request('GET',
+                                   self._get_file_url(file_id),
+                                   f"Can't get file details for {file_id}")
+
+    async def show_files_async(self,
+                               file_ids: Iterable[str],
+                               ordered: bool = False) -> AsyncGenerator[BulkResult, None]:
+        # same window as the thread pool, it also bounds the results held back for ordering
+        window = self._workers * 2
+        in_flight: Deque['asyncio.Task[BulkResult]'] = deque()
+        seen: Set[str] = set()
+
+        room = asyncio.Event()
+
+        async def show(file_id: str) -> BulkResult:
+            await self._acquire(room)
+            try:
+                return BulkResult(file_id, value=await self.show_file_async(file_id))
+            except StorcomError as e:
+                return BulkResult(file_id, error=describe_error(e))
+            finally:
+                self._release(room)
+
+        async def pop_results() -> AsyncGenerator[BulkResult, None]:
+            if ordered:
+                yield await in_flight.popleft()
+                return
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in [t for t in in_flight if t in done]:
+                in_flight.remove(task)
+                yield task.result()
+
+        try:
+            for file_id in file_ids:
+                if file_id in seen:
+                    continue
+                seen.add(file_id)
+                if len(in_flight) >= window:
+                    async for result in pop_results():
+                        yield result
+                in_flight.append(asyncio.ensure_future(show(file_id)))
+            while in_flight:
+                async for result in pop_results():
+                    yield result
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def delete_files_async(self,
+                                 file_ids: Iterable[str],
+                                 on_progress: Optional[ProgressCallback] = None,
+                                 rate: Optional[float] = None) -> BulkReport:
+        report = BulkReport()
+        room = asyncio.Event()
+        pacer = Pacer(rate) if rate else None
+        pending: Set['asyncio.Future[None]'] = set()
+
+        async def delete(file_id: str) -> None:
+            try:
+                await self._request('DELETE',
+                                    self._get_file_url(file_id),
+                                    f"Can't delete file {file_id}")
+                report.succeeded.append(file_id)
+            except StorcomError as e:
+                report.failed[file_id] = describe_error(e)
+            finally:
+                self._release(room)
+            if on_progress:
+                on_progress(report)
+
+        try:
+            for file_id in file_ids:
+                # bounds the number of tasks, ids are consumed only when there is room for them
+                await self._acquire(room)
+                if pacer:
+                    await asyncio.sleep(pacer.reserve())
+                task = asyncio.ensure_future(delete(file_id))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except StorcomError as e:
+            await asyncio.gather(*pending)
+            raise BulkAbortedError(str(e), report) from e
+        await asyncio.gather(*pending)
+        return report
+
+    async def _acquire(self, room: asyncio.Event) -> None:
+        while not self._concurrency.try_acquire():
+            room.clear()
+            await room.wait()
+
+    def _release(self, room: asyncio.Event) -> None:
+        self._concurrency.release()
+        room.set()
+
+    def _run(self, awaitable: Awaitable[T]) -> T:
+        return self._loop.run_until_complete(awaitable)
+
+    async def _request(self,
+                       method: str,
+                       url: str,
+                       error: str,
+                       params: Optional[Dict[str, str]] = None) -> str:
+        client = self._get_client()
+        retrier = Retrier(method, url, self._retry_policy, self._retry_stats)
+        endpoint = self._get_endpoint(url)
+        while True:
+            retrier.before_attempt()
+            try:
+                self._print_curl(method, url, params)
+                started = time.monotonic()
+                try:
+                    async with client.request(method, url, params=params) as response:
+                        # the body is kept by the response, text() decodes it without reading again
+                        body = await response.read()
+                        self._metrics.record(method,
+                                             endpoint,
+                                             str(response.status),
+                                             started,
+                                             bytes_received=len(body),
+                                             retry=retrier.attempt > 0)
+                        self._concurrency.record_response(response.status,
+                                                          time.monotonic() - started)
+                        delay = retrier.on_status(response.status,
+                                                  response.headers.get('Retry-After'))
+                        if delay is None:
+                            response.raise_for_status()
+                            return await response.text()
+                except aiohttp.ClientResponseError as e:
+                    raise StorageInteractionError(error) from e
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self._record_error(method, endpoint, started, retrier.attempt > 0)
+                    delay = retrier.on_error(e)
+                    if delay is None:
+                        raise StorageInteractionError(error) from e
+            finally:
+                # any other error or a cancellation ends the attempt as a failure
+                retrier.after_attempt()
+            await asyncio.sleep(delay)
+
+    def _get_client(self) -> aiohttp.ClientSession:
+        # aiohttp sessions have to be created while the loop is running
+        if self._client is None:
+            self._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._workers),
+                headers={'Authorization': f'Bearer {self._token}'},
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        return self._client
+
+    def _print_curl(self, method: str, url: str, params: Optional[Dict[str, str]]) -> None:
+        if not self._show_curl:
+            return
+        full_url = f'{url}?{urlencode(params)}' if params else url
+        print(f"curl -X {method} -H 'Authorization: Bearer {self._token}' {shlex.quote(full_url)}",
+              file=sys.stderr)
+
+class AsyncFccStorage(AsyncBaseStorage, FccStorage):
+    pass
+
+class AsyncCxStorage(AsyncBaseStorage, CxStorage):
+    pass
+
+def _decode_json(body: str) -> Any:
+    try:
+        return loads(body)
+    except ValueError as e:
+        raise StorageInteractionError('Invalid file list JSON.') from e
@@ -0,0 +1,225 @@
+import json
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import (Any, Callable, Generator, Iterable, Iterator, Deque, Dict, List, Optional, Set,
+                    TextIO, Tuple, TypeVar)
+
+from storcom.errors import BulkAbortedError, StorcomError
+
+T = TypeVar('T')
+
+_PROGRESS_INTERVAL = 0.2
+_PUT_TIMEOUT = 0.1
+
+@dataclass
+class BulkReport:
+    succeeded: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def processed(self) -> int:
+        return len(self.succeeded) + len(self.failed)
+
+    def to_json(self) -> str:
+        return json.dumps({'succeeded': self.succeeded, 'failed': self.failed})
+
+@dataclass
+class BulkResult:
+    item: str
+    value: Optional[str] = None
+    error: Optional[str] = None
+
+ProgressCallback = Callable[[BulkReport], None]
+
+def run_bulk(action: Callable[[str], None],
+             items: Iterable[str],
+             workers: int,
+             on_progress: Optional[ProgressCallback] = None,
+             rate: Optional[float] = None) -> BulkReport:
+    '''
+    Applies the action to every item using a pool of workers. Items are consumed lazily,
+    at most twice the number of workers are queued at a time. Failures are collected in the
+    report instead of stopping the run. With a rate at most rate actions start a second.
+    When the items fail, e.g. a listing, the actions in flight are waited for and
+    BulkAbortedError carries the report.
+    '''
+    report = BulkReport()
+    pacer = Pacer(rate) if rate else None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight: Dict['Future[None]', str] = {}
+        try:
+            for item in items:
+                if len(in_flight) >= workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    _collect(done, in_flight, report, on_progress)
+                if pacer:
+                    time.sleep(pacer.reserve())
+                in_flight[executor.submit(action, item)] = item
+        except StorcomError as e:
+            _collect(set(in_flight), in_flight, report, on_progress)
+            raise BulkAbortedError(str(e), report) from e
+        _collect(set(in_flight), in_flight, report, on_progress)
+    return report
+
+def map_bulk(action: Callable[[str], str],
+             items: Iterable[str],
+             workers: int,
+             ordered: bool = False) -> Iterator[BulkResult]:
+    '''
+    Applies the action to every distinct item using a pool of workers, yields the results as
+    they complete or, when ordered, in the order of the items. Either way at most twice the
+    number of workers are in flight, which also bounds the results held back for ordering.
+    '''
+    window = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight: Deque['Future[str]'] = deque()
+        items_by_future: Dict['Future[str]', str] = {}
+        for item in _distinct(items):
+            if len(in_flight) >= window:
+                yield from _pop_results(in_flight, items_by_future, ordered)
+            future = executor.submit(action, item)
+            in_flight.append(future)
+            items_by_future[future] = item
+        while in_flight:
+            yield from _pop_results(in_flight, items_by_future, ordered)
+
+def prefetch(items: Iterable[T], size: int) -> Generator[T, None, None]:
+    '''
+    Items consumed by a background thread ahead of the caller, at most size of them wait for
+    it. An error raised by the items reaches the caller after the items before it.
+    '''
+    ahead: 'queue.Queue[Tuple[Any, Optional[Exception], bool]]' = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def consume() -> None:
+        try:
+            for item in items:
+                if not put_unless_stopped(ahead, (item, None, False), stop):
+                    return
+            put_unless_stopped(ahead, (None, None, True), stop)
+        except Exception as e: # pylint: disable=broad-except
+            # raised again in the thread of the caller
+            put_unless_stopped(ahead, (None, e, True), stop)
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error, done = ahead.get()
+            if error:
+                raise error
+            if done:
+                return
+            yield item
+    finally:
+        # the caller is gone, the thread stops at its next item
+        stop.set()
+        thread.join()
+
+def put_unless_stopped(target: 'queue.Queue[Any]', item: Any, stop: threading.Event) -> bool:
+    '''
+    Waits for room in the bounded queue until the consumer stops, False if it has.
+    '''
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def describe_error(error: Exception) -> str:
+    return f'{error}: {error.__cause__}' if error.__cause__ else str(error)
+
+class Pacer:
+    '''
+    Spaces the starts of operations to at most rate a second.
+    '''
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next = time.monotonic()
+
+    def reserve(self) -> float:
+        '''
+        Takes the next start, returns how many seconds are left until it.
+        '''
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self._interval
+        return start - now
+
+class Progress:
+    '''
+    Throttled single-line progress counter, only shown on a terminal.
+    '''
+    def __init__(self, verb: str, stream: Optional[TextIO] = None):
+        self._verb = verb
+        # the current stderr, a long-lived process swaps the streams between commands
+        self._stream = stream or sys.stderr
+        self._enabled = self._stream.isatty()
+        self._started = time.monotonic()
+        self._shown = 0.0
+
+    def __call__(self, report: BulkReport) -> None:
+        now = time.monotonic()
+        if not self._enabled or now - self._shown < _PROGRESS_INTERVAL:
+            return
+        self._shown = now
+        self._show(report, now)
+
+    def finish(self, report: BulkReport) -> None:
+        if self._enabled:
+            self._show(report, time.monotonic())
+            print(file=self._stream)
+
+    def _show(self, report: BulkReport, now: float) -> None:
+        rate = report.processed / max(now - self._started, 1e-9)
+        print(f'\r{self._verb} {len(report.succeeded)}, failed {len(report.failed)}, '
+              f'{rate:.1f}/s',
+              end='',
+              file=self._stream,
+              flush=True)
+
+def _distinct(items: Iterable[str]) -> Iterator[str]:
+    seen: Set[str] = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+def _pop_results(in_flight: Deque['Future[str]'],
+                 items_by_future: Dict['Future[str]', str],
+                 ordered: bool) -> Iterator[BulkResult]:
+    if ordered:
+        done = [in_flight.popleft()]
+        wait(done)
+    else:
+        done_set, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        done = [f for f in in_flight if f in done_set]
+        for future in done:
+            in_flight.remove(future)
+    for future in done:
+        item = items_by_future.pop(future)
+        try:
+            yield BulkResult(item, value=future.result())
+        except StorcomError as e:
+            yield BulkResult(item, error=describe_error(e))
+
+def _collect(done: Set['Future[None]'],
+             in_flight: Dict['Future[None]', str],
+             report: BulkReport,
+             on_progress: Optional[ProgressCallback]) -> None:
+    for future in done:
+        item = in_flight.pop(future)
+        try:
+            future.result()
+            report.succeeded.append(item)
+        except StorcomError as e:
+            report.failed[item] = describe_error(e)
+        if on_progress:
+            on_progress(report)
@@ -0,0 +1,113 @@
+import os
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Tuple, TypeVar
+from urllib.parse import quote
+
+from storcom.config import get_or_create_config_directory
+from storcom.context import Context
+
+T = TypeVar('T')
+
+_DIRECTORY_NAME = 'completion'
+# files remembered per context, the ones seen by the latest listings are kept
+_MAX_FILES = 10000
+_MAX_COMPLETIONS = 100
+_SEPARATOR = '\t'
+
+def remember_pages(context: Context,
+                   pages: Iterable[List[T]],
+                   get_file: Callable[[T], Tuple[str, str]]) -> Generator[List[T], None, None]:
+    '''
+    Passes the pages of a listing through, the ids and names of their files are remembered
+    for completion once the listing stops. get_file gives the id and the name of a record.
+    '''
+    seen: Dict[str, str] = {}
+    try:
+        for page in pages:
+            for record in page[:max(_MAX_FILES - len(seen), 0)]:
+                file_id, name = get_file(record)
+                seen[file_id] = name
+            yield page
+    finally:
+        if seen:
+            remember(context, seen)
+
+def remember(context: Context, names: Dict[str, str]) -> None:
+    '''
+    Adds the names of the files by their ids to the completion index of the context, the
+    files remembered before make room for them.
+    '''
+    path = _get_path(context)
+    names = dict(list(names.items())[:_MAX_FILES])
+    for file_id, name in _read_names(path).items():
+        if len(names) >= _MAX_FILES:
+            break
+        names.setdefault(file_id, name)
+    _write_names(path, names)
+
+def forget(context: Context, file_ids: Iterable[str]) -> None:
+    path = _get_path(context)
+    names = _read_names(path)
+    forgotten = [file_id for file_id in file_ids if names.pop(file_id, None) is not None]
+    if forgotten:
+        _write_names(path, names)
+
+def complete(context: Context, incomplete: str) -> List[Tuple[str, Optional[str]]]:
+    '''
+    Ids of the remembered files which id or name starts with incomplete, with the name when
+    it is the name which matched. Never touches the network.
+    '''
+    lines = _read_lines(_get_path(context))
+    completions: Dict[str, Optional[str]] = {}
+    for line in lines[bisect_left(lines, incomplete):]:
+        if not line.startswith(incomplete) or len(completions) >= _MAX_COMPLETIONS:
+            break
+        key, _, file_id = line.partition(_SEPARATOR)
+        if file_id:
+            completions.setdefault(file_id, key)
+        else:
+            completions[key] = None
+    return list(completions.items())
+
+def _read_names(path: Path) -> Dict[str, str]:
+    names: Dict[str, str] = {}
+    for line in _read_lines(path):
+        key, _, file_id = line.partition(_SEPARATOR)
+        if file_id:
+            names[file_id] = key
+        else:
+            names.setdefault(key, '')
+    return names
+
+def _read_lines(path: Path) -> List[str]:
+    try:
+        # not splitlines, a name may hold the other line boundaries it knows
+        return path.read_text(encoding='utf-8').split('\n')[:-1]
+    except OSError:
+        return []
+
+def _write_names(path: Path, names: Dict[str, str]) -> None:
+    '''
+    Sorted lines of the ids, followed by a tab, and of the names followed by a tab and their
+    id: the lines starting with a prefix are next to each other.
+    '''
+    lines = [f'{file_id}{_SEPARATOR}' for file_id in names if _is_completable(file_id)]
+    lines.extend(f'{name}{_SEPARATOR}{file_id}' for file_id, name in names.items()
+                 if name and _is_completable(name) and _is_completable(file_id))
+    lines.sort()
+    temporary_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(exist_ok=True)
+        temporary_path.write_text(''.join(f'{line}\n' for line in lines), encoding='utf-8')
+        os.replace(temporary_path, path)
+    except OSError:
+        # completion is a convenience, the listing does not fail because of it
+        temporary_path.unlink(missing_ok=True)
+
+def _is_completable(value: str) -> bool:
+    return bool(value) and _SEPARATOR not in value and '\n' not in value and '\r' not in value
+
+def _get_path(context: Context) -> Path:
+    key = ':'.join([context.environment, context.storage, context.service, context.user])
+    return get_or_create_config_directory() / _DIRECTORY_NAME / quote(key, safe=':')
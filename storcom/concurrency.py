@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# responses telling that the server is overloaded, as timeouts and refused connections do
+_OVERLOAD_STATUSES = frozenset([429, 502, 503, 504])
+# multiplicative decrease on overload and on latency well above its baseline
+_OVERLOAD_BACKOFF = 0.5
+_LATENCY_BACKOFF = 0.9
+_LATENCY_TOLERANCE = 2.0
+# how fast the baseline follows the latencies above it: a slower server becomes the normal
+_BASELINE_DRIFT = 0.01
+_REPORTED_CHANGES = 8
+
+class AdaptiveConcurrency: # pylint: disable=too-many-instance-attributes
+    '''
+    Number of requests in flight adjusted by AIMD. It grows by one per round of successful
+    requests while they use all of it, halves when the server is overloaded or times out, and
+    shrinks by a tenth when the latency climbs well above its baseline. It decreases at most
+    once per round trip, the requests of a burst all bring the same news. The limit stays
+    between floor and ceiling, when they are equal it is fixed.
+    '''
+    def __init__(self, workers: int, floor: int, ceiling: int):
+        self.floor = floor
+        self.ceiling = ceiling
+        self._limit = min(max(workers, floor), ceiling)
+        self._in_flight = 0
+        # successes since the limit last changed, a round is as many as the limit
+        self._successes = 0
+        self._baseline: Optional[float] = None
+        self._decreased_at = -math.inf
+        self._started = time.monotonic()
+        self._changes: List[Tuple[float, int]] = [(0.0, self.limit)]
+        self._room = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def adaptive(self) -> bool:
+        return self.floor < self.ceiling
+
+    @property
+    def changes(self) -> List[Tuple[float, int]]:
+        '''
+        Seconds since the start and the limit chosen then, for every change of the limit.
+        '''
+        with self._room:
+            return list(self._changes)
+
+    def limited(self, action: Callable[[str], T]) -> Callable[[str], T]:
+        '''
+        The action run within the limit, for a pool of ceiling threads.
+        '''
+        def run(item: str) -> T:
+            self.acquire()
+            try:
+                return action(item)
+            finally:
+                self.release()
+        return run
+
+    def acquire(self) -> None:
+        with self._room:
+            self._room.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    def try_acquire(self) -> bool:
+        with self._room:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._room:
+            self._in_flight -= 1
+            self._room.notify()
+
+    def record_response(self, status: int, latency: float) -> None:
+        self._record(latency, overloaded=status in _OVERLOAD_STATUSES)
+
+    def record_error(self, latency: float) -> None:
+        self._record(latency, overloaded=True)
+
+    def __str__(self) -> str:
+        changes = self.changes
+        limits = [limit for _, limit in changes]
+        timeline = ', '.join(f'{limit} at {elapsed:.1f}s'
+                             for elapsed, limit in _sample(changes, _REPORTED_CHANGES))
+        return (f'concurrency {limits[0]} to {limits[-1]} '
+                f'(min {min(limits)}, max {max(limits)}): {timeline}')
+
+    def _record(self, latency: float, overloaded: bool) -> None:
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        with self._room:
+            backoff = _OVERLOAD_BACKOFF if overloaded else self._get_latency_backoff(latency)
+            if backoff is None:
+                # only a limit which is used has proven itself
+                self._successes += self._in_flight >= self._limit
+                if self._successes >= self._limit:
+                    self._change(min(self._limit + 1, self.ceiling), now)
+            elif now - self._decreased_at >= latency:
+                self._change(max(int(self._limit * backoff), self.floor), now)
+                self._decreased_at = now
+
+    def _change(self, limit: int, now: float) -> None:
+        self._successes = 0
+        if limit != self._limit:
+            self._limit = limit
+            self._changes.append((now - self._started, limit))
+            # a bigger limit lets the waiting requests in
+            self._room.notify_all()
+
+    def _get_latency_backoff(self, latency: float) -> Optional[float]:
+        baseline = self._baseline
+        if baseline is None or latency <= baseline:
+            self._baseline = latency
+            return None
+        self._baseline = baseline + (latency - baseline) * _BASELINE_DRIFT
+        return _LATENCY_BACKOFF if latency > baseline * _LATENCY_TOLERANCE else None
+
+def _sample(changes: List[Tuple[float, int]], count: int) -> List[Tuple[float, int]]:
+    # evenly spread, the first and the last included
+    if len(changes) <= count:
+        return changes
+    step = (len(changes) - 1) / (count - 1)
+    return [changes[round(i * step)] for i in range(count)]
@@ -1,13 +1,53 @@
+import os
+import pickle
 from os import environ as env
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any, Tuple, TYPE_CHECKING
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
 
-import tomli
+from storcom.retry import RetryPolicy
 
 if TYPE_CHECKING:
     from storcom.context import Context
 
-StorageConfig = Tuple[str, str]
+_DEFAULT_WORKERS = 5
+_CONFIG_FILE_NAME = 'config.toml'
+_SNAPSHOT_FILE_NAME = '.config.pickle'
+# bump when _ParsedConfig changes, older snapshots are rebuilt
+_SNAPSHOT_VERSION = 1
+
+# path, mtime in nanoseconds and size of the config file the snapshot was built from
+_SnapshotKey = Tuple[str, int, int]
+
+@dataclass
+class StorageConfig:
+    storage_url: str
+    token: str
+    # number of concurrent requests, also the size of the per-host connection pool
+    workers: int = _DEFAULT_WORKERS
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    # with max_workers the concurrency adapts to the server between them, starting at workers
+    min_workers: Optional[int] = None
+    max_workers: Optional[int] = None
+
+    @property
+    def worker_range(self) -> Tuple[int, int]:
+        '''
+        Floor and ceiling of the number of concurrent requests.
+        '''
+        if self.max_workers is None:
+            return self.workers, self.workers
+        return self.min_workers or 1, self.max_workers
+
+@dataclass
+class _ParsedConfig:
+    key: _SnapshotKey
+    sections: Dict[str, Any]
+    shortcuts: Dict[str, str]
+    # (environment, storage, service) -> token
+    tokens: Dict[Tuple[str, str, str], str]
+
+_parsed_config: Optional[_ParsedConfig] = None # pylint: disable=invalid-name
 
 def get_or_create_config_directory() -> Path:
     config_directory = Path(env.get('STORCOM_HOME') or _get_standard_config_directory())
@@ -15,7 +55,8 @@ def get_or_create_config_directory() -> Path:
     return config_directory
 
 def read_storage_config(context: 'Context') -> StorageConfig:
-    config = _read_decode_config()
+    parsed_config = _load_config()
+    config = parsed_config.sections
     if context.environment not in config:
         raise ConfigError(f'No config for environment: {context.environment}')
     if context.storage not in config[context.environment]:
@@ -26,17 +67,47 @@ def read_storage_config(context: 'Context') -> StorageConfig:
         raise ConfigError(f'No storage_url for storage {context.storage}')
     if not context.service:
         raise ConfigError(f'No service for storage: {context.storage}')
-    tokens = storage_config.get('tokens') or {}
-    service_token = tokens.get(context.service)
+    service_token = parsed_config.tokens.get((context.environment,
+                                              context.storage,
+                                              context.service))
     if not service_token:
         raise ConfigError(f'Storage token missing for service: {context.service}')
-    return storage_url, service_token
+    min_workers, max_workers = _read_worker_range(storage_config)
+    return StorageConfig(storage_url,
+                         service_token,
+                         workers=_read_positive_int(storage_config, 'workers', _DEFAULT_WORKERS),
+                         retry=_read_retry_policy(storage_config.get('retry') or {}),
+                         min_workers=min_workers,
+                         max_workers=max_workers)
 
 def read_shortcuts() -> Dict[str, str]:
-    return _read_decode_config().get('shortcuts', {})
+    return _load_config().shortcuts
 
-def _read_decode_config() -> Dict[str, Any]:
-    config_file_path = get_or_create_config_directory() / 'config.toml'
+def _load_config() -> _ParsedConfig:
+    '''
+    The parsed config is kept for the lifetime of the process and pickled next to the config
+    file, the following runs load the snapshot until the config file changes.
+    '''
+    global _parsed_config # pylint: disable=global-statement
+    config_directory = get_or_create_config_directory()
+    config_file_path = config_directory / _CONFIG_FILE_NAME
+    try:
+        stat = config_file_path.stat()
+    except OSError as e:
+        raise ConfigError(f'Unable to read {config_file_path}: {e}') from e
+    key = (str(config_file_path), stat.st_mtime_ns, stat.st_size)
+    if _parsed_config is not None and _parsed_config.key == key:
+        return _parsed_config
+    snapshot_path = config_directory / _SNAPSHOT_FILE_NAME
+    parsed_config = _load_snapshot(snapshot_path, key)
+    if parsed_config is None:
+        parsed_config = _parse_config(key, _read_decode_config(config_file_path))
+        _save_snapshot(snapshot_path, parsed_config)
+    _parsed_config = parsed_config
+    return parsed_config
+
+def _read_decode_config(config_file_path: Path) -> Dict[str, Any]:
+    import tomli # pylint: disable=import-outside-toplevel
     try:
         with open(config_file_path, 'rb') as f:
             return tomli.load(f)
@@ -45,6 +116,78 @@ def _read_decode_config() -> Dict[str, Any]:
     except tomli.TOMLDecodeError as e:
         raise ConfigError(f'Unable to decode {config_file_path}: {e}') from e
 
+def _parse_config(key: _SnapshotKey, sections: Dict[str, Any]) -> _ParsedConfig:
+    tokens = {}
+    for environment, storages in sections.items():
+        if environment == 'shortcuts' or not isinstance(storages, dict):
+            continue
+        for storage, storage_config in storages.items():
+            if not isinstance(storage_config, dict):
+                continue
+            for service, token in (storage_config.get('tokens') or {}).items():
+                tokens[(environment, storage, service)] = token
+    return _ParsedConfig(key, sections, sections.get('shortcuts', {}), tokens)
+
+def _load_snapshot(snapshot_path: Path, key: _SnapshotKey) -> Optional[_ParsedConfig]:
+    try:
+        with open(snapshot_path, 'rb') as f:
+            version, parsed_config = pickle.load(f)
+    except Exception: # pylint: disable=broad-except
+        # a missing or broken snapshot is rebuilt from the config file
+        return None
+    if version != _SNAPSHOT_VERSION or not isinstance(parsed_config, _ParsedConfig):
+        return None
+    return parsed_config if parsed_config.key == key else None
+
+def _save_snapshot(snapshot_path: Path, parsed_config: _ParsedConfig) -> None:
+    temporary_path = snapshot_path.with_name(f'{snapshot_path.name}.{os.getpid()}')
+    try:
+        # the snapshot holds the tokens, it is as private as the config file
+        fd = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((_SNAPSHOT_VERSION, parsed_config), f, pickle.HIGHEST_PROTOCOL)
+        # concurrent runs each write their own file, the last rename wins
+        os.replace(temporary_path, snapshot_path)
+    except OSError:
+        # the snapshot is an optimization only, the config is parsed again next time
+        temporary_path.unlink(missing_ok=True)
+
+def _read_retry_policy(retry_config: Dict[str, Any]) -> RetryPolicy:
+    default = RetryPolicy()
+    return RetryPolicy(
+        max_attempts=_read_positive_int(retry_config, 'max_attempts', default.max_attempts),
+        backoff=_read_non_negative_number(retry_config, 'backoff', default.backoff),
+        max_backoff=_read_non_negative_number(retry_config, 'max_backoff', default.max_backoff),
+        breaker_threshold=int(_read_non_negative_number(retry_config,
+                                                        'breaker_threshold',
+                                                        default.breaker_threshold)),
+        breaker_cooldown=_read_non_negative_number(retry_config,
+                                                   'breaker_cooldown',
+                                                   default.breaker_cooldown),
+    )
+
+def _read_worker_range(storage_config: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    min_workers, max_workers = (_read_positive_int(storage_config, key, 1)
+                                if key in storage_config else None
+                                for key in ('min_workers', 'max_workers'))
+    if min_workers is not None and max_workers is None:
+        raise ConfigError('min_workers needs max_workers')
+    if min_workers is not None and max_workers is not None and min_workers > max_workers:
+        raise ConfigError(f'min_workers {min_workers} is above max_workers {max_workers}')
+    return min_workers, max_workers
+
+def _read_positive_int(section: Dict[str, Any], key: str, default: int) -> int:
+    value = section.get(key, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ConfigError(f'{key} should be a positive integer, got: {value}')
+    return value
+
+def _read_non_negative_number(section: Dict[str, Any], key: str, default: float) -> float:
+    value = section.get(key, default)
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+        raise ConfigError(f'{key} should be a non-negative number, got: {value}')
+    return value
+
 def _get_standard_config_directory() -> Path:
     home_directory = env.get('HOME')
     assert home_directory is not None
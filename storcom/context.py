@@ -1,8 +1,8 @@
+import fnmatch
 import os
-import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 
 import click
 
@@ -18,17 +18,25 @@ class Context:
     def __str__(self) -> str:
         return str(self.__dict__)
 
-try:
-    # a better way would be passing all data to autocompletion handler as a context,
-    # however there is a bug in click which always creates new context instead of grabbing
-    # the one from the command. See https://github.com/pallets/click/issues/2303
-    shortcuts = config.read_shortcuts()
-except config.ConfigError as e:
-    click.echo(e.message, err=True)
-    sys.exit(click.ClickException.exit_code)
+# a better way would be passing all data to autocompletion handler as a context,
+# however there is a bug in click which always creates new context instead of grabbing
+# the one from the command. See https://github.com/pallets/click/issues/2303
+# Read on first use, most of the commands and completions never need it.
+shortcuts: Optional[Dict[str, str]] = None # pylint: disable=invalid-name
+
+# a comma separates contexts, the rest are the glob characters
+_MANY_CHARACTERS = ',*?['
 
 def complete_with_shortcut(_: click.Context, __: str, incomplete: str) -> List[str]:
-    return [shortcut for shortcut in shortcuts.keys() if shortcut.startswith(incomplete)]
+    return [shortcut for shortcut in _get_shortcuts().keys() if shortcut.startswith(incomplete)]
+
+def complete_with_shortcuts(_: click.Context, __: str, incomplete: str) -> List[str]:
+    '''
+    Completes the last shortcut of a comma separated list.
+    '''
+    listed, separator, last = incomplete.rpartition(',')
+    return [f'{listed}{separator}{shortcut}'
+            for shortcut in _get_shortcuts().keys() if shortcut.startswith(last)]
 
 @click.group('context')
 def context_group() -> None:
@@ -73,10 +81,46 @@ def load() -> Optional[Context]:
         return _empty_to_none(context)
 
 def parse(value: str) -> Optional[Context]:
-    value_to_parse = shortcuts.get(value) if value in shortcuts else value
+    all_shortcuts = _get_shortcuts()
+    value_to_parse = all_shortcuts.get(value) if value in all_shortcuts else value
     context = Context(*value_to_parse.split(':')) if value_to_parse else Context()
     return _empty_to_none(context)
 
+def is_many(value: Optional[str]) -> bool:
+    '''
+    Whether the value is a list of contexts or a glob over the shortcuts rather than a context.
+    '''
+    return value is not None and any(c in value for c in _MANY_CHARACTERS)
+
+def parse_many(value: str) -> List[Tuple[str, Context]]:
+    '''
+    Contexts of a comma separated list of shortcuts, globs over the shortcut names and
+    serialized contexts. Each context comes with its label: the shortcut name or the
+    serialized context.
+    '''
+    contexts: Dict[str, Context] = {}
+    for item in (v.strip() for v in value.split(',')):
+        names = sorted(fnmatch.filter(_get_shortcuts(), item)) if _is_glob(item) else [item]
+        if not names:
+            raise click.ClickException(f'No shortcuts match {item}')
+        for name in names:
+            context = parse(name)
+            if context:
+                contexts.setdefault(name, context)
+    return list(contexts.items())
+
+def _is_glob(value: str) -> bool:
+    return any(c in value for c in _MANY_CHARACTERS[1:])
+
+def _get_shortcuts() -> Dict[str, str]:
+    global shortcuts # pylint: disable=global-statement
+    if shortcuts is None:
+        try:
+            shortcuts = config.read_shortcuts()
+        except config.ConfigError as e:
+            raise click.ClickException(e.message) from e
+    return shortcuts
+
 def _update(context: Context, context_string: str, **kwargs: Dict[str, str]) -> Context:
     parsed_context = parse(context_string)
     context.__dict__.update({
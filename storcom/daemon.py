@@ -0,0 +1,315 @@
+# the client runs on every call of storcom, it imports nothing it can do without:
+# click, the config and the commands are only imported when the daemon is not there
+# pylint: disable=import-outside-toplevel
+import array
+import codecs
+import json
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple, cast, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import click
+
+_SOCKET_NAME = 'storcom.sock'
+_STDIO = (0, 1, 2)
+_HEADER_LIMIT = 1024 * 1024
+_RECEIVE_SIZE = 64 * 1024
+_INTERRUPT = b'i'
+_INTERRUPTED_EXIT_CODE = 130
+_NOT_FORWARDED = ('serve',)
+# imported by the daemon before the first command, most commands need them
+_PRELOADED_MODULES = ('storcom.storage', 'storcom.bulk', 'storcom.table', 'storcom.predicate',
+                      'storcom.fanout', 'storcom.index', 'tabulate')
+
+def forward(argv: List[str]) -> Optional[int]:
+    '''
+    Runs the command in the daemon with the standard streams of this process, interrupting
+    it on Ctrl-C. Returns its exit code, None when no daemon is serving or it is busy with
+    another command.
+    '''
+    if not argv or argv[0] in _NOT_FORWARDED or '_STORCOM_COMPLETE' in os.environ:
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(get_socket_path())
+        header = json.dumps({'argv': argv,
+                             'cwd': os.getcwd(),
+                             'environ': dict(os.environ),
+                             'encoding': sys.stdout.encoding if sys.stdout else None})
+        connection.sendmsg([header.encode() + b'\n'],
+                           [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', _STDIO))])
+    except OSError:
+        connection.close()
+        return None
+    with connection:
+        previous = {number: signal.signal(number, lambda *_: _send_interrupt(connection))
+                    for number in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            reply = connection.makefile('rb').readline()
+        finally:
+            for number, handler in previous.items():
+                signal.signal(number, handler)
+    if not reply:
+        print('storcom: the daemon stopped while running the command', file=sys.stderr)
+        return 1
+    result = json.loads(reply)
+    return None if result.get('busy') else int(result['exit'])
+
+def get_socket_path() -> str:
+    # the config directory of storcom.config, which is too slow to import here
+    directory = os.environ.get('STORCOM_HOME') or os.path.join(
+        os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.environ['HOME'], '.config'),
+        'storcom')
+    return os.path.join(directory, _SOCKET_NAME)
+
+class Daemon:
+    '''
+    Serves the commands of the clients on a unix socket in the config directory. The commands
+    run one at a time in the main thread, with the streams, the working directory and the
+    environment of their client. A client which finds the daemon busy runs its command itself.
+    '''
+    def __init__(self, create_cli: Callable[[], 'click.Group'], path: Optional[str] = None):
+        self._create_cli = create_cli
+        self._path = path or get_socket_path()
+        self._busy = threading.Lock()
+        self._requests: 'queue.Queue[Tuple[socket.socket, Dict[str, Any], List[int]]]' = \
+            queue.Queue()
+        self._running = False
+        self._stopping = False
+
+    def run(self) -> None:
+        import importlib
+        import click
+        from storcom import file
+        listener = self._listen()
+        for module in _PRELOADED_MODULES:
+            importlib.import_module(module)
+        file.keep_sessions()
+        signal.signal(signal.SIGUSR1, self._on_interrupt)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+        click.echo(f'Serving storcom commands on {self._path}, stop with Ctrl-C.', err=True)
+        try:
+            while not self._stopping:
+                try:
+                    self._serve_next()
+                except _Interrupted:
+                    # came after the command it was meant for
+                    continue
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            os.unlink(self._path)
+
+    def _listen(self) -> socket.socket:
+        import click
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self._path)
+            raise click.ClickException(f'storcom serve is already running on {self._path}')
+        except (FileNotFoundError, ConnectionRefusedError):
+            # the socket of a daemon which did not stop cleanly
+            if os.path.exists(self._path):
+                os.unlink(self._path)
+        finally:
+            probe.close()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # the commands run with the tokens of the config, only its owner may connect
+        umask = os.umask(0o177)
+        try:
+            listener.bind(self._path)
+        except OSError as e:
+            listener.close()
+            raise click.ClickException(f"Can't listen on {self._path}: {e}") from e
+        finally:
+            os.umask(umask)
+        listener.listen()
+        return listener
+
+    def _accept(self, listener: socket.socket) -> None:
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            try:
+                header, fds = _receive_header(connection)
+            except (OSError, ValueError):
+                connection.close()
+                continue
+            # released by the main thread once the command is done
+            if not self._busy.acquire(blocking=False): # pylint: disable=consider-using-with
+                _close_fds(fds)
+                _send_reply(connection, {'busy': True})
+                connection.close()
+                continue
+            self._requests.put((connection, header, fds))
+
+    def _serve_next(self) -> None:
+        connection, header, fds = self._requests.get()
+        try:
+            done = threading.Event()
+            threading.Thread(target=self._watch, args=(connection, done), daemon=True).start()
+            exit_code = self._run_command(header, fds)
+            done.set()
+            _send_reply(connection, {'exit': exit_code})
+        finally:
+            connection.close()
+            self._busy.release()
+
+    def _run_command(self, header: Dict[str, Any], fds: List[int]) -> int:
+        from storcom import context as storcom_context
+        streams = _open_streams(fds, header.get('encoding') or 'utf-8')
+        saved = (sys.stdin, sys.stdout, sys.stderr, os.getcwd(), dict(os.environ))
+        sys.stdin, sys.stdout, sys.stderr = streams
+        try:
+            try:
+                os.chdir(header['cwd'])
+            except OSError as e:
+                # the client gets the error, the daemon goes on serving
+                print(f"storcom: can't run the command in {header['cwd']}: {e}", file=sys.stderr)
+                return 1
+            os.environ.clear()
+            os.environ.update(header['environ'])
+            # the shortcuts are read once per process, the config may have changed since
+            storcom_context.shortcuts = None
+            return self._invoke(header['argv'])
+        finally:
+            for stream in streams:
+                _close_stream(stream)
+            sys.stdin, sys.stdout, sys.stderr = saved[:3]
+            os.chdir(saved[3])
+            os.environ.clear()
+            os.environ.update(saved[4])
+
+    def _invoke(self, argv: List[str]) -> int:
+        import traceback
+        import click
+        self._running = True
+        try:
+            self._create_cli().main(args=argv, prog_name='storcom')
+            exit_code: Any = 0
+        except SystemExit as e:
+            exit_code = e.code
+        except click.ClickException as e:
+            e.show()
+            exit_code = e.exit_code
+        except _Interrupted:
+            exit_code = _INTERRUPTED_EXIT_CODE
+        except Exception: # pylint: disable=broad-except
+            # the daemon outlives a command which fails, the client gets the traceback
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            self._running = False
+        if exit_code is None or isinstance(exit_code, int):
+            return exit_code or 0
+        print(exit_code, file=sys.stderr)
+        return 1
+
+    def _watch(self, connection: socket.socket, done: threading.Event) -> None:
+        # the client asks to interrupt the command or goes away
+        try:
+            connection.recv(1)
+        except OSError:
+            pass
+        if not done.is_set():
+            signal.pthread_kill(threading.main_thread().ident or 0, signal.SIGUSR1)
+
+    def _on_interrupt(self, *_: Any) -> None:
+        # a late interrupt of a command which has already finished is dropped
+        if self._running:
+            raise _Interrupted()
+
+    def _on_stop(self, *_: Any) -> None:
+        # a running command is aborted as on Ctrl-C, then the daemon stops
+        self._stopping = True
+        raise KeyboardInterrupt()
+
+class _Interrupted(KeyboardInterrupt):
+    pass
+
+def _send_interrupt(connection: socket.socket) -> None:
+    try:
+        connection.send(_INTERRUPT)
+    except OSError:
+        pass
+
+def _receive_header(connection: socket.socket) -> Tuple[Dict[str, Any], List[int]]:
+    fds = array.array('i')
+    message, ancillary, _, _ = connection.recvmsg(_RECEIVE_SIZE,
+                                                  socket.CMSG_SPACE(len(_STDIO) * fds.itemsize))
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % fds.itemsize])
+    try:
+        while not message.endswith(b'\n'):
+            if len(message) > _HEADER_LIMIT:
+                raise ValueError('The header of the command is too long.')
+            received = connection.recv(_RECEIVE_SIZE)
+            if not received:
+                raise ValueError('The client went away before sending the command.')
+            message += received
+        if len(fds) != len(_STDIO):
+            raise ValueError('The client did not send its standard streams.')
+        header: Dict[str, Any] = json.loads(message)
+        _check_header(header)
+    except (OSError, ValueError):
+        _close_fds(list(fds))
+        raise
+    return header, list(fds)
+
+def _check_header(header: Any) -> None:
+    '''
+    Raises ValueError unless the header holds what the command runs with.
+    '''
+    if not isinstance(header, dict):
+        raise ValueError('The header of the command is not an object.')
+    argv, cwd, environ = header.get('argv'), header.get('cwd'), header.get('environ')
+    if not isinstance(argv, list) or not all(isinstance(argument, str) for argument in argv):
+        raise ValueError('The arguments of the command are not strings.')
+    if not isinstance(cwd, str):
+        raise ValueError('The working directory of the command is missing.')
+    if not isinstance(environ, dict) or not all(isinstance(v, str) for v in environ.values()):
+        raise ValueError('The environment of the command is not strings.')
+    encoding = header.get('encoding')
+    if encoding is not None:
+        try:
+            codecs.lookup(encoding)
+        except (TypeError, LookupError) as e:
+            raise ValueError(f'The encoding of the client is unknown: {encoding!r}') from e
+
+def _send_reply(connection: socket.socket, reply: Dict[str, Any]) -> None:
+    try:
+        connection.sendall(json.dumps(reply).encode() + b'\n')
+    except OSError:
+        # the client is gone, there is no one to tell
+        pass
+
+def _open_streams(fds: List[int], encoding: str) -> Tuple[TextIO, TextIO, TextIO]:
+    stdin, stdout, stderr = fds
+    return (_open_stream(stdin, 'r', encoding),
+            # line buffered on a terminal, as the streams of the client would be
+            _open_stream(stdout, 'w', encoding, buffering=1 if os.isatty(stdout) else -1),
+            _open_stream(stderr, 'w', encoding, errors='backslashreplace', buffering=1))
+
+def _open_stream(fd: int, mode: str, encoding: str, **kwargs: Any) -> TextIO:
+    # closed by _close_stream once the command is done
+    return cast(TextIO, open(fd, mode, encoding=encoding, **kwargs)) # pylint: disable=consider-using-with
+
+def _close_stream(stream: TextIO) -> None:
+    try:
+        stream.close()
+    except OSError:
+        # the reader of the output went away, e.g. head
+        pass
+
+def _close_fds(fds: List[int]) -> None:
+    for fd in fds:
+        os.close(fd)
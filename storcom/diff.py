@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Set
+
+from storcom.aliases import FilesPage
+
+# left pages read ahead while the right listing is still going on
+MAX_HELD_BACK_PAGES = 16
+
+def diff_files_pages(left_pages: Iterable[FilesPage], # pylint: disable=too-many-arguments
+                     right_pages: Iterable[FilesPage],
+                     left_key: str,
+                     right_key: str,
+                     intersection: bool = False,
+                     *,
+                     max_held_back: int = MAX_HELD_BACK_PAGES) -> Iterator[FilesPage]:
+    '''
+    Files of the left listing missing from the right one, or present in both when intersection
+    is set, compared by their keys. The right listing is consumed on a separate thread into
+    a set of keys while the left one streams in. At most max_held_back left pages are held
+    back until the right listing is over, then the left listing waits for it. After that the
+    pages are filtered as they arrive.
+    '''
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        right_keys = executor.submit(_collect_keys, right_pages, right_key)
+        held_back: List[FilesPage] = []
+        for page in left_pages:
+            held_back.append(page)
+            if right_keys.done() or len(held_back) >= max_held_back:
+                # blocks on the right listing, the next left page is not read meanwhile
+                keys = right_keys.result()
+                for held_back_page in held_back:
+                    yield _filter_page(held_back_page, left_key, keys, intersection)
+                held_back.clear()
+        for held_back_page in held_back:
+            yield _filter_page(held_back_page, left_key, right_keys.result(), intersection)
+
+def _collect_keys(pages: Iterable[FilesPage], key: str) -> Set[str]:
+    return {str(f[key]) for page in pages for f in page if f.get(key) is not None}
+
+def _filter_page(page: FilesPage, key: str, keys: Set[str], intersection: bool) -> FilesPage:
+    return [f for f in page
+            if (f.get(key) is not None and str(f[key]) in keys) == intersection]
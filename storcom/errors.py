@@ -1,3 +1,8 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from storcom.bulk import BulkReport
+
 class StorcomError(Exception):
     pass
 
@@ -6,3 +11,18 @@ class StorageInteractionError(StorcomError):
 
 class FilterError(StorcomError):
     pass
+
+class CircuitOpenError(StorageInteractionError):
+    pass
+
+class ExportError(StorcomError):
+    pass
+
+class BulkAbortedError(StorcomError):
+    '''
+    The items of a bulk run failed before their end, the report holds the actions which
+    were done by then.
+    '''
+    def __init__(self, message: str, report: 'BulkReport'):
+        super().__init__(message)
+        self.report = report
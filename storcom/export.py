@@ -0,0 +1,232 @@
+import csv
+import io
+import itertools
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence,
+                    Tuple)
+
+from storcom.aliases import FilesPage, Row
+from storcom.errors import ExportError
+
+FORMATS = ('ndjson', 'csv', 'arrow', 'parquet')
+# files held in memory, a row group of parquet
+DEFAULT_BATCH_SIZE = 10000
+# formats which end with a footer, they are written to files only
+COLUMNAR_FORMATS = ('arrow', 'parquet')
+_SUFFIXES = {
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.parquet': 'parquet',
+}
+# sizes are integers even when a storage sends them as strings
+_INTEGER_FIELDS = frozenset(['file_bytes'])
+_DATE = re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?')
+_ZONE = re.compile(r'(Z|[+-]\d{2}:?\d{2})$')
+_KINDS: List[Tuple[str, Callable[[Any], bool]]] = [
+    ('boolean', lambda value: isinstance(value, bool)),
+    ('integer', lambda value: isinstance(value, int) and not isinstance(value, bool)),
+    ('number', lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)),
+    ('json', lambda value: isinstance(value, (dict, list))),
+    ('date', lambda value: isinstance(value, str) and _DATE.fullmatch(value) is not None),
+]
+
+@dataclass
+class Column:
+    name: str
+    # string, integer, number, boolean, date or json
+    kind: str
+    # the dates carry their zone and are stored as UTC timestamps
+    zoned: bool = False
+
+    def convert(self, value: Any) -> Any:
+        '''
+        The value as the column holds it, the dates stay ISO strings. Missing and empty
+        values of the typed columns are None.
+        '''
+        if self.kind == 'string':
+            return value if value is None or isinstance(value, str) else json.dumps(value)
+        if value is None or value == '':
+            return None
+        try:
+            if self.kind == 'integer':
+                # int() would truncate them silently
+                if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+                    raise ValueError(value)
+                return int(value)
+            if self.kind == 'number':
+                return float(value)
+        except (TypeError, ValueError) as e:
+            raise ExportError(f'{self.name} holds {value!r}, the first files made it '
+                              f'{self.kind}.') from e
+        return value
+
+def get_format(path: Path) -> Optional[str]:
+    return _SUFFIXES.get(path.suffix.lower())
+
+def get_fields(files: FilesPage) -> List[str]:
+    '''
+    Fields of the files in the order they first appear.
+    '''
+    return list(dict.fromkeys(field for f in files for field in f))
+
+def infer_columns(fields: Sequence[str], rows: Sequence[Row]) -> List[Column]:
+    '''
+    Types of the columns guessed from the values of a sample of the rows, as the table
+    guesses its numeric columns.
+    '''
+    return [_infer_column(field, [row[i] for row in rows]) for i, field in enumerate(fields)]
+
+def export_rows(pages: Iterable[List[Row]],
+                fields: List[str],
+                output: BinaryIO,
+                output_format: str,
+                batch_size: int) -> int:
+    '''
+    Writes the rows to output as they are listed, batch_size rows at a time: a row group of
+    parquet, a record batch of arrow. The types of the columns are inferred from the first
+    batch. Returns the number of rows.
+    '''
+    batches = _batch_rows(pages, batch_size)
+    first = next(batches, [])
+    columns = infer_columns(fields, first)
+    writer = _WRITERS[output_format](output, columns)
+    count = 0
+    try:
+        for batch in itertools.chain([first], batches):
+            writer.write(batch)
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+class _NdjsonWriter:
+    def __init__(self, output: BinaryIO, columns: List[Column]):
+        self._output = output
+        self._columns = columns
+
+    def write(self, rows: List[Row]) -> None:
+        names = [column.name for column in self._columns]
+        self._output.write(b''.join(
+            json.dumps(dict(zip(names, _convert(self._columns, row)))).encode() + b'\n'
+            for row in rows))
+
+    def close(self) -> None:
+        self._output.flush()
+
+class _CsvWriter:
+    def __init__(self, output: BinaryIO, columns: List[Column]):
+        self._columns = columns
+        self._text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+        self._writer = csv.writer(self._text)
+        self._writer.writerow([column.name for column in columns])
+
+    def write(self, rows: List[Row]) -> None:
+        self._writer.writerows(
+            [json.dumps(value) if isinstance(value, (dict, list)) else value
+             for value in _convert(self._columns, row)]
+            for row in rows)
+
+    def close(self) -> None:
+        self._text.flush()
+        # the output stays open for its owner
+        self._text.detach()
+
+class _ColumnarWriter:
+    '''
+    Arrow IPC file or parquet file of the typed columns, one record batch or row group
+    per batch of rows.
+    '''
+    def __init__(self, output: BinaryIO, columns: List[Column], parquet: bool):
+        self._pyarrow = _import_pyarrow()
+        pa = self._pyarrow
+        self._columns = columns
+        self._schema = pa.schema([(column.name, _get_arrow_type(pa, column))
+                                  for column in columns])
+        if parquet:
+            import pyarrow.parquet # pylint: disable=import-outside-toplevel
+            self._writer = pyarrow.parquet.ParquetWriter(output, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(output, self._schema)
+
+    def write(self, rows: List[Row]) -> None:
+        if not rows:
+            return
+        pa = self._pyarrow
+        arrays = [self._to_array([row[i] for row in rows], column)
+                  for i, column in enumerate(self._columns)]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def _to_array(self, values: List[Any], column: Column) -> Any:
+        pa = self._pyarrow
+        arrow_type = _get_arrow_type(pa, column)
+        values = [column.convert(value) for value in values]
+        try:
+            if column.kind == 'json':
+                return pa.array([None if value is None else json.dumps(value)
+                                 for value in values], arrow_type)
+            if column.kind == 'date':
+                # parsed by arrow, much faster than one datetime at a time
+                return pa.array(values, pa.string()).cast(arrow_type)
+            return pa.array(values, arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ExportError(f'{column.name} does not fit the {column.kind} type the first '
+                              f'files made it: {e}') from e
+
+_WRITERS: Dict[str, Callable[[BinaryIO, List[Column]], Any]] = {
+    'ndjson': _NdjsonWriter,
+    'csv': _CsvWriter,
+    'arrow': lambda output, columns: _ColumnarWriter(output, columns, parquet=False),
+    'parquet': lambda output, columns: _ColumnarWriter(output, columns, parquet=True),
+}
+
+def _infer_column(name: str, values: List[Any]) -> Column:
+    present = [value for value in values if value is not None and value != '']
+    if name in _INTEGER_FIELDS:
+        return Column(name, 'integer')
+    # the first kind which all the values fit, the narrowest
+    kind = next((kind for kind, fits in _KINDS if present and all(fits(v) for v in present)),
+                'string')
+    return Column(name,
+                  kind,
+                  zoned=kind == 'date' and all(_ZONE.search(value) for value in present))
+
+def _get_arrow_type(pa: Any, column: Column) -> Any:
+    if column.kind == 'date':
+        return pa.timestamp('us', tz='UTC' if column.zoned else None)
+    return {
+        'integer': pa.int64(),
+        'number': pa.float64(),
+        'boolean': pa.bool_(),
+    }.get(column.kind, pa.string())
+
+def _convert(columns: List[Column], row: Row) -> List[Any]:
+    return [column.convert(value) for column, value in zip(columns, row)]
+
+def _batch_rows(pages: Iterable[List[Row]], size: int) -> Iterator[List[Row]]:
+    batch: List[Row] = []
+    for page in pages:
+        for row in page:
+            batch.append(row)
+            if len(batch) == size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise ExportError("The arrow and parquet formats need pyarrow: "
+                          "pip install 'storcom[arrow]'") from e
+    return pyarrow
@@ -0,0 +1,341 @@
+import hashlib
+import json
+import operator
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+from storcom.errors import FilterError
+from storcom.predicate import Predicate, compile_predicate, parse
+
+_FCC_FILES_PATH = '/files'
+_CX_FILES_PATH = '/core/v2/storage/files'
+_DATA_SUFFIX = '/data'
+# query string params of the fcc listing which are not filters
+_FCC_LISTING_PARAMS = frozenset(['limit', 'offset', 'ordering'])
+_FCC_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    'eq': operator.eq,
+    'lt': operator.lt,
+    'gt': operator.gt,
+    'lte': operator.le,
+    'gte': operator.ge,
+}
+
+class FakeStorageServer(ThreadingHTTPServer): # pylint: disable=too-many-instance-attributes
+    '''
+    In-process stand-in for the FCC and CX files endpoints, used by tests and benchmarks.
+    '''
+    daemon_threads = True
+
+    # the default backlog is too short for hundreds of concurrent clients
+    request_queue_size = 1024
+
+    def __init__(self, files: Optional[List[Dict[str, Any]]] = None, latency: float = 0):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.files: Dict[str, Dict[str, Any]] = {f['id']: f for f in files or []}
+        # the content behind {file}/data, served with ranges
+        self.contents: Dict[str, bytes] = {}
+        # ids of the files whose deletes are forbidden
+        self.locked: Set[str] = set()
+        self.latency = latency
+        self.injected_errors: List[Tuple[int, Dict[str, str]]] = []
+        self.injected_errors_after = 0
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        # the JSON bodies are sent without a length in chunks of this size
+        self.chunk_size: Optional[int] = None
+        self.bytes_sent = 0
+        # filtered and ordered listings by query, paging through a big container filters it once
+        self.listings: Dict[Tuple[str, str], Tuple[Tuple[int, int], List[Dict[str, Any]]]] = {}
+        self.version = 0
+
+    def inject_errors(self,
+                      status: int,
+                      count: int = 1,
+                      headers: Optional[Dict[str, str]] = None,
+                      after: int = 0) -> None:
+        '''
+        Makes the next count requests fail with the status once after more requests succeed.
+        '''
+        with self.lock:
+            self.injected_errors.extend([(status, headers or {})] * count)
+            self.injected_errors_after = after
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host!s}:{port}'
+
+def make_files(count: int,
+               owner: str = 'usr',
+               container_sid: str = 'container') -> List[Dict[str, Any]]:
+    '''
+    Synthetic container with the fields both storages list and filter by.
+    '''
+    files = []
+    for i in range(count):
+        date = f'2023-01-{18 + i // 86400 % 10:02d}T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:' \
+               f'{i % 60:02d}.000Z'
+        files.append({
+            'id': f'{i:08d}',
+            'file_sid': f'{i:08d}',
+            'name': f'file-{i}.bin',
+            'batch': f'batch-{i % 10}',
+            'owner': owner,
+            'container_sid': container_sid,
+            'type': 'audio' if i % 2 else 'file',
+            'mime_type': 'audio/wav' if i % 2 else 'application/octet-stream',
+            'file_bytes': i % 1000 * 1024,
+            'date_changed': date,
+            'date_created': date,
+            'date_modified': date,
+        })
+    return files
+
+@contextmanager
+def serve(files: Optional[List[Dict[str, Any]]] = None,
+          latency: float = 0) -> Iterator[FakeStorageServer]:
+    server = FakeStorageServer(files, latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without it every keep-alive response stalls
+    disable_nagle_algorithm = True
+    server: FakeStorageServer
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format: str, *args: Any) -> None: # pylint: disable=redefined-builtin
+        pass
+
+    def do_HEAD(self) -> None: # pylint: disable=invalid-name
+        self.do_GET()
+
+    def do_GET(self) -> None: # pylint: disable=invalid-name
+        path, query = self._parse()
+        if self._send_injected_error():
+            return
+        if path.endswith(_DATA_SUFFIX):
+            self._send_content(_get_file_id(path[:-len(_DATA_SUFFIX)]))
+            return
+        file_id = _get_file_id(path)
+        if file_id is None:
+            try:
+                self._send_validated_json(self._get_page(path, query))
+            except FilterError as e:
+                self._send_json(400, {'message': str(e)})
+        elif file_id in self.server.files:
+            self._send_validated_json(self.server.files[file_id])
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+    def do_DELETE(self) -> None: # pylint: disable=invalid-name
+        path, _ = self._parse()
+        if self._send_injected_error():
+            return
+        file_id = _get_file_id(path)
+        if file_id in self.server.locked:
+            self._send_json(403, {'message': 'forbidden'})
+            return
+        with self.server.lock:
+            deleted = self.server.files.pop(file_id or '', None)
+            self.server.version += 1
+        if deleted is None:
+            self._send_json(404, {'message': 'not found'})
+        else:
+            self._send_json(204, None)
+
+    def do_POST(self) -> None: # pylint: disable=invalid-name
+        path, _ = self._parse()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self._send_injected_error():
+            return
+        if path not in (_FCC_FILES_PATH, _CX_FILES_PATH):
+            self._send_json(404, {'message': 'not found'})
+            return
+        fields = _parse_multipart(self.headers.get('Content-Type', ''), body)
+        attributes = {name: value.decode() for name, value in fields.items() if name != 'file'}
+        if path == _CX_FILES_PATH:
+            attributes = json.loads(attributes.get('data', '{}'))
+        file_id = uuid.uuid4().hex
+        content = fields.get('file', b'')
+        file = {**attributes, 'id': file_id, 'file_sid': file_id, 'file_bytes': len(content)}
+        with self.server.lock:
+            self.server.files[file_id] = file
+            self.server.contents[file_id] = content
+            self.server.version += 1
+        self._send_json(201, file)
+
+    def _parse(self) -> Tuple[str, Dict[str, List[str]]]:
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        return url.path, parse_qs(url.query)
+
+    def _get_page(self, path: str, query: Dict[str, List[str]]) -> Dict[str, Any]:
+        limit = int(query.get('limit', ['1000'])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        files = self._get_listing(path, query)
+        items = files[offset:offset + limit]
+        has_more = offset + limit < len(files)
+        next_url = None
+        if has_more:
+            next_query = {k: v[0] for k, v in query.items()}
+            next_query['offset'] = str(offset + limit)
+            next_url = f'{path}?{urlencode(next_query)}'
+        if path == _CX_FILES_PATH:
+            if query.get('include_fields'):
+                fields = query['include_fields'][-1].split(',')
+                items = [{name: f[name] for name in fields if name in f} for f in items]
+            return {'items': items, 'has_more': has_more, 'pagination': {'next': next_url}}
+        return {'items': items, 'next': next_url}
+
+    def _get_listing(self, path: str, query: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        key = (path, urlencode(sorted((name, values[-1]) for name, values in query.items()
+                                      if name not in ('limit', 'offset'))))
+        with self.server.lock:
+            # files changed by the tests directly are noticed by their count
+            version = (self.server.version, len(self.server.files))
+            listing = self.server.listings.get(key)
+            if listing and listing[0] == version:
+                return listing[1]
+            files = list(self.server.files.values())
+        files = _filter_files(path, query, files)
+        with self.server.lock:
+            self.server.listings[key] = (version, files)
+        return files
+
+    def _send_content(self, file_id: Optional[str]) -> None:
+        content = self.server.contents.get(file_id or '')
+        if content is None:
+            self._send_json(404, {'message': 'not found'})
+            return
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        status, start, end = 200, 0, len(content)
+        requested = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if requested and self.headers.get('If-Range', etag) == etag:
+            status, start = 206, int(requested[1])
+            end = min(int(requested[2]) + 1, len(content)) if requested[2] else len(content)
+        self.send_response(status)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(content)}')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content[start:end])
+
+    def _send_injected_error(self) -> bool:
+        with self.server.lock:
+            if not self.server.injected_errors:
+                return False
+            if self.server.injected_errors_after:
+                self.server.injected_errors_after -= 1
+                return False
+            status, headers = self.server.injected_errors.pop(0)
+        self._send_json(status, {'message': 'injected error'}, headers)
+        return True
+
+    def _send_validated_json(self, body: Any) -> None:
+        # a client which has the same body already gets a 304 without it
+        etag = f'"{hashlib.md5(json.dumps(body).encode()).hexdigest()}"'
+        if self.headers.get('If-None-Match') != etag:
+            self._send_json(200, body, {'ETag': etag})
+            return
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.end_headers()
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        chunk_size = self.server.chunk_size
+        if chunk_size and payload:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        with self.server.lock:
+            self.server.bytes_sent += len(payload)
+        if chunk_size and payload:
+            for i in range(0, len(payload), chunk_size):
+                chunk = payload[i:i + chunk_size]
+                self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.wfile.write(payload)
+
+def _get_file_id(path: str) -> Optional[str]:
+    for files_path in (_FCC_FILES_PATH, _CX_FILES_PATH):
+        if path.startswith(f'{files_path}/'):
+            return path[len(files_path) + 1:]
+    return None
+
+def _filter_files(path: str,
+                  query: Dict[str, List[str]],
+                  files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    predicate: Optional[Predicate] = None
+    if path == _CX_FILES_PATH and query.get('filter'):
+        predicate = compile_predicate(parse(query['filter'][-1]))
+    elif path == _FCC_FILES_PATH:
+        predicates = [_to_fcc_predicate(name, values[-1]) for name, values in query.items()
+                      if name not in _FCC_LISTING_PARAMS]
+        predicate = (lambda f: all(p(f) for p in predicates)) if predicates else None
+    if predicate:
+        files = [f for f in files if predicate(f)]
+    ordering = query.get('ordering', [''])[-1]
+    if ordering:
+        field = ordering.lstrip('-')
+        files = sorted(files, key=lambda f: str(f.get(field, '')), reverse=ordering[0] == '-')
+    return files
+
+def _to_fcc_predicate(name: str, value: str) -> Predicate:
+    field, _, suffix = name.partition('__')
+    compare = _FCC_OPERATORS.get(suffix or 'eq')
+    if compare is None:
+        raise FilterError(f'Unsupported filter: {name}')
+    if not field.startswith('date_'):
+        return lambda f: compare(str(f.get(field, '')), value)
+    expected = _parse_date(value)
+    return lambda f: field in f and compare(_parse_date(f[field]), expected)
+
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError as e:
+        raise FilterError(f'Invalid date: {value}') from e
+
+def _parse_multipart(content_type: str, body: bytes) -> Dict[str, bytes]:
+    message = BytesParser(policy=HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+    return {str(part.get_param('name', header='content-disposition')):
+            bytes(part.get_payload(decode=True)) for part in message.iter_parts()}
@@ -0,0 +1,147 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, Mapping, Optional, \
+    Tuple, TypeVar, TYPE_CHECKING
+
+from storcom.aliases import FilesPage
+from storcom.bulk import describe_error, put_unless_stopped
+from storcom.errors import StorcomError
+
+if TYPE_CHECKING:
+    import requests
+    from storcom.storage import BaseStorage
+
+T = TypeVar('T')
+
+_GET_TIMEOUT = 0.1
+
+@dataclass
+class FanOut:
+    '''
+    Storages of several contexts by their labels, a command runs on them concurrently.
+    At most parallel contexts are served at a time, the storages of a host share a session.
+    '''
+    storages: Dict[str, 'BaseStorage']
+    parallel: int
+    sessions: List['requests.Session'] = field(default_factory=list)
+
+    def close(self) -> None:
+        for storage in self.storages.values():
+            storage.close()
+        for session in self.sessions:
+            session.close()
+
+@dataclass
+class ContextPage:
+    context: str
+    page: FilesPage = field(default_factory=list)
+    error: Optional[str] = None
+
+def merge_pages(sources: Mapping[str, Callable[[], Iterable[FilesPage]]],
+                parallel: int) -> Generator[ContextPage, None, None]:
+    '''
+    Pages of all the sources as they arrive, tagged with their source. At most parallel sources
+    are listed at a time and they wait while parallel pages are not consumed. A failed source
+    is reported with its error and does not stop the others.
+    '''
+    pages: 'queue.Queue[Tuple[ContextPage, bool]]' = queue.Queue(maxsize=parallel)
+    stop = threading.Event()
+
+    def list_source(context: str, list_pages: Callable[[], Iterable[FilesPage]]) -> None:
+        try:
+            for page in list_pages():
+                if not put_unless_stopped(pages, (ContextPage(context, page), False), stop):
+                    return
+        except StorcomError as e:
+            put_unless_stopped(pages, (ContextPage(context, error=describe_error(e)), False), stop)
+        finally:
+            put_unless_stopped(pages, (ContextPage(context), True), stop)
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        try:
+            futures = [executor.submit(list_source, context, list_pages)
+                       for context, list_pages in sources.items()]
+            finished = 0
+            while finished < len(sources):
+                result, done = pages.get()
+                finished += done
+                if not done:
+                    yield result
+            for future in futures:
+                future.result()
+        finally:
+            # the consumer is gone, the sources stop at their next page
+            stop.set()
+
+def run_contexts(action: Callable[[str], T],
+                 contexts: Iterable[str],
+                 parallel: int) -> Iterator[Tuple[str, T]]:
+    '''
+    Results of the action for every context as they complete, parallel contexts at a time.
+    '''
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = {executor.submit(action, context): context for context in contexts}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+class Router:
+    '''
+    Items read by a background thread and routed to a bounded queue per target, the consumer
+    of each target takes them as they are read. The consumers run at the same time: the
+    reader waits while the queue of a target is full. An error of the items or of the routing
+    is raised by every consumer.
+    '''
+    def __init__(self,
+                 items: Iterable[str],
+                 route: Callable[[str], Iterable[Tuple[str, str]]],
+                 targets: Iterable[str],
+                 size: int):
+        self._items = items
+        self._route = route
+        self._queues: Dict[str, 'queue.Queue[Tuple[str, Optional[Exception], bool]]'] = \
+            {target: queue.Queue(maxsize=size) for target in targets}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+
+    def __enter__(self) -> 'Router':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def consume(self, target: str) -> Generator[str, None, None]:
+        done = False
+        try:
+            while not self._stop.is_set():
+                try:
+                    item, error, done = self._queues[target].get(timeout=_GET_TIMEOUT)
+                except queue.Empty:
+                    continue
+                if done:
+                    if error:
+                        raise error
+                    return
+                yield item
+            raise StorcomError('Another consumer stopped before the end of the items.')
+        finally:
+            if not done:
+                # the reader would wait for room in the queue of this target forever
+                self._stop.set()
+
+    def _read(self) -> None:
+        end: Tuple[str, Optional[Exception], bool] = ('', None, True)
+        try:
+            for item in self._items:
+                for target, routed in self._route(item):
+                    if not put_unless_stopped(self._queues[target], (routed, None, False),
+                                              self._stop):
+                        return
+        except Exception as e: # pylint: disable=broad-except
+            # raised again by the consumers
+            end = ('', e, True)
+        for entries in self._queues.values():
+            put_unless_stopped(entries, end, self._stop)
@@ -1,107 +1,875 @@
-from typing import List
+# requests, tabulate and the storages are imported on use: every shell completion
+# builds the command groups, and it should not pay for them
+# pylint: disable=import-outside-toplevel
+import dataclasses
+import functools
+import itertools
+import json
+import os
+import sys
+from pathlib import Path
+from typing import (List, Optional, Iterable, Iterator, Dict, Type, Callable, Any, Tuple, Union,
+                    cast, TYPE_CHECKING)
 
 import click
 from click import ClickException
-from tabulate import tabulate
 
 from storcom import context as storcom_context
-from storcom.storage import BaseStorage, FccStorage, CxStorage
-from storcom.config import read_storage_config, ConfigError
-from storcom.errors import StorcomError, StorageInteractionError
-from storcom.aliases import QueryArg
+from storcom.config import read_storage_config, ConfigError, StorageConfig
+from storcom.errors import BulkAbortedError, StorcomError, StorageInteractionError
+from storcom.export import (FORMATS as EXPORT_FORMATS,
+                            DEFAULT_BATCH_SIZE as DEFAULT_EXPORT_BATCH_SIZE)
+from storcom.aliases import QueryArg, FilesPage, Row
+from storcom.filter import get_storage_filters
+
+if TYPE_CHECKING:
+    import requests
+    from click.shell_completion import CompletionItem
+    from storcom.bulk import BulkReport, ProgressCallback
+    from storcom.fanout import FanOut
+    from storcom.httpcache import HttpCache
+    from storcom.storage import BaseStorage
 
 _DEFAULT_SHOW_URL = False
+_DEFAULT_ENGINE = 'thread'
+_DEFAULT_MAX_AGE = 300
+_DEFAULT_METRICS_FORMAT = 'json'
+_FAN_OUT_COMMANDS = ('ls', 'rm')
+# pages of ids listed ahead of the deletes of purge
+_PURGE_PAGES_AHEAD = 2
+# ids of rm read ahead of the deletes of each context of a fan-out
+_ROUTED_IDS_AHEAD = 1000
+
+# connection pools by host and size, kept open between the commands of a long-lived process
+_kept_sessions: Optional[Dict[Tuple[str, int], 'requests.Session']] = None # pylint: disable=invalid-name
 
+@dataclasses.dataclass(frozen=True)
+class _MetricsOutput:
+    stats: bool
+    path: Optional[Path] = None
+    format: str = _DEFAULT_METRICS_FORMAT
+    command: str = ''
 
-def create_group(context: storcom_context.Context) -> click.core.Group:
+
+def create_group(context: storcom_context.Context) -> click.core.Group: # pylint: disable=too-many-statements
     @click.group('file')
     @click.option('--context_string',
                   '-c',
-                  shell_complete=storcom_context.complete_with_shortcut,
-                  help='Temporarily set context using CONTEXT_STRING for the command.')
+                  shell_complete=storcom_context.complete_with_shortcuts,
+                  help='Temporarily set context using CONTEXT_STRING for the command. '
+                       'ls and rm also run on several contexts at once: a comma separated '
+                       'list or a glob over the shortcut names, e.g. "qa_*,dev_a".')
     @click.option('--show_curl',
                   '-u',
                   is_flag=True,
                   show_default=True,
                   default=_DEFAULT_SHOW_URL,
                   help='Show curl.')
+    @click.option('--workers',
+                  '-w',
+                  type=click.IntRange(min=1),
+                  help='Number of concurrent requests, overrides the storage config. '
+                       'Bounds the total over all the contexts of a fan-out.')
+    @click.option('--engine',
+                  type=click.Choice(['thread', 'async']),
+                  show_default=True,
+                  default=_DEFAULT_ENGINE,
+                  help='Run requests on a thread pool or on an asyncio event loop.')
+    @click.option('--stats',
+                  is_flag=True,
+                  help='Print a summary of the requests to stderr at exit: counts by status, '
+                       'latency percentiles and throughput.')
+    @click.option('--metrics_file',
+                  type=click.Path(dir_okay=False, path_type=Path),
+                  help='Write the request metrics to METRICS_FILE at exit.')
+    @click.option('--metrics_format',
+                  type=click.Choice(['json', 'prometheus']),
+                  show_default=True,
+                  default=_DEFAULT_METRICS_FORMAT,
+                  help='Format of the metrics file, prometheus is a textfile collector file.')
+    @click.option('--no_http_cache',
+                  is_flag=True,
+                  help='Fetch the file details and the listings again instead of revalidating '
+                       'the responses cached by the previous runs, and cache none.')
     @click.pass_context
-    def file_group(click_context: click.Context, context_string: str, show_curl: bool) -> None:
+    def file_group(click_context: click.Context, /, **_: Any) -> None:
         '''
         Work with files.
         '''
-        context = storcom_context.parse(context_string) or click_context.obj
-        try:
-            click_context.obj = _get_storage(context, show_curl)
-        except ConfigError as e:
-            raise ClickException(e.message) from e
+        _open_storage(click_context)
 
 
     @file_group.command()
     @click.option('--column', multiple=True, help='Extra column to output.')
+    @click.option('--max_width',
+                  type=click.IntRange(min=2),
+                  help='Truncate the values longer than MAX_WIDTH characters.')
+    @_listing_options
     @click.pass_obj
-    def ll(storage: BaseStorage, /, column: List[str], **kwargs: QueryArg) -> None:
+    def ll(storage: 'BaseStorage', # pylint: disable=too-many-arguments
+           /,
+           *,
+           column: List[str],
+           max_width: Optional[int],
+           where: Optional[str],
+           cached: bool,
+           max_age: Optional[int],
+           **kwargs: QueryArg) -> None:
         '''
         List files in a human-readable format.
         '''
+        from storcom.table import render_table
         try:
-            tabulated_list = tabulate(*storage.list_files_tabular(middle_columns=column,
-                                                                  filters=kwargs),
-                                      tablefmt='presto')
-            print(tabulated_list)
+            headers = storage.get_tabular_fields(column)
+            pages = _remember_rows(storage,
+                                   _list_files_rows(storage, headers, kwargs, where,
+                                                    cached=cached,
+                                                    max_age=max_age),
+                                   headers)
+            for line in render_table((row for rows in pages for row in rows), headers, max_width):
+                print(line)
         except StorcomError as e:
             raise ClickException(str(e)) from e
 
     @file_group.command()
+    @_listing_options
     @click.pass_obj
-    def ls(storage: BaseStorage, /, **kwargs: QueryArg) -> None:
+    def ls(storage: Union['BaseStorage', 'FanOut'],
+           /,
+           where: Optional[str],
+           cached: bool,
+           max_age: Optional[int],
+           **kwargs: QueryArg) -> None:
         '''
-        List files as raw JSON.
+        List files as JSON, one file per line. On several contexts they are listed
+        concurrently, and every file is tagged with its context.
         '''
+        if _is_fan_out(storage):
+            _list_fan_out(cast('FanOut', storage), kwargs, where, cached, max_age)
+            return
         try:
-            print(storage.list_files(filters=kwargs))
+            single_storage = cast('BaseStorage', storage)
+            for page in _remember_files(single_storage,
+                                        _list_files_pages(single_storage, kwargs, where, cached,
+                                                          max_age)):
+                for f in page:
+                    print(json.dumps(f))
         except StorcomError as e:
             raise ClickException(str(e)) from e
 
     @file_group.command()
-    @click.argument('file_id')
+    @click.argument('destination',
+                    type=click.Path(dir_okay=False, allow_dash=True, path_type=Path))
+    @click.option('--format',
+                  'output_format',
+                  type=click.Choice(EXPORT_FORMATS),
+                  help='Format of DESTINATION, by default guessed from its suffix: .ndjson, '
+                       '.jsonl, .csv, .arrow, .feather or .parquet. ndjson for -.')
+    @click.option('--column',
+                  multiple=True,
+                  help='Column to export, the fields of the first files by default.')
+    @click.option('--batch_size',
+                  type=click.IntRange(min=1),
+                  show_default=True,
+                  default=DEFAULT_EXPORT_BATCH_SIZE,
+                  help='Files held in memory and written at once, a row group of parquet.')
+    @_listing_options
     @click.pass_obj
-    def show(storage: BaseStorage, file_id: str) -> None:
+    def export(storage: 'BaseStorage', # pylint: disable=too-many-arguments
+               /,
+               *,
+               destination: Path,
+               output_format: Optional[str],
+               column: List[str],
+               batch_size: int,
+               where: Optional[str],
+               cached: bool,
+               max_age: Optional[int],
+               **kwargs: QueryArg) -> None:
         '''
-        Show file details by its FILE_ID.
+        Export the files to DESTINATION as they are listed, takes the filters of ls. Use - to
+        write to stdout. The types of the columns are inferred from the first files: dates
+        become timestamps of arrow and parquet, sizes integers.
         '''
         try:
-            print(storage.show_file(file_id))
-        except StorageInteractionError as e:
+            fields, rows = _list_export_rows(storage, column, kwargs, where,
+                                             cached=cached,
+                                             max_age=max_age)
+            count = _export_rows(rows, fields, destination, output_format, batch_size)
+        except StorcomError as e:
             raise ClickException(str(e)) from e
+        click.echo(f'Exported {count} files to {destination}.', err=True)
 
     @file_group.command()
-    @click.argument('file_ids', nargs=-1)
+    @click.argument('file_ids', nargs=-1, required=True, shell_complete=_complete_file_ids)
+    @click.option('--ordered',
+                  is_flag=True,
+                  help='Output the files in the order of the ids instead of as they arrive.')
     @click.pass_obj
-    def rm(storage: BaseStorage, file_ids: List[str]) -> None:
+    def show(storage: 'BaseStorage', file_ids: List[str], ordered: bool) -> None:
         '''
-        Delete files by their FILE_IDS.
+        Show file details by their FILE_IDS, use - to read the ids from stdin one per line.
+        A single id is shown as returned by the storage, many ids are fetched concurrently and
+        shown as JSON, one file per line. Failures are reported on stderr per id.
         '''
+        if len(file_ids) == 1 and file_ids[0] != '-':
+            try:
+                print(storage.show_file(file_ids[0]))
+            except StorageInteractionError as e:
+                raise ClickException(str(e)) from e
+            return
+        _show_files(storage, _read_file_ids(file_ids), ordered)
+
+    @file_group.command()
+    @click.argument('file_ids', nargs=-1, shell_complete=_complete_file_ids)
+    @click.pass_obj
+    def rm(storage: Union['BaseStorage', 'FanOut'], file_ids: List[str]) -> None:
+        '''
+        Delete files by their FILE_IDS, use - to read the ids from stdin one per line.
+        Prints a JSON report with succeeded and failed ids. On several contexts the files
+        tagged by ls are deleted from their context, plain ids from all of them.
+        '''
+        if _is_fan_out(storage):
+            _delete_fan_out(cast('FanOut', storage), _read_file_ids(file_ids))
+            return
+        _delete_files(cast('BaseStorage', storage), _read_file_ids(file_ids))
+
+    @file_group.command()
+    @click.option('--rate',
+                  type=click.FloatRange(min=0, min_open=True),
+                  help='Delete at most RATE files a second.')
+    @click.option('--dry_run',
+                  is_flag=True,
+                  help='Only count the files which would be deleted.')
+    @_where_option
+    @click.pass_context
+    def purge(click_context: click.Context,
+              /,
+              rate: Optional[float],
+              dry_run: bool,
+              where: Optional[str],
+              **kwargs: QueryArg) -> None:
+        '''
+        Delete the listed files while the listing goes on, takes the filters of ls. Prints
+        a JSON report with the number of deleted files and the failed ids.
+        '''
+        if click_context.parent and click_context.parent.params['engine'] != 'thread':
+            raise ClickException('purge runs on the thread engine only.')
+        storage: 'BaseStorage' = click_context.obj
         try:
-            storage.delete_files(file_ids)
-        except StorageInteractionError as e:
+            if dry_run:
+                pages = _list_files_pages(storage, kwargs, where, False, None)
+                print(json.dumps({'matched': sum(len(page) for page in pages)}))
+                return
+            _purge_files(storage, kwargs, where, rate)
+        except StorcomError as e:
             raise ClickException(str(e)) from e
 
-    try:
-        for f in _get_storage(context, _DEFAULT_SHOW_URL).supported_filters:
-            ll = click.option(f'--{f.field}', multiple=f.multiple)(ll)
-            ls = click.option(f'--{f.field}', multiple=f.multiple)(ls)
-    except ConfigError:
-        # create the file group even if the config is corrupt, this way we give an opportunity
-        # to fix it using commands from the context group
-        pass
+    @file_group.command()
+    @click.argument('file_id', shell_complete=_complete_file_ids)
+    @click.argument('destination', required=False, type=click.Path(dir_okay=False, path_type=Path))
+    @click.pass_obj
+    def get(storage: 'BaseStorage', file_id: str, destination: Optional[Path]) -> None:
+        '''
+        Download the content of FILE_ID to DESTINATION, the id by default. Big files are
+        downloaded in parallel ranges, an interrupted download resumes on the next run.
+        '''
+        _get_file(storage, file_id, destination or Path(file_id))
+
+    @file_group.command()
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False, path_type=Path))
+    @click.option('--name', help='Name of the new file, the name of PATH by default.')
+    @click.pass_obj
+    def put(storage: 'BaseStorage', path: Path, name: Optional[str]) -> None:
+        '''
+        Upload PATH as a new file streaming it from disk, prints the created file.
+        '''
+        _put_file(storage, path, name)
+
+    @file_group.command()
+    @click.argument('other_context_string', shell_complete=storcom_context.complete_with_shortcut)
+    @click.option('--key',
+                  help='Field to compare the files by, e.g. name or checksum. '
+                       'The id field of each storage by default.')
+    @click.option('--intersection',
+                  is_flag=True,
+                  help='Output the files present in both contexts instead.')
+    @click.option('--rm',
+                  'remove',
+                  is_flag=True,
+                  help='Delete the resulting files from the current context once both '
+                       'listings are over instead of printing them.')
+    @click.pass_context
+    def diff(click_context: click.Context,
+             other_context_string: str,
+             key: Optional[str],
+             intersection: bool,
+             remove: bool) -> None:
+        '''
+        List files of the current context missing from OTHER_CONTEXT_STRING as JSON, one file
+        per line. Both contexts are listed concurrently.
+        '''
+        from storcom.diff import diff_files_pages
+        storage: 'BaseStorage' = click_context.obj
+        other_storage = _get_other_storage(click_context, other_context_string)
+        pages = diff_files_pages(storage.list_files_pages({}),
+                                 other_storage.list_files_pages({}),
+                                 key or storage.id_field,
+                                 key or other_storage.id_field,
+                                 intersection)
+        try:
+            if remove:
+                # the listing is paged by offset, deleting while it goes on would move the files
+                # not listed yet behind the offset
+                _delete_files(storage, [str(f[storage.id_field]) for page in pages for f in page])
+                return
+            for page in pages:
+                for f in page:
+                    print(json.dumps(f))
+        except StorcomError as e:
+            raise ClickException(str(e)) from e
+
+    @file_group.command()
+    @click.pass_obj
+    def invalidate(storage: 'BaseStorage') -> None:
+        '''
+        Drop the cached listing of the context, the next --cached listing rebuilds it, and
+        the cached responses of the context.
+        '''
+        from storcom.httpcache import HttpCache
+        from storcom.index import open_existing_index
+        index = open_existing_index()
+        if index:
+            index.invalidate(storage.context)
+            index.close()
+        HttpCache().clear(storage.context)
+
+    # the filters depend on the storage type only, neither the config nor a storage are needed
+    for f in get_storage_filters(context.storage):
+        ll = click.option(f'--{f.field}', multiple=f.multiple)(ll)
+        ls = click.option(f'--{f.field}', multiple=f.multiple)(ls)
+        export = click.option(f'--{f.field}', multiple=f.multiple)(export)
+        purge = click.option(f'--{f.field}', multiple=f.multiple)(purge)
 
     return file_group
 
-def _get_storage(context: storcom_context.Context, show_curl: bool) -> BaseStorage:
+def keep_sessions() -> None:
+    '''
+    Keeps the connection pools of the storages open between the commands run by this process.
+    '''
+    global _kept_sessions # pylint: disable=global-statement
+    if _kept_sessions is None:
+        _kept_sessions = {}
+
+def _open_storage(click_context: click.Context) -> None:
+    '''
+    Storage of the context, or the storages of several contexts, for the subcommand.
+    '''
+    params = click_context.params
+    metrics = _MetricsOutput(params['stats'],
+                             params['metrics_file'],
+                             params['metrics_format'],
+                             click_context.invoked_subcommand or '')
+    context_string = params['context_string']
+    if storcom_context.is_many(context_string):
+        if click_context.invoked_subcommand not in _FAN_OUT_COMMANDS:
+            raise ClickException(f'Only {" and ".join(_FAN_OUT_COMMANDS)} run on several contexts.')
+        fan_out = _get_fan_out(storcom_context.parse_many(context_string),
+                               params['show_curl'],
+                               params['workers'],
+                               params['engine'],
+                               _get_http_cache(params['no_http_cache']))
+        click_context.obj = fan_out
+        click_context.call_on_close(lambda: _close_fan_out(fan_out, metrics))
+        return
+    context = storcom_context.parse(context_string) or click_context.obj
+    try:
+        storage = _get_storage(context,
+                               params['show_curl'],
+                               params['workers'],
+                               params['engine'],
+                               _get_http_cache(params['no_http_cache']))
+    except ConfigError as e:
+        raise ClickException(e.message) from e
+    click_context.obj = storage
+    click_context.call_on_close(lambda: _close_storage(storage, metrics))
+
+def _get_storage(context: storcom_context.Context,
+                 show_curl: bool,
+                 workers: Optional[int],
+                 engine: str,
+                 http_cache: Optional['HttpCache']) -> 'BaseStorage':
     config = read_storage_config(context)
-    if context.storage == 'fcc':
-        return FccStorage(config, context, show_curl)
-    if context.storage == 'cx':
-        return CxStorage(config, context, show_curl)
+    if workers:
+        config = dataclasses.replace(config, workers=workers, min_workers=None, max_workers=None)
+    storage_classes = _get_storage_classes(engine)
+    if context.storage in storage_classes:
+        session = (_get_host_session(_kept_sessions, config.storage_url, config.worker_range[1])
+                   if _kept_sessions is not None else None)
+        return storage_classes[context.storage](config, context, show_curl, session, http_cache)
     raise ClickException(f'No storage for context: {context}')
+
+def _get_other_storage(click_context: click.Context, context_string: str) -> 'BaseStorage':
+    '''
+    Storage of another context with the options of the file group, closed with the command.
+    '''
+    context = storcom_context.parse(context_string)
+    if not context:
+        raise ClickException('The other context is empty.')
+    group_params = click_context.parent.params if click_context.parent else {}
+    try:
+        storage = _get_storage(context,
+                               group_params.get('show_curl', _DEFAULT_SHOW_URL),
+                               group_params.get('workers'),
+                               group_params.get('engine', _DEFAULT_ENGINE),
+                               _get_http_cache(group_params.get('no_http_cache', False)))
+    except ConfigError as e:
+        raise ClickException(e.message) from e
+    # only the summary, the metrics file describes the storage of the current context
+    metrics = _MetricsOutput(group_params.get('stats', False))
+    click_context.call_on_close(lambda: _close_storage(storage, metrics))
+    return storage
+
+def _get_fan_out(contexts: List[Tuple[str, storcom_context.Context]], # pylint: disable=too-many-locals
+                 show_curl: bool,
+                 workers: Optional[int],
+                 engine: str,
+                 http_cache: Optional['HttpCache']) -> 'FanOut':
+    '''
+    Storages of the contexts splitting the workers between the contexts served at a time,
+    the storages of a host share its connection pool.
+    '''
+    from storcom.fanout import FanOut
+    try:
+        configs = {label: (context, read_storage_config(context)) for label, context in contexts}
+    except ConfigError as e:
+        raise ClickException(e.message) from e
+    if not configs:
+        raise ClickException('No contexts to run on.')
+    total = workers or max(config.workers for _, config in configs.values())
+    fan_out = FanOut({}, min(len(configs), total))
+    pool_size = max(total, *(config.worker_range[1] for _, config in configs.values()))
+    storage_classes = _get_storage_classes(engine)
+    sessions: Dict[Tuple[str, int], 'requests.Session'] = \
+        {} if _kept_sessions is None else _kept_sessions
+    for label, (context, config) in configs.items():
+        if context.storage not in storage_classes:
+            raise ClickException(f'No storage for context: {context}')
+        fan_out.storages[label] = storage_classes[context.storage](
+            _share_workers(config, workers, total, fan_out.parallel),
+            context,
+            show_curl,
+            _get_host_session(sessions, config.storage_url, pool_size),
+            http_cache)
+    if sessions is not _kept_sessions:
+        fan_out.sessions.extend(sessions.values())
+    return fan_out
+
+def _share_workers(config: StorageConfig,
+                   workers: Optional[int],
+                   total: int,
+                   parallel: int) -> StorageConfig:
+    '''
+    Config of a context of a fan-out, which gets its share of the workers of the contexts
+    served at a time. The workers of the command fix the concurrency.
+    '''
+    if workers:
+        return dataclasses.replace(config,
+                                   workers=max(1, total // parallel),
+                                   min_workers=None,
+                                   max_workers=None)
+    return dataclasses.replace(
+        config,
+        workers=max(1, total // parallel),
+        min_workers=config.min_workers and max(1, config.min_workers // parallel),
+        max_workers=config.max_workers and max(1, config.max_workers // parallel))
+
+def _get_http_cache(disabled: bool) -> Optional['HttpCache']:
+    from storcom.httpcache import HttpCache
+    return None if disabled else HttpCache()
+
+def _get_host_session(sessions: Dict[Tuple[str, int], 'requests.Session'],
+                      url: str,
+                      pool_size: int) -> 'requests.Session':
+    from urllib.parse import urlsplit
+    from storcom.storage import create_session
+    key = (urlsplit(url).netloc, pool_size)
+    if key not in sessions:
+        sessions[key] = create_session(pool_size)
+    return sessions[key]
+
+def _get_storage_classes(engine: str) -> Dict[str, Type['BaseStorage']]:
+    if engine == 'thread':
+        from storcom.storage import FccStorage, CxStorage
+        return {'fcc': FccStorage, 'cx': CxStorage}
+    try:
+        from storcom.async_storage import AsyncFccStorage, AsyncCxStorage
+    except ImportError as e:
+        raise ClickException("The async engine needs aiohttp: pip install 'storcom[async]'") from e
+    return {'fcc': AsyncFccStorage, 'cx': AsyncCxStorage}
+
+def _listing_options(command: Callable[..., Any]) -> Callable[..., Any]:
+    command = _where_option(command)
+    command = click.option('--max_age',
+                           type=click.IntRange(min=0),
+                           help=f'Refresh the cached listing when it is older than MAX_AGE seconds '
+                                f'(default {_DEFAULT_MAX_AGE}), implies --cached.')(command)
+    return click.option('--cached',
+                        is_flag=True,
+                        help='Answer from the local index of the listing, refreshing only the '
+                             'files changed since the last run where the storage allows it.'
+                        )(command)
+
+def _where_option(command: Callable[..., Any]) -> Callable[..., Any]:
+    return click.option('--where',
+                        help='Expression over the file fields, e.g. "name glob \'*.wav\' and '
+                             '(file_bytes ge 1000 or not type eq folder)". The parts the '
+                             'storage can filter by are sent to it, the rest is evaluated '
+                             'locally.')(command)
+
+def _list_files_pages(storage: 'BaseStorage',
+                      filters: Dict[str, QueryArg],
+                      where: Optional[str],
+                      cached: bool,
+                      max_age: Optional[int]) -> Iterator[FilesPage]:
+    if not where:
+        return _list_storage_pages(storage, filters, cached, max_age)
+    from storcom.predicate import filter_pages, plan
+    pushed_filters, predicate = plan(where, storage.supported_filters, filters)
+    pages = _list_storage_pages(storage, pushed_filters, cached, max_age)
+    return filter_pages(pages, predicate) if predicate else pages
+
+def _list_files_rows(storage: 'BaseStorage', # pylint: disable=too-many-arguments
+                     fields: List[str],
+                     filters: Dict[str, QueryArg],
+                     where: Optional[str],
+                     *,
+                     cached: bool,
+                     max_age: Optional[int]) -> Iterator[List[Row]]:
+    '''
+    The files are projected to the fields as they are decoded, unless the index or a local
+    predicate needs the whole files.
+    '''
+    from storcom.storage import to_tabular_rows
+    if not cached and max_age is None:
+        if not where:
+            return storage.list_files_rows(filters, fields)
+        from storcom.predicate import plan
+        pushed_filters, predicate = plan(where, storage.supported_filters, filters)
+        if not predicate:
+            return storage.list_files_rows(pushed_filters, fields)
+    return to_tabular_rows(_list_files_pages(storage, filters, where, cached, max_age), fields)
+
+def _list_export_rows(storage: 'BaseStorage', # pylint: disable=too-many-arguments
+                      columns: List[str],
+                      filters: Dict[str, QueryArg],
+                      where: Optional[str],
+                      *,
+                      cached: bool,
+                      max_age: Optional[int]) -> Tuple[List[str], Iterator[List[Row]]]:
+    '''
+    Fields and rows of the export, the fields of the first page of files unless the columns
+    are given.
+    '''
+    if columns:
+        return list(columns), _list_files_rows(storage, list(columns), filters, where,
+                                               cached=cached,
+                                               max_age=max_age)
+    from storcom.export import get_fields
+    from storcom.storage import to_tabular_rows
+    pages = _list_files_pages(storage, filters, where, cached, max_age)
+    first = next(pages, [])
+    fields = get_fields(first) or storage.get_tabular_fields([])
+    return fields, to_tabular_rows(itertools.chain([first], pages), fields)
+
+def _export_rows(rows: Iterable[List[Row]],
+                 fields: List[str],
+                 destination: Path,
+                 output_format: Optional[str],
+                 batch_size: int) -> int:
+    '''
+    A file is written through destination.part, it takes the place of destination once
+    the export is complete.
+    '''
+    from storcom.export import COLUMNAR_FORMATS, export_rows, get_format
+    to_stdout = str(destination) == '-'
+    output_format = output_format or ('ndjson' if to_stdout else get_format(destination))
+    if not output_format:
+        raise ClickException(f"Can't tell the format of {destination} by its suffix, "
+                             'use --format.')
+    if to_stdout:
+        if output_format in COLUMNAR_FORMATS:
+            raise ClickException(f'{output_format} is written to files only.')
+        return export_rows(rows, fields, sys.stdout.buffer, output_format, batch_size)
+    part_path = destination.with_name(f'{destination.name}.part')
+    try:
+        with open(part_path, 'wb') as output:
+            count = export_rows(rows, fields, output, output_format, batch_size)
+        os.replace(part_path, destination)
+    except OSError as e:
+        raise ClickException(f"Can't write {destination}: {e}") from e
+    finally:
+        part_path.unlink(missing_ok=True)
+    return count
+
+def _remember_files(storage: 'BaseStorage', pages: Iterable[FilesPage]) -> Iterator[FilesPage]:
+    from storcom.completion import remember_pages
+    return remember_pages(storage.context,
+                          pages,
+                          lambda f: (str(f.get(storage.id_field, '')),
+                                     str(f.get(storage.name_field) or '')))
+
+def _remember_rows(storage: 'BaseStorage',
+                   pages: Iterable[List[Row]],
+                   fields: List[str]) -> Iterator[List[Row]]:
+    from storcom.completion import remember_pages
+    id_position = fields.index(storage.id_field)
+    name_position = fields.index(storage.name_field) if storage.name_field in fields else None
+    return remember_pages(storage.context,
+                          pages,
+                          lambda row: (str(row[id_position]),
+                                       '' if name_position is None else str(row[name_position])))
+
+def _remember_fan_out_files(storage: 'BaseStorage',
+                            filters: Dict[str, QueryArg],
+                            where: Optional[str],
+                            cached: bool,
+                            max_age: Optional[int]) -> Iterator[FilesPage]:
+    return _remember_files(storage, _list_files_pages(storage, filters, where, cached, max_age))
+
+def _complete_file_ids(click_context: click.Context,
+                       _: click.Parameter,
+                       incomplete: str) -> List['CompletionItem']:
+    '''
+    Ids of the files seen by the listings of the context, looked up without the storage.
+    '''
+    from click.shell_completion import CompletionItem
+    from storcom.completion import complete
+    file_params = click_context.parent.params if click_context.parent else {}
+    context_string = file_params.get('context_string')
+    if storcom_context.is_many(context_string):
+        return []
+    context = (storcom_context.parse(context_string) if context_string else None) or \
+        storcom_context.load()
+    if not context:
+        return []
+    return [CompletionItem(file_id, help=name)
+            for file_id, name in complete(context, incomplete)]
+
+def _list_storage_pages(storage: 'BaseStorage',
+                        filters: Dict[str, QueryArg],
+                        cached: bool,
+                        max_age: Optional[int]) -> Iterator[FilesPage]:
+    if not cached and max_age is None:
+        yield from storage.list_files_pages(filters)
+        return
+    from storcom.index import open_index
+    index = open_index()
+    try:
+        yield from index.list_files_pages(storage,
+                                          filters,
+                                          _DEFAULT_MAX_AGE if max_age is None else max_age)
+    finally:
+        index.close()
+
+def _close_storage(storage: 'BaseStorage', metrics: '_MetricsOutput') -> None:
+    storage.close()
+    _report_storages({':'.join(dataclasses.astuple(storage.context)): storage}, metrics)
+
+def _close_fan_out(fan_out: 'FanOut', metrics: '_MetricsOutput') -> None:
+    fan_out.close()
+    _report_storages(fan_out.storages, metrics)
+
+def _report_storages(storages: Dict[str, 'BaseStorage'], metrics: '_MetricsOutput') -> None:
+    for label, storage in storages.items():
+        prefix = f'{label}: ' if len(storages) > 1 else ''
+        if storage.retry_stats.retries or storage.retry_stats.breaker_rejected:
+            click.echo(f'{prefix}{storage.retry_stats}', err=True)
+        if storage.concurrency.adaptive and (metrics.stats or len(storage.concurrency.changes) > 1):
+            click.echo(f'{prefix}{storage.concurrency}', err=True)
+        if metrics.stats:
+            click.echo(f'{label}: {storage.metrics}', err=True)
+    if metrics.path:
+        from storcom.metrics import write_metrics
+        entries = [(storage.metrics, {'context': label,
+                                      **dataclasses.asdict(storage.context),
+                                      'command': metrics.command})
+                   for label, storage in storages.items()]
+        try:
+            write_metrics(entries, metrics.path, metrics.format)
+        except OSError as e:
+            raise ClickException(f"Can't write the metrics to {metrics.path}: {e}") from e
+
+def _is_fan_out(storage: Union['BaseStorage', 'FanOut']) -> bool:
+    from storcom.fanout import FanOut
+    return isinstance(storage, FanOut)
+
+def _list_fan_out(fan_out: 'FanOut',
+                  filters: Dict[str, QueryArg],
+                  where: Optional[str],
+                  cached: bool,
+                  max_age: Optional[int]) -> None:
+    from storcom.fanout import merge_pages
+    sources = {label: functools.partial(_remember_fan_out_files, storage, filters, where, cached,
+                                        max_age)
+               for label, storage in fan_out.storages.items()}
+    failed = 0
+    for result in merge_pages(sources, fan_out.parallel):
+        if result.error is not None:
+            failed += 1
+            click.echo(json.dumps({'context': result.context, 'error': result.error}), err=True)
+        for f in result.page:
+            print(json.dumps({'context': result.context, **f}))
+    if failed:
+        raise ClickException(f'Failed to list {failed} of {len(sources)} contexts.')
+
+def _show_files(storage: 'BaseStorage', file_ids: Iterable[str], ordered: bool) -> None:
+    failed = 0
+    for result in storage.show_files(file_ids, ordered):
+        if result.error is None:
+            print(_to_json_line(result.value or ''))
+        else:
+            failed += 1
+            click.echo(json.dumps({'id': result.item, 'error': result.error}), err=True)
+    if failed:
+        raise ClickException(f'Failed to show {failed} files.')
+
+def _delete_files(storage: 'BaseStorage', file_ids: Iterable[str]) -> None:
+    from storcom.bulk import Progress
+    progress = Progress('deleted')
+    try:
+        report = _delete_and_evict(storage, file_ids, progress)
+    except BulkAbortedError as e:
+        progress.finish(e.report)
+        print(e.report.to_json())
+        raise
+    progress.finish(report)
+    print(report.to_json())
+    if report.failed:
+        raise ClickException(f'Failed to delete {len(report.failed)} of '
+                             f'{report.processed} files.')
+
+def _purge_files(storage: 'BaseStorage',
+                 filters: Dict[str, QueryArg],
+                 where: Optional[str],
+                 rate: Optional[float]) -> None:
+    '''
+    The files are deleted in passes over the listing until a pass deletes none: deleting
+    moves the files which are not listed yet to the pages already passed by the offset.
+    '''
+    from storcom.bulk import Progress, prefetch
+    failed: Dict[str, str] = {}
+    deleted = passes = 0
+    while True:
+        passes += 1
+        pages = prefetch(_list_files_pages(storage, filters, where, False, None),
+                         _PURGE_PAGES_AHEAD)
+        file_ids = (file_id for page in pages for file_id in (str(f[storage.id_field])
+                                                              for f in page)
+                    if file_id not in failed)
+        progress = Progress('deleted')
+        try:
+            report = _delete_and_evict(storage, file_ids, progress, rate)
+        except BulkAbortedError as e:
+            # the files deleted before the listing failed are reported
+            progress.finish(e.report)
+            deleted += len(e.report.succeeded)
+            failed.update(e.report.failed)
+            print(json.dumps({'deleted': deleted, 'failed': failed, 'passes': passes}))
+            raise
+        progress.finish(report)
+        deleted += len(report.succeeded)
+        failed.update(report.failed)
+        if not report.succeeded:
+            break
+    print(json.dumps({'deleted': deleted, 'failed': failed, 'passes': passes}))
+    if failed:
+        raise ClickException(f'Failed to delete {len(failed)} of {deleted + len(failed)} files.')
+
+def _delete_fan_out(fan_out: 'FanOut', lines: Iterable[str]) -> None:
+    from storcom.fanout import Router, run_contexts
+    labels = list(fan_out.storages)
+    failed = processed = 0
+    try:
+        with Router(lines,
+                    lambda line: _route_file_id(fan_out, line),
+                    labels,
+                    _ROUTED_IDS_AHEAD) as router:
+            # every context takes its ids as they are read, so all of them are served at once
+            for label, report in run_contexts(
+                    lambda label: _delete_and_evict(fan_out.storages[label],
+                                                    router.consume(label)),
+                    labels,
+                    len(labels)):
+                if not report.processed:
+                    continue
+                print(json.dumps({'context': label,
+                                  'succeeded': report.succeeded,
+                                  'failed': report.failed}))
+                failed += len(report.failed)
+                processed += report.processed
+    except StorcomError as e:
+        raise ClickException(str(e)) from e
+    if failed:
+        raise ClickException(f'Failed to delete {failed} of {processed} files.')
+
+def _delete_and_evict(storage: 'BaseStorage',
+                      file_ids: Iterable[str],
+                      on_progress: Optional['ProgressCallback'] = None,
+                      rate: Optional[float] = None) -> 'BulkReport':
+    try:
+        report = storage.delete_files(file_ids, on_progress=on_progress, rate=rate)
+    except BulkAbortedError as e:
+        _evict(storage, e.report.succeeded)
+        raise
+    _evict(storage, report.succeeded)
+    return report
+
+def _evict(storage: 'BaseStorage', file_ids: List[str]) -> None:
+    '''
+    Drops the deleted files from the completion and the index.
+    '''
+    from storcom.index import open_existing_index
+    from storcom.completion import forget
+    forget(storage.context, file_ids)
+    index = open_existing_index()
+    if index:
+        index.evict(storage.context, file_ids)
+        index.close()
+
+def _route_file_id(fan_out: 'FanOut', line: str) -> List[Tuple[str, str]]:
+    '''
+    A file tagged with its context by ls goes to it, a plain id goes to all the contexts.
+    '''
+    if not line.startswith('{'):
+        return [(label, line) for label in fan_out.storages]
+    try:
+        record = json.loads(line)
+        storage = fan_out.storages[record['context']]
+        return [(record['context'], str(record[storage.id_field]))]
+    except (ValueError, KeyError, TypeError) as e:
+        raise StorcomError(f'Not a file of the contexts: {line}') from e
+
+def _get_file(storage: 'BaseStorage', file_id: str, destination: Path) -> None:
+    from storcom.transfer import show_progress
+    try:
+        storage.get_file(file_id, destination, show_progress('downloaded'))
+    except StorageInteractionError as e:
+        raise ClickException(str(e)) from e
+
+def _put_file(storage: 'BaseStorage', path: Path, name: Optional[str]) -> None:
+    try:
+        print(storage.put_file(path, name))
+    except StorageInteractionError as e:
+        raise ClickException(str(e)) from e
+
+def _to_json_line(text: str) -> str:
+    try:
+        return json.dumps(json.loads(text))
+    except ValueError:
+        return text.strip()
+
+def _read_file_ids(file_ids: List[str]) -> Iterable[str]:
+    if list(file_ids) != ['-']:
+        return file_ids
+    return (line.strip() for line in sys.stdin if line.strip())
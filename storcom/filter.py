@@ -1,12 +1,10 @@
 import re
 from enum import Enum
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
 from typing import Dict, Tuple, List, Callable, cast, Iterable, Optional
 from functools import reduce
 
-from dateutil.parser import isoparse
-
 from storcom.errors import FilterError
 from storcom.aliases import QueryArg
 
@@ -24,48 +22,154 @@ class FccOperator(str, Enum):
     LTE: str = 'lte'
     GTE: str = 'gte'
 
+class CxOperator(str, Enum):
+    EQ = 'eq'
+    NE = 'ne'
+    LT = 'lt'
+    GT = 'gt'
+    LE = 'le'
+    GE = 'ge'
+    LIKE = 'like'
+
+_FCC_OPERATORS = tuple(op.value for op in FccOperator)
+_CX_OPERATORS = tuple(op.value for op in CxOperator)
+_CX_NUMBER_OPERATORS = tuple(op for op in _CX_OPERATORS if op != CxOperator.LIKE)
+# the same comparison is spelled differently by the storages, either spelling is accepted
+_OPERATOR_ALIASES = {'lte': 'le', 'gte': 'ge', 'le': 'lte', 'ge': 'gte'}
+
 @dataclass
 class Filter:
     field: str = ''
     multiple: bool = False
     input_adapter: Callable[[str], str] = lambda x: x
+    is_datetime: bool = False
+    is_number: bool = False
+    operators: Tuple[str, ...] = _FCC_OPERATORS
+
+@dataclass
+class Condition:
+    field: str
+    # one of the operators of the filter
+    operator: str
+    value: str
+    is_datetime: bool = False
+    is_number: bool = False
 
 def get_fcc_filters() -> List[Filter]:
     return [
         Filter("batch"),
-        Filter("date_changed", multiple=True, input_adapter=_to_iso_datetime),
-        Filter("date_created", multiple=True, input_adapter=_to_iso_datetime),
+        Filter("date_changed", multiple=True, input_adapter=_to_iso_datetime, is_datetime=True),
+        Filter("date_created", multiple=True, input_adapter=_to_iso_datetime, is_datetime=True),
+    ]
+
+def get_cx_filters() -> List[Filter]:
+    return [
+        Filter("name", operators=_CX_OPERATORS),
+        Filter("type", operators=_CX_OPERATORS),
+        Filter("mime_type", operators=_CX_OPERATORS),
+        Filter("date_modified",
+               multiple=True,
+               input_adapter=_to_iso_datetime,
+               is_datetime=True,
+               operators=_CX_NUMBER_OPERATORS),
+        Filter("file_bytes",
+               multiple=True,
+               input_adapter=_to_number,
+               is_number=True,
+               operators=_CX_NUMBER_OPERATORS),
     ]
 
+def get_storage_filters(storage: str) -> List[Filter]:
+    storage_filters = {'fcc': get_fcc_filters, 'cx': get_cx_filters}
+    return storage_filters[storage]() if storage in storage_filters else []
+
 def to_fcc_qs_params(query_args: Dict[str, QueryArg]) -> Dict[str, str]:
     return _merge_dictionaries(_to_fcc_qs_param(f, query_args[f.field])
                                for f in get_fcc_filters()
                                if f.field in query_args)
 
-def _to_fcc_qs_param(fcc_filter: Filter, query_arg: QueryArg) -> Dict[str, str]:
-    if not query_arg:
-        return {}
-    return (
-        _to_fcc_qs_param_multivalue(fcc_filter, cast(Tuple[str], query_arg)) if fcc_filter.multiple
-        else _to_fcc_qs_param_single_value(fcc_filter, cast(str, query_arg))
-    )
+def to_cx_filter(query_args: Dict[str, QueryArg]) -> List[str]:
+    '''
+    Clauses of the cx filter expression, to be joined with "and".
+    '''
+    return [f'{c.field} {c.operator} {c.value if c.is_number else _quote(c.value)}'
+            for c in to_conditions(get_cx_filters(), query_args)]
 
-def _to_fcc_qs_param_multivalue(fcc_filter: Filter, values: Tuple[str]) -> Dict[str, str]:
-    return _merge_dictionaries(_to_fcc_qs_param_single_value(fcc_filter, v) for v in values)
+def parse_datetime(datetime_value: str) -> datetime:
+    '''
+    The point in time of an ISO date or of a relative one such as now-1d, as the storages
+    are sent it. Dates without a zone are UTC.
+    '''
+    try:
+        parsed = datetime.fromisoformat(_to_iso_datetime(datetime_value))
+    except ValueError as e:
+        raise FilterError(f"Incorrect filter value: {datetime_value}") from e
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
-def _to_fcc_qs_param_single_value(fcc_filter: Filter, query_arg_value: str) -> Dict[str, str]:
+def is_relative_datetime(value: str) -> bool:
+    return _to_delta_datetime(value) is not None
+
+def get_filter_operator(storage_filter: Filter, operator: str) -> Optional[str]:
+    '''
+    The spelling of the operator supported by the filter, None when it isn't supported.
+    '''
+    operator = operator.lower()
+    if operator not in storage_filter.operators:
+        operator = _OPERATOR_ALIASES.get(operator, operator)
+    return operator if operator in storage_filter.operators else None
+
+def to_conditions(filters: List[Filter], query_args: Dict[str, QueryArg]) -> List[Condition]:
+    '''
+    Same semantics as the query string: the last value wins for a field and operator pair.
+    '''
+    conditions: Dict[Tuple[str, str], Condition] = {}
+    for f in filters:
+        for value in _get_query_arg_values(f, query_args.get(f.field)):
+            condition = _to_condition(f, value)
+            conditions[(f.field, condition.operator)] = condition
+    return list(conditions.values())
+
+def _get_query_arg_values(storage_filter: Filter, query_arg: QueryArg) -> Tuple[str, ...]:
+    if not query_arg:
+        return ()
+    return cast(Tuple[str], query_arg) if storage_filter.multiple else (cast(str, query_arg),)
+
+def _to_condition(storage_filter: Filter, query_arg_value: str) -> Condition:
     split_query_arg = query_arg_value.split(' ', 1)
     operator, value = FccOperator.EQ.value, ''
     if len(split_query_arg) == 1:
         value = split_query_arg[0]
     else:
         operator, value = split_query_arg
-    operator = operator.lower()
-    value = fcc_filter.input_adapter(value.strip('\'"'))
-    if operator not in [op.value for op in FccOperator]:
-        raise FilterError(f'Filter operator {operator} is not supported')
-    field = fcc_filter.field if operator == FccOperator.EQ else f'{fcc_filter.field}__{operator}'
-    return {field: value}
+    supported_operator = get_filter_operator(storage_filter, operator)
+    if not supported_operator:
+        raise FilterError(f'Filter operator {operator.lower()} is not supported')
+    return Condition(storage_filter.field,
+                     supported_operator,
+                     storage_filter.input_adapter(value.strip('\'"')),
+                     storage_filter.is_datetime,
+                     storage_filter.is_number)
+
+def _to_fcc_qs_param(fcc_filter: Filter, query_arg: QueryArg) -> Dict[str, str]:
+    return _merge_dictionaries(_to_fcc_qs_param_single_value(fcc_filter, v)
+                               for v in _get_query_arg_values(fcc_filter, query_arg))
+
+def _to_fcc_qs_param_single_value(fcc_filter: Filter, query_arg_value: str) -> Dict[str, str]:
+    condition = _to_condition(fcc_filter, query_arg_value)
+    field = (condition.field if condition.operator == FccOperator.EQ
+             else f'{condition.field}__{condition.operator}')
+    return {field: condition.value}
+
+def _quote(value: str) -> str:
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+def _to_number(value: str) -> str:
+    try:
+        float(value)
+    except ValueError as e:
+        raise FilterError(f"Incorrect filter value: {value}") from e
+    return value
 
 def _to_iso_datetime(datetime_value: str) -> str:
     if not datetime_value:
@@ -73,6 +177,8 @@ def _to_iso_datetime(datetime_value: str) -> str:
     delta_datetime = _to_delta_datetime(datetime_value)
     if delta_datetime:
         return delta_datetime
+    # dateutil is imported on use to keep shell completion fast
+    from dateutil.parser import isoparse # pylint: disable=import-outside-toplevel
     try:
         return str(isoparse(datetime_value))
     except ValueError as e:
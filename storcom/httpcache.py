@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+
+from storcom.config import get_or_create_config_directory
+from storcom.context import Context
+
+_DIRECTORY_NAME = 'responses'
+# bytes of all the entries, kept up to date by every store so that none has to count them
+_TOTAL_NAME = '.total'
+# the least recently used responses of all the contexts make room for the new ones
+_MAX_BYTES = 128 * 1024 * 1024
+# trimmed below the bound, the following responses do not trim again at once
+_TRIMMED_RATIO = 0.9
+# a bigger body is passed through without being cached
+_MAX_ENTRY_BYTES = 16 * 1024 * 1024
+
+@dataclass
+class CachedResponse:
+    path: Path
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: Optional[str]
+    body: bytes
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        '''
+        Headers which ask the storage to answer 304 while the response is still the same.
+        '''
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def fill(self, response: requests.Response) -> None:
+        '''
+        Turns the 304 of a revalidation into the response it confirmed.
+        '''
+        # the empty body is read, the connection goes back to the pool
+        _ = response.content
+        response.status_code = 200
+        response.reason = 'OK'
+        if self.content_type:
+            response.headers['Content-Type'] = self.content_type
+        response.headers['Content-Length'] = str(len(self.body))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = self.body # pylint: disable=protected-access
+        _touch(self.path)
+
+class HttpCache:
+    '''
+    Bodies of the GET responses which carry an ETag or a Last-Modified, in a directory per
+    context under the config directory. They are served again when the storage confirms them
+    with a 304, the least recently used ones are evicted past max_bytes.
+    '''
+    def __init__(self, directory: Optional[Path] = None, max_bytes: int = _MAX_BYTES):
+        self._directory = directory or get_or_create_config_directory() / _DIRECTORY_NAME
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def load(self, context: Context, url: str) -> Optional[CachedResponse]:
+        path = self._get_path(context, url)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if not isinstance(header, dict) or header.get('url') != url:
+            return None
+        return CachedResponse(path,
+                              header.get('etag'),
+                              header.get('last_modified'),
+                              header.get('content_type'),
+                              body)
+
+    def keep(self,
+             context: Context,
+             url: str,
+             response: requests.Response,
+             stream: Optional[bool] = None) -> None:
+        '''
+        Caches the body of a 200 response which can be revalidated. A streamed body is cached
+        once it is read to the end.
+        '''
+        headers = response.headers
+        if not (headers.get('ETag') or headers.get('Last-Modified')) or \
+                'no-store' in headers.get('Cache-Control', ''):
+            return
+        header = {'url': url,
+                  'etag': headers.get('ETag'),
+                  'last_modified': headers.get('Last-Modified'),
+                  'content_type': headers.get('Content-Type')}
+        path = self._get_path(context, url)
+        if stream:
+            response.raw = _StoringBody(response.raw, lambda body: self._store(path, header, body))
+        else:
+            self._store(path, header, response.content)
+
+    def forget(self, context: Context, url: str) -> None:
+        self._remove(self._get_path(context, url))
+
+    def clear(self, context: Context) -> None:
+        namespace = self._directory / _get_namespace(context)
+        with self._lock:
+            cleared = sum(_get_size(path) for path in namespace.glob('*'))
+            shutil.rmtree(namespace, ignore_errors=True)
+            total = self._read_total()
+            if total is not None:
+                self._write_total(max(total - cleared, 0))
+
+    def _store(self, path: Path, header: Dict[str, Any], body: bytes) -> None:
+        if len(body) > _MAX_ENTRY_BYTES:
+            return
+        content = json.dumps(header).encode() + b'\n' + body
+        temporary_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # the bodies are as private as the tokens which fetched them
+            fd = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            replaced = _get_size(path)
+            os.replace(temporary_path, path)
+        except OSError:
+            # the cache is an optimization only, the response is fetched again next time
+            temporary_path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            total = self._read_total()
+            if total is None:
+                # the first store in the directory counts what is already there
+                total = sum(size for _, _, size in self._list_entries())
+            else:
+                total += len(content) - replaced
+            if total > self._max_bytes:
+                self._trim()
+            else:
+                self._write_total(total)
+
+    def _trim(self) -> None:
+        '''
+        Evicts the least recently used entries until they take less than max_bytes. The total
+        is counted again, which also corrects it after the stores of other processes raced.
+        '''
+        entries = sorted(self._list_entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self._max_bytes * _TRIMMED_RATIO:
+                break
+            self._remove(path)
+            total -= size
+        self._write_total(total)
+
+    def _read_total(self) -> Optional[int]:
+        try:
+            return int((self._directory / _TOTAL_NAME).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _write_total(self, total: int) -> None:
+        path = self._directory / _TOTAL_NAME
+        temporary_path = path.with_name(f'{_TOTAL_NAME}.{os.getpid()}.{threading.get_ident()}')
+        try:
+            temporary_path.write_text(str(total), encoding='utf-8')
+            os.replace(temporary_path, path)
+        except OSError:
+            temporary_path.unlink(missing_ok=True)
+
+    def _list_entries(self) -> List[Tuple[float, Path, int]]:
+        entries = []
+        for path in self._directory.glob('*/*'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _remove(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def _get_path(self, context: Context, url: str) -> Path:
+        return self._directory / _get_namespace(context) / hashlib.sha256(url.encode()).hexdigest()
+
+class _StoringBody:
+    '''
+    Raw body of a streamed response, the chunks are collected as they are read and handed
+    to on_end once the body ends. A body given up before its end is not stored.
+    '''
+    def __init__(self, raw: Any, on_end: Callable[[bytes], None]):
+        self._raw = raw
+        self._on_end = on_end
+        self._chunks: Optional[Generator[bytes, None, None]] = None
+
+    def stream(self, amt: int, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        self._chunks = self._collect(self._raw.stream(amt, decode_content=decode_content))
+        return self._chunks
+
+    def close(self) -> None:
+        if self._chunks is not None:
+            # a reader which stops at the end of the JSON leaves the end of the body unread
+            for _ in self._chunks:
+                break
+            self._chunks.close()
+        self._raw.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+    def _collect(self, chunks: Iterator[bytes]) -> Generator[bytes, None, None]:
+        collected: Optional[List[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if collected is not None:
+                collected.append(chunk)
+                size += len(chunk)
+                if size > _MAX_ENTRY_BYTES:
+                    collected = None
+            yield chunk
+        if collected is not None:
+            self._on_end(b''.join(collected))
+
+def get_cache_url(url: str, params: Optional[Dict[str, str]]) -> str:
+    '''
+    Url of a request with its query string, the key of its response.
+    '''
+    request = requests.PreparedRequest()
+    request.prepare_url(url, params)
+    return request.url or url
+
+def _get_namespace(context: Context) -> str:
+    key = ':'.join([context.environment, context.storage, context.service, context.user])
+    return quote(key, safe=':')
+
+def _get_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+def _touch(path: Path) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass
@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union, TYPE_CHECKING
+
+from storcom.aliases import QueryArg, FilesPage
+from storcom.config import get_or_create_config_directory
+from storcom.context import Context
+from storcom.filter import Condition, to_conditions
+
+if TYPE_CHECKING:
+    from storcom.storage import BaseStorage
+
+_INDEX_FILE_NAME = 'index.sqlite'
+_PAGE_SIZE = 1000
+_SQL_OPERATORS = {
+    'eq': '=',
+    'ne': '!=',
+    'lt': '<',
+    'gt': '>',
+    'lte': '<=',
+    'le': '<=',
+    'gte': '>=',
+    'ge': '>=',
+    'like': 'LIKE',
+}
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    context TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    changed TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (context, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_changed ON files (context, changed);
+CREATE TABLE IF NOT EXISTS contexts (
+    context TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL,
+    watermark TEXT
+);
+'''
+
+@dataclass
+class _ContextState:
+    refreshed_at: float
+    watermark: Optional[str]
+
+class FileIndex:
+    '''
+    On-disk copy of the file listings, one namespace per context. A refresh of a storage which
+    can filter by the change date only fetches the files changed since the last refresh.
+    Files deleted by other means stay in the index until the context is invalidated.
+    '''
+    def __init__(self, path: Path):
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def list_files_pages(self,
+                         storage: 'BaseStorage',
+                         filters: Dict[str, QueryArg],
+                         max_age: float) -> Iterator[FilesPage]:
+        state = self._get_state(storage.context)
+        if state is None or time.time() - state.refreshed_at > max_age:
+            self.refresh(storage)
+        where, args = _to_sql(to_conditions(storage.supported_filters, filters))
+        cursor = self._connection.execute(
+            f'SELECT data FROM files WHERE context = ?{where} ORDER BY changed DESC',
+            [_get_context_key(storage.context), *args])
+        while True:
+            rows = cursor.fetchmany(_PAGE_SIZE)
+            if not rows:
+                return
+            yield [json.loads(data) for data, in rows]
+
+    def refresh(self, storage: 'BaseStorage') -> None:
+        key = _get_context_key(storage.context)
+        state = self._get_state(storage.context)
+        watermark = state.watermark if state else None
+        incremental = watermark is not None and _can_filter_changed(storage)
+        refreshed_at = time.time()
+        with self._connection:
+            if not incremental:
+                watermark = None
+                self._connection.execute('DELETE FROM files WHERE context = ?', [key])
+            filters = _get_changed_since_filters(storage, watermark) if incremental else {}
+            for files in storage.list_files_pages(filters):
+                rows = [(key,
+                         str(f.get(storage.id_field)),
+                         f.get(storage.changed_field),
+                         json.dumps(f)) for f in files]
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO files (context, file_id, changed, data) '
+                    'VALUES (?, ?, ?, ?)', rows)
+                watermark = max([watermark or '', *(changed or '' for _, _, changed, _ in rows)])
+            self._connection.execute(
+                'INSERT OR REPLACE INTO contexts (context, refreshed_at, watermark) '
+                'VALUES (?, ?, ?)', [key, refreshed_at, watermark or None])
+
+    def evict(self, context: Context, file_ids: Iterable[str]) -> None:
+        with self._connection:
+            self._connection.executemany('DELETE FROM files WHERE context = ? AND file_id = ?',
+                                         ((_get_context_key(context), i) for i in file_ids))
+
+    def invalidate(self, context: Context) -> None:
+        key = _get_context_key(context)
+        with self._connection:
+            self._connection.execute('DELETE FROM files WHERE context = ?', [key])
+            self._connection.execute('DELETE FROM contexts WHERE context = ?', [key])
+
+    def _get_state(self, context: Context) -> Optional[_ContextState]:
+        row = self._connection.execute(
+            'SELECT refreshed_at, watermark FROM contexts WHERE context = ?',
+            [_get_context_key(context)]).fetchone()
+        return _ContextState(*row) if row else None
+
+def open_index() -> FileIndex:
+    return FileIndex(get_or_create_config_directory() / _INDEX_FILE_NAME)
+
+def open_existing_index() -> Optional[FileIndex]:
+    path = get_or_create_config_directory() / _INDEX_FILE_NAME
+    return FileIndex(path) if path.is_file() else None
+
+def _get_context_key(context: Context) -> str:
+    return ':'.join([context.environment, context.storage, context.service, context.user])
+
+def _can_filter_changed(storage: 'BaseStorage') -> bool:
+    return any(f.field == storage.changed_field for f in storage.supported_filters)
+
+def _get_changed_since_filters(storage: 'BaseStorage',
+                               watermark: Optional[str]) -> Dict[str, QueryArg]:
+    changed_filter = next(f for f in storage.supported_filters
+                          if f.field == storage.changed_field)
+    # gte rather than gt: files changed within the same instant as the watermark are refetched
+    value = f'gte {watermark}'
+    return {changed_filter.field: (value,) if changed_filter.multiple else value}
+
+def _to_sql(conditions: List[Condition]) -> Tuple[str, List[Union[str, float]]]:
+    where = ''
+    args: List[Union[str, float]] = []
+    for condition in conditions:
+        operator = _SQL_OPERATORS[condition.operator]
+        args.append(f'$.{condition.field}')
+        if condition.is_datetime:
+            where += f' AND julianday(json_extract(data, ?)) {operator} julianday(?)'
+            args.append(condition.value)
+        elif _is_number(condition.value):
+            where += f' AND CAST(json_extract(data, ?) AS REAL) {operator} ?'
+            args.append(float(condition.value))
+        else:
+            where += f' AND json_extract(data, ?) {operator} ?'
+            args.append(condition.value)
+    return where, args
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
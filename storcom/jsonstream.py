@@ -0,0 +1,180 @@
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import orjson
+    loads: Callable[[Union[bytes, str]], Any] = orjson.loads # pylint: disable=no-member
+except ImportError:
+    loads = json.loads
+
+_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_STRUCTURE = re.compile(rb'["{}\[\]]')
+_SCALAR = re.compile(rb'[^,:\]}\s]+')
+# skips the other characters and the complete strings up to a bracket, or up to the
+# opening quote of a string which is not complete yet
+_TOKEN = re.compile(rb'(?:[^"{}\[\]]|"[^"\\]*(?:\\.[^"\\]*)*")*([{}\[\]]|")', re.DOTALL)
+_QUOTE = ord('"')
+_OPENING = frozenset(b'{[')
+
+class ItemsStream:
+    '''
+    Elements of the array under key of a JSON object decoded one at a time as the chunks of
+    the object arrive, the whole object is never held in memory. The other members of the
+    object are in document once the items are consumed.
+    '''
+    def __init__(self, chunks: Iterable[bytes], key: str = 'items'):
+        self.document: Dict[str, Any] = {}
+        self.count = 0
+        self._chunks = iter(chunks)
+        self._key = key
+        self._buffer = b''
+        self._position = 0
+
+    def __iter__(self) -> Iterator[Any]:
+        self._expect(b'{')
+        found = False
+        if self._peek() == b'}':
+            self._position += 1
+        else:
+            while True:
+                key = loads(self._read_value())
+                if not isinstance(key, str):
+                    raise ValueError(f'Invalid key {key!r} of the JSON object.')
+                self._expect(b':')
+                if key == self._key and not found:
+                    found = True
+                    yield from self._read_items()
+                else:
+                    self.document[key] = loads(self._read_value())
+                if self._expect(b',', b'}') == b'}':
+                    break
+        if not found:
+            raise ValueError(f'No {self._key} array in the JSON object.')
+
+    def _read_items(self) -> Iterator[Any]:
+        self._expect(b'[')
+        if self._peek() == b']':
+            self._position += 1
+            return
+        while True:
+            items = self._read_batch()
+            self.count += len(items)
+            yield from items
+            if self._expect(b',', b']') == b']':
+                return
+
+    def _read_batch(self) -> List[Any]:
+        '''
+        All the complete items in the buffer decoded by a single call of the decoder. The
+        scanner finds where the last of them ends, whatever they hold, so every byte is
+        scanned and decoded once.
+        '''
+        self._peek()
+        while True:
+            end = _find_items_end(self._buffer, self._position)
+            if end is not None:
+                items: List[Any] = loads(b'[' + self._buffer[self._position:end] + b']')
+                self._position = end
+                return items
+            # the first item goes on in the next chunks
+            if not self._fill():
+                raise ValueError('Truncated JSON.')
+
+    def _read_value(self) -> bytes:
+        self._peek()
+        while True:
+            end = _find_value_end(self._buffer, self._position)
+            if end is not None:
+                value = self._buffer[self._position:end]
+                self._position = end
+                return value
+            if not self._fill():
+                raise ValueError('Truncated JSON.')
+
+    def _expect(self, *expected: bytes) -> bytes:
+        actual = self._peek()
+        if actual not in expected:
+            raise ValueError(f'Expected {b" or ".join(expected).decode()} at {self._position} '
+                             f'of the JSON, got {actual.decode(errors="replace")!r}.')
+        self._position += 1
+        return actual
+
+    def _peek(self) -> bytes:
+        # the next character after whitespace, which is not consumed
+        while True:
+            match = _WHITESPACE.match(self._buffer, self._position)
+            assert match is not None
+            self._position = match.end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position:self._position + 1]
+            if not self._fill():
+                raise ValueError('Truncated JSON.')
+
+    def _fill(self) -> bool:
+        for chunk in self._chunks:
+            if chunk:
+                # the consumed part is dropped, the buffer holds about a chunk
+                self._buffer = self._buffer[self._position:] + chunk
+                self._position = 0
+                return True
+        return False
+
+def _find_items_end(buffer: bytes, position: int) -> Optional[int]:
+    '''
+    Where the last complete one of the array elements starting at position ends: after the
+    last object or array closed at the top level, or where the array closes. None when the
+    buffer ends before either.
+    '''
+    depth = 0
+    end = None
+    # one pass over the strings and the brackets, the rest is skipped by the regex
+    for match in _TOKEN.finditer(buffer, position):
+        token = buffer[match.end() - 1]
+        if token == _QUOTE:
+            # the string goes on in the next chunk
+            return end
+        if token in _OPENING:
+            depth += 1
+        elif depth == 0:
+            return match.end() - 1
+        else:
+            depth -= 1
+            if depth == 0:
+                end = match.end()
+    return end
+
+def _find_value_end(buffer: bytes, position: int) -> Optional[int]:
+    '''
+    Where the value starting at position ends, None when the buffer ends before it does.
+    '''
+    first = buffer[position:position + 1]
+    if first in (b'{', b'['):
+        return _find_nested_end(buffer, position)
+    if first == b'"':
+        match = _STRING.match(buffer, position)
+        return match.end() if match else None
+    match = _SCALAR.match(buffer, position)
+    if not match:
+        raise ValueError(f'Unexpected {first.decode(errors="replace")!r} at {position} '
+                         'of the JSON.')
+    # a number may go on in the next chunk
+    return match.end() if match.end() < len(buffer) else None
+
+def _find_nested_end(buffer: bytes, position: int) -> Optional[int]:
+    depth = 0
+    while True:
+        match = _STRUCTURE.search(buffer, position)
+        if not match:
+            return None
+        if match.group() == b'"':
+            string = _STRING.match(buffer, match.start())
+            if not string:
+                return None
+            position = string.end()
+            continue
+        depth += 1 if match.group() in (b'{', b'[') else -1
+        position = match.end()
+        if depth == 0:
+            return position
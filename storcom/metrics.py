@@ -0,0 +1,163 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+_QUANTILES = (0.5, 0.95, 0.99)
+# status of the attempts which got no response at all
+ERROR_STATUS = 'error'
+
+@dataclass
+class RequestMetrics: # pylint: disable=too-many-instance-attributes
+    '''
+    Every attempt sent to a storage, retries included: counted by method, endpoint and status,
+    with its latency and the number of bytes sent and received.
+    '''
+    counts: 'Counter[Tuple[str, str, str]]' = field(default_factory=Counter)
+    latencies: List[float] = field(default_factory=list)
+    bytes_received: int = 0
+    bytes_sent: int = 0
+    retries: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, # pylint: disable=too-many-arguments
+               method: str,
+               endpoint: str,
+               status: str,
+               started: float,
+               *,
+               bytes_received: int = 0,
+               bytes_sent: int = 0,
+               retry: bool = False) -> None:
+        finished = time.monotonic()
+        with self._lock:
+            self.counts[(method, endpoint, status)] += 1
+            self.latencies.append(finished - started)
+            self.bytes_received += bytes_received
+            self.bytes_sent += bytes_sent
+            self.retries += retry
+            self.started = started if self.started is None else min(self.started, started)
+            self.finished = finished if self.finished is None else max(self.finished, finished)
+
+    def record_received(self, bytes_received: int) -> None:
+        '''
+        Bytes of a streamed body, counted once it is read.
+        '''
+        finished = time.monotonic()
+        with self._lock:
+            self.bytes_received += bytes_received
+            self.finished = finished if self.finished is None else max(self.finished, finished)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            elapsed = (self.finished or 0) - (self.started or 0)
+            return {
+                'requests': len(latencies),
+                'retries': self.retries,
+                'statuses': dict(Counter({status: count
+                                          for (_, _, status), count in self.counts.items()})),
+                'by_endpoint': [{'method': method,
+                                 'endpoint': endpoint,
+                                 'status': status,
+                                 'count': count}
+                                for (method, endpoint, status), count
+                                in sorted(self.counts.items())],
+                'latency': {f'p{round(q * 100)}': _get_quantile(latencies, q) for q in _QUANTILES},
+                'latency_sum': math.fsum(latencies),
+                'bytes_received': self.bytes_received,
+                'bytes_sent': self.bytes_sent,
+                'elapsed': elapsed,
+                'requests_per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+                'bytes_received_per_second': self.bytes_received / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def to_json(self, labels: Dict[str, str]) -> str:
+        return json.dumps({**labels, **self.summary()})
+
+    def __str__(self) -> str:
+        summary = self.summary()
+        latency = ', '.join(f'{name} {value * 1000:.1f}ms'
+                            for name, value in summary['latency'].items())
+        statuses = ', '.join(f'{status}: {count}' for status, count in summary['statuses'].items())
+        return (f'{summary["requests"]} requests ({statuses}), {summary["retries"]} retries, '
+                f'latency {latency}, {summary["requests_per_second"]:.1f} requests/s, '
+                f'received {summary["bytes_received"]} bytes, sent {summary["bytes_sent"]} bytes')
+
+def to_prometheus(entries: Sequence[Tuple[RequestMetrics, Dict[str, str]]]) -> str:
+    '''
+    Text exposition format of the metrics of one or more storages told apart by their labels,
+    suitable for the node exporter's textfile collector.
+    '''
+    summaries = [(metrics.summary(), labels) for metrics, labels in entries]
+    lines = [
+        '# HELP storcom_requests_total Requests sent to the storage, retries included.',
+        '# TYPE storcom_requests_total counter',
+        *(f'storcom_requests_total{_format_labels({**labels, **_get_request_labels(e)})} '
+          f'{e["count"]}' for summary, labels in summaries for e in summary['by_endpoint']),
+        '# HELP storcom_request_retries_total Requests which were retries of failed ones.',
+        '# TYPE storcom_request_retries_total counter',
+        *_get_samples('storcom_request_retries_total', 'retries', summaries),
+        '# HELP storcom_request_duration_seconds Latency of the requests.',
+        '# TYPE storcom_request_duration_seconds summary',
+        *(f'storcom_request_duration_seconds{_format_labels({**labels, "quantile": str(q)})} '
+          f'{summary["latency"][f"p{round(q * 100)}"]}'
+          for summary, labels in summaries for q in _QUANTILES),
+        *_get_samples('storcom_request_duration_seconds_sum', 'latency_sum', summaries),
+        *_get_samples('storcom_request_duration_seconds_count', 'requests', summaries),
+        '# HELP storcom_received_bytes_total Bytes of the response bodies.',
+        '# TYPE storcom_received_bytes_total counter',
+        *_get_samples('storcom_received_bytes_total', 'bytes_received', summaries),
+        '# HELP storcom_sent_bytes_total Bytes of the request bodies.',
+        '# TYPE storcom_sent_bytes_total counter',
+        *_get_samples('storcom_sent_bytes_total', 'bytes_sent', summaries),
+        '# HELP storcom_last_run_timestamp_seconds When the metrics were written.',
+        '# TYPE storcom_last_run_timestamp_seconds gauge',
+        *(f'storcom_last_run_timestamp_seconds{_format_labels(labels)} {time.time()}'
+          for _, labels in summaries),
+    ]
+    return '\n'.join(lines) + '\n'
+
+def write_metrics(entries: Sequence[Tuple[RequestMetrics, Dict[str, str]]],
+                  path: Path,
+                  metrics_format: str) -> None:
+    '''
+    Replaces the file atomically, a collector never reads a half written one. JSON has a line
+    per storage.
+    '''
+    if metrics_format == 'prometheus':
+        text = to_prometheus(entries)
+    else:
+        text = ''.join(f'{metrics.to_json(labels)}\n' for metrics, labels in entries)
+    temporary_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    temporary_path.write_text(text, encoding='utf-8')
+    os.replace(temporary_path, path)
+
+def _get_quantile(values: List[float], quantile: float) -> float:
+    # nearest rank on the sorted values
+    if not values:
+        return 0.0
+    return values[max(math.ceil(quantile * len(values)) - 1, 0)]
+
+def _get_samples(name: str,
+                 key: str,
+                 summaries: List[Tuple[Dict[str, Any], Dict[str, str]]]) -> Iterator[str]:
+    for summary, labels in summaries:
+        yield f'{name}{_format_labels(labels)} {summary[key]}'
+
+def _get_request_labels(requests: Dict[str, Any]) -> Dict[str, str]:
+    return {name: requests[name] for name in ('method', 'endpoint', 'status')}
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
@@ -0,0 +1,283 @@
+import fnmatch
+import operator
+import re
+from dataclasses import dataclass
+from functools import reduce
+from datetime import datetime
+from typing import (AbstractSet, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple,
+                    Union, cast)
+
+from storcom.aliases import File, FilesPage, QueryArg
+from storcom.errors import FilterError
+from storcom.filter import Filter, get_filter_operator, is_relative_datetime, parse_datetime
+
+Predicate = Callable[[File], bool]
+
+_TOKEN_PATTERN = re.compile(r'''\s*(?:
+    (?P<parenthesis>[()])
+    |"(?P<double_quoted>(?:[^"\\]|\\.)*)"
+    |'(?P<single_quoted>(?:[^'\\]|\\.)*)'
+    |(?P<bare>[^\s()'"]+)
+)''', re.VERBOSE)
+_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'gt': operator.gt,
+    'le': operator.le,
+    'ge': operator.ge,
+}
+_OPERATOR_ALIASES = {'lte': 'le', 'gte': 'ge'}
+_PATTERN_OPERATORS = ['like', 'glob', 'match']
+_KEYWORDS = ['and', 'or', 'not']
+
+@dataclass(frozen=True)
+class Comparison:
+    # dotted path into the file JSON
+    field: str
+    operator: str
+    value: str
+    # quoted values are always compared as strings
+    quoted: bool = False
+
+@dataclass(frozen=True)
+class Not:
+    operand: 'Node'
+
+@dataclass(frozen=True)
+class And:
+    operands: Tuple['Node', ...]
+
+@dataclass(frozen=True)
+class Or:
+    operands: Tuple['Node', ...]
+
+Node = Union[Comparison, Not, And, Or]
+
+@dataclass(frozen=True)
+class _Token:
+    text: str
+    quoted: bool = False
+
+    def is_keyword(self, keyword: str) -> bool:
+        return not self.quoted and self.text.lower() == keyword
+
+def parse(expression: str) -> Node:
+    '''
+    Parses expressions such as: name glob '*.wav' and (file_bytes ge 1000 or not type eq folder).
+    Comparisons are eq, ne, lt, gt, le and ge, numeric when both sides are numbers, like with
+    % and _ wildcards, glob with shell wildcards and match with a regular expression.
+    '''
+    tokens = _tokenize(expression)
+    node = _parse_or(tokens)
+    if tokens:
+        raise FilterError(f'Unexpected {tokens[0].text!r} in: {expression}')
+    return node
+
+def compile_predicate(node: Node, datetime_fields: AbstractSet[str] = frozenset()) -> Predicate:
+    '''
+    Builds the predicate once, the patterns and numbers are prepared ahead of evaluation. The
+    values of datetime_fields and the relative dates such as now-1d are compared as points in
+    time, as the storages compare them.
+    '''
+    if isinstance(node, Comparison):
+        return _compile_comparison(node, datetime_fields)
+    if isinstance(node, Not):
+        operand = compile_predicate(node.operand, datetime_fields)
+        return lambda f: not operand(f)
+    predicates = [compile_predicate(operand, datetime_fields) for operand in node.operands]
+    if isinstance(node, And):
+        return reduce(lambda left, right: lambda f: left(f) and right(f), predicates)
+    return reduce(lambda left, right: lambda f: left(f) or right(f), predicates)
+
+def plan(expression: str,
+         filters: List[Filter],
+         query_args: Dict[str, QueryArg]) -> Tuple[Dict[str, QueryArg], Optional[Predicate]]:
+    '''
+    Splits the expression into the query args the storage evaluates and the predicate which is
+    evaluated locally. Only the top level conjuncts the storage filters support are pushed down,
+    fields already present in query_args are left to the predicate.
+    '''
+    pushed = dict(query_args)
+    local: List[Node] = []
+    for node in _get_conjuncts(parse(expression)):
+        if not isinstance(node, Comparison) or not _push_down(node, filters, pushed, query_args):
+            local.append(node)
+    if not local:
+        return pushed, None
+    # the local conditions mean what they would mean pushed down
+    datetime_fields = {f.field for f in filters if f.is_datetime}
+    return pushed, compile_predicate(And(tuple(local)), datetime_fields)
+
+def filter_pages(pages: Iterable[FilesPage], predicate: Predicate) -> Iterator[FilesPage]:
+    for page in pages:
+        yield [f for f in page if predicate(f)]
+
+def _tokenize(expression: str) -> List[_Token]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise FilterError(f'Unterminated quote in: {expression}')
+        position = match.end()
+        quoted = match.group('double_quoted')
+        if quoted is None:
+            quoted = match.group('single_quoted')
+        if quoted is not None:
+            tokens.append(_Token(re.sub(r'\\(.)', r'\1', quoted), quoted=True))
+        else:
+            tokens.append(_Token(match.group('parenthesis') or match.group('bare')))
+    return tokens
+
+def _parse_or(tokens: List[_Token]) -> Node:
+    operands = [_parse_and(tokens)]
+    while tokens and tokens[0].is_keyword('or'):
+        tokens.pop(0)
+        operands.append(_parse_and(tokens))
+    return operands[0] if len(operands) == 1 else Or(tuple(operands))
+
+def _parse_and(tokens: List[_Token]) -> Node:
+    operands = [_parse_not(tokens)]
+    while tokens and tokens[0].is_keyword('and'):
+        tokens.pop(0)
+        operands.append(_parse_not(tokens))
+    return operands[0] if len(operands) == 1 else And(tuple(operands))
+
+def _parse_not(tokens: List[_Token]) -> Node:
+    if tokens and tokens[0].is_keyword('not'):
+        tokens.pop(0)
+        return Not(_parse_not(tokens))
+    if tokens and tokens[0] == _Token('('):
+        tokens.pop(0)
+        node = _parse_or(tokens)
+        if not tokens or tokens.pop(0) != _Token(')'):
+            raise FilterError('Missing closing parenthesis')
+        return node
+    return _parse_comparison(tokens)
+
+def _parse_comparison(tokens: List[_Token]) -> Comparison:
+    if len(tokens) < 3:
+        raise FilterError('Incomplete comparison, expected: field operator value')
+    field, operator_token, value = tokens.pop(0), tokens.pop(0), tokens.pop(0)
+    if field.quoted or field.text in '()' or any(field.is_keyword(k) for k in _KEYWORDS):
+        raise FilterError(f'Expected a field name, got: {field.text}')
+    operator_name = _OPERATOR_ALIASES.get(operator_token.text.lower(), operator_token.text.lower())
+    if operator_token.quoted or operator_name not in [*_COMPARISONS, *_PATTERN_OPERATORS]:
+        raise FilterError(f'Filter operator {operator_token.text} is not supported')
+    if not value.quoted and value.text in '()':
+        raise FilterError(f'Expected a value for {field.text}')
+    return Comparison(field.text, operator_name, value.text, value.quoted)
+
+def _compile_comparison(comparison: Comparison, datetime_fields: AbstractSet[str]) -> Predicate:
+    get_value = _compile_getter(comparison.field)
+    if comparison.operator in _PATTERN_OPERATORS:
+        search = _compile_pattern(comparison)
+        def match(f: File) -> bool:
+            value = get_value(f)
+            return value is not None and search(_to_text(value))
+        return match
+    compare = _COMPARISONS[comparison.operator]
+    # a missing field only differs from the value
+    missing = comparison.operator == 'ne'
+    number = None if comparison.quoted else _to_number(comparison.value)
+    text = comparison.value
+    def compare_text(f: File) -> bool:
+        value = get_value(f)
+        return missing if value is None else compare(_to_text(value), text)
+    if comparison.field in datetime_fields or \
+            not comparison.quoted and is_relative_datetime(comparison.value):
+        moment = parse_datetime(comparison.value)
+        def compare_datetime(f: File) -> bool:
+            value = get_value(f)
+            if value is None:
+                return missing
+            value_moment = _to_datetime(value)
+            if value_moment is None:
+                return compare(_to_text(value), text)
+            return compare(value_moment, moment)
+        return compare_datetime
+    if number is None:
+        return compare_text
+    def compare_number(f: File) -> bool:
+        value = get_value(f)
+        if value is None:
+            return missing
+        value_number = value if isinstance(value, (int, float)) else _to_number(_to_text(value))
+        if value_number is None or isinstance(value_number, bool):
+            return compare(_to_text(value), text)
+        return compare(value_number, number)
+    return compare_number
+
+def _compile_getter(field: str) -> Callable[[File], Any]:
+    if '.' not in field:
+        return lambda f: f.get(field)
+    path = field.split('.')
+    def get_nested(f: File) -> Any:
+        value: Any = f
+        for key in path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+    return get_nested
+
+def _compile_pattern(comparison: Comparison) -> Callable[[str], bool]:
+    if comparison.operator == 'glob':
+        pattern = re.compile(fnmatch.translate(comparison.value))
+    elif comparison.operator == 'like':
+        # case insensitive as in sqlite and the storages
+        like = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c)
+                       for c in comparison.value)
+        pattern = re.compile(f'(?:{like})\\Z', re.IGNORECASE | re.DOTALL)
+    else:
+        try:
+            pattern = re.compile(comparison.value)
+        except re.error as e:
+            raise FilterError(f'Invalid regular expression {comparison.value}: {e}') from e
+        return lambda text: pattern.search(text) is not None
+    return lambda text: pattern.match(text) is not None
+
+def _get_conjuncts(node: Node) -> Tuple[Node, ...]:
+    return node.operands if isinstance(node, And) else (node,)
+
+def _push_down(comparison: Comparison,
+               filters: List[Filter],
+               pushed: Dict[str, QueryArg],
+               query_args: Dict[str, QueryArg]) -> bool:
+    storage_filter = next((f for f in filters if f.field == comparison.field), None)
+    operator_spelling = storage_filter and get_filter_operator(storage_filter, comparison.operator)
+    if not storage_filter or not operator_spelling or query_args.get(comparison.field):
+        return False
+    value = f'{operator_spelling} {comparison.value}'
+    if not storage_filter.multiple:
+        if pushed.get(comparison.field):
+            return False
+        pushed[comparison.field] = value
+        return True
+    values = cast(Tuple[str, ...], pushed.get(comparison.field) or ())
+    # the storage keeps only the last value of an operator
+    if any(v.split(' ', 1)[0] == operator_spelling for v in values):
+        return False
+    pushed[comparison.field] = (*values, value)
+    return True
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value if isinstance(value, str) else str(value)
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return parse_datetime(value)
+    except FilterError:
+        return None
+
+def _to_number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -0,0 +1,200 @@
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from storcom.errors import CircuitOpenError
+
+_IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+# the request was rejected before being processed, safe to repeat for any method
+_REJECTED_STATUSES = frozenset([429])
+_TRANSIENT_STATUSES = frozenset([429, 502, 503, 504])
+
+_circuit_breakers: Dict[str, 'CircuitBreaker'] = {}
+_circuit_breakers_lock = threading.Lock()
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    # total number of attempts including the first one, 1 disables retries
+    max_attempts: int = 4
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    # consecutive failures which open the circuit for a host, 0 disables the breaker
+    breaker_threshold: int = 20
+    breaker_cooldown: float = 30.0
+
+    def get_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        requested = _parse_retry_after(retry_after)
+        if requested is not None:
+            return min(requested, self.max_backoff)
+        # full jitter: spreads the retries of concurrent workers instead of synchronizing them
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+@dataclass
+class RetryStats:
+    retries: int = 0
+    reasons: 'Counter[str]' = field(default_factory=Counter)
+    breaker_opened: int = 0
+    breaker_rejected: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_retry(self, reason: str) -> None:
+        with self._lock:
+            self.retries += 1
+            self.reasons[reason] += 1
+
+    def record_breaker(self, opened: bool = False, rejected: bool = False) -> None:
+        with self._lock:
+            self.breaker_opened += opened
+            self.breaker_rejected += rejected
+
+    def __str__(self) -> str:
+        reasons = ', '.join(f'{reason}: {count}' for reason, count in self.reasons.most_common())
+        summary = f'retried {self.retries} requests' + (f' ({reasons})' if reasons else '')
+        if self.breaker_opened or self.breaker_rejected:
+            summary += (f', circuit breaker opened {self.breaker_opened} times'
+                        f' and rejected {self.breaker_rejected} requests')
+        return summary
+
+class CircuitBreaker:
+    '''
+    Stops sending requests to a host after a number of consecutive failures. Once the cooldown
+    is over a single probe request is let through: its success closes the circuit again,
+    its failure restarts the cooldown.
+    '''
+    def __init__(self, threshold: int, cooldown: float):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self, host: str) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self._cooldown - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(f'Circuit is open for {host}, '
+                                       f'retry in {max(remaining, 0):.0f}s')
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        '''
+        Returns True when this failure opens the circuit.
+        '''
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                self._opened_at = time.monotonic()
+                self._probing = False
+                return False
+            if self._threshold and self._opened_at is None and self._failures >= self._threshold:
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+class Retrier:
+    '''
+    Retry decisions for a single request, independent from the http client which sends it.
+    '''
+    def __init__(self, method: str, url: str, policy: RetryPolicy, stats: RetryStats):
+        self._method = method.upper()
+        self._host = urlsplit(url).netloc
+        self._policy = policy
+        self._stats = stats
+        self._breaker = get_circuit_breaker(self._host, policy)
+        self._attempt = 0
+        # let through by the breaker, neither a response nor an error recorded yet
+        self._in_flight = False
+
+    @property
+    def attempt(self) -> int:
+        '''
+        Number of the attempt about to be made or in flight, 0 for the first one.
+        '''
+        return self._attempt
+
+    def before_attempt(self) -> None:
+        try:
+            self._breaker.check(self._host)
+        except CircuitOpenError:
+            self._stats.record_breaker(rejected=True)
+            raise
+        self._in_flight = True
+
+    def after_attempt(self) -> None:
+        '''
+        Counts an attempt which ended in an error passed neither to on_status nor to on_error
+        as a failure, so that it does not leave the probe of an open circuit in flight.
+        '''
+        if self._in_flight:
+            self._record_failure()
+
+    def on_status(self, status: int, retry_after: Optional[str] = None) -> Optional[float]:
+        '''
+        Returns the delay before the next attempt or None when the response is final.
+        '''
+        if status not in _TRANSIENT_STATUSES:
+            self._in_flight = False
+            self._breaker.record_success()
+            return None
+        self._record_failure()
+        retryable = self._method in _IDEMPOTENT_METHODS or status in _REJECTED_STATUSES
+        return self._next_delay(str(status), retry_after) if retryable else None
+
+    def on_error(self, error: Exception) -> Optional[float]:
+        '''
+        Returns the delay before the next attempt or None when the error should be raised.
+        '''
+        self._record_failure()
+        if self._method not in _IDEMPOTENT_METHODS:
+            return None
+        return self._next_delay(type(error).__name__)
+
+    def _next_delay(self, reason: str, retry_after: Optional[str] = None) -> Optional[float]:
+        if self._attempt + 1 >= self._policy.max_attempts:
+            return None
+        delay = self._policy.get_delay(self._attempt, retry_after)
+        self._attempt += 1
+        self._stats.record_retry(reason)
+        return delay
+
+    def _record_failure(self) -> None:
+        self._in_flight = False
+        if self._breaker.record_failure():
+            self._stats.record_breaker(opened=True)
+
+def get_circuit_breaker(host: str, policy: RetryPolicy) -> CircuitBreaker:
+    with _circuit_breakers_lock:
+        if host not in _circuit_breakers:
+            _circuit_breakers[host] = CircuitBreaker(policy.breaker_threshold,
+                                                     policy.breaker_cooldown)
+        return _circuit_breakers[host]
+
+def _parse_retry_after(retry_after: Optional[str]) -> Optional[float]:
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime # pylint: disable=import-outside-toplevel
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
@@ -1,53 +1,179 @@
+import functools
+import json
 import sys
+import time
 from abc import ABCMeta, abstractmethod
-from multiprocessing.pool import ThreadPool
-from typing import List, Dict, Tuple, Any
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Tuple, Any, Iterator, Optional, Iterable, Callable, TypeVar
+from urllib.parse import urljoin, urlsplit
 
 import curlify
 import requests
-from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (RequestException,
+                                 ConnectionError as RequestsConnectionError,
+                                 Timeout)
 from requests.auth import AuthBase
 
+from storcom.concurrency import AdaptiveConcurrency
+from storcom.httpcache import CachedResponse, HttpCache, get_cache_url
 from storcom.context import Context
 from storcom.config import StorageConfig
-from storcom.filter import Filter, get_fcc_filters, to_fcc_qs_params
+from storcom.filter import Filter, get_fcc_filters, get_cx_filters, to_fcc_qs_params, to_cx_filter
 from storcom.errors import StorageInteractionError
-from storcom.aliases import QueryArg
-
-_THREAD_POOL_SIZE = 5
-_TIMEOUT = 10
-
-File = Dict[str, str]
-TabularFileList = Tuple[List[List[str]], List[str]]
-
-class BaseStorage():
+from storcom.aliases import QueryArg, File, FilesPage, Row
+from storcom.bulk import BulkReport, BulkResult, ProgressCallback, map_bulk, run_bulk
+from storcom.retry import Retrier, RetryStats
+from storcom.metrics import ERROR_STATUS, RequestMetrics
+from storcom.transfer import MultipartBody, TransferCallback, download
+from storcom.jsonstream import ItemsStream
+
+REQUEST_TIMEOUT = 10
+_PAGE_SIZE = 1000
+_LIST_CHUNK_SIZE = 64 * 1024
+# answers which tell that a cached response is gone for good
+_GONE_STATUSES = (404, 410)
+
+TabularFileList = Tuple[Iterator[List[Row]], List[str]]
+T = TypeVar('T')
+
+class BaseStorage(): # pylint: disable=too-many-instance-attributes
     __metaclass__ = ABCMeta
 
-    def __init__(self, config: StorageConfig, show_curl: bool=False):
-        self._storage_url, self._token = config
+    def __init__(self,
+                 config: StorageConfig,
+                 context: Context,
+                 show_curl: bool=False,
+                 session: Optional[requests.Session] = None,
+                 cache: Optional[HttpCache] = None):
+        self._context = context
+        self._storage_url = config.storage_url
+        floor, ceiling = config.worker_range
+        self._concurrency = AdaptiveConcurrency(config.workers, floor, ceiling)
+        # threads and connections for the most requests the concurrency may allow
+        self._workers = ceiling
         self._show_curl = show_curl
+        self._retry_policy = config.retry
+        self._retry_stats = RetryStats()
+        self._metrics = RequestMetrics()
+        # the token goes with every request, a session can serve storages with different tokens
+        self._auth = CxAuth(config.token)
+        # one keep-alive session per storage shared by all the worker threads, unless the caller
+        # shares its own between the storages of the same host
+        self._owns_session = session is None
+        self._session = session or create_session(ceiling)
+        # the show and list responses are revalidated instead of fetched again
+        self._cache = cache
 
     @property
     def supported_filters(self) -> List[Filter]:
         return []
 
+    @property
+    def retry_stats(self) -> RetryStats:
+        return self._retry_stats
+
+    @property
+    def metrics(self) -> RequestMetrics:
+        return self._metrics
+
+    @property
+    def concurrency(self) -> AdaptiveConcurrency:
+        return self._concurrency
+
+    @property
+    def context(self) -> Context:
+        return self._context
+
+    @property
+    def id_field(self) -> str:
+        return self._leading_columns[0]
+
+    @property
+    def name_field(self) -> str:
+        return 'name'
+
+    @property
     @abstractmethod
-    def show_file(self, file_id: str) -> str:
+    def changed_field(self) -> str:
         pass
 
     @abstractmethod
-    def delete_files(self, file_ids: List[str]) -> None:
+    def show_file(self, file_id: str) -> str:
         pass
 
-    def list_files(self, filters: Dict[str, QueryArg]) -> str:
-        return self._request_files_list(filters).text
+    def show_files(self, file_ids: Iterable[str], ordered: bool = False) -> Iterator[BulkResult]:
+        return map_bulk(self._concurrency.limited(self.show_file), file_ids, self._workers, ordered)
+
+    def delete_files(self,
+                     file_ids: Iterable[str],
+                     on_progress: Optional[ProgressCallback] = None,
+                     rate: Optional[float] = None) -> BulkReport:
+        return run_bulk(self._concurrency.limited(self._delete_file),
+                        file_ids,
+                        self._workers,
+                        on_progress,
+                        rate)
+
+    def get_file(self,
+                 file_id: str,
+                 path: Path,
+                 on_progress: Optional[TransferCallback] = None) -> int:
+        '''
+        Downloads the content of the file to path, returns the number of bytes.
+        '''
+        try:
+            return download(self._make_request,
+                            self._get_file_data_url(file_id),
+                            path,
+                            # the ranges stream their bodies past the requests, they keep
+                            # the concurrency chosen so far
+                            self._concurrency.limit,
+                            on_progress)
+        except (RequestException, OSError) as e:
+            raise StorageInteractionError(f"Can't download file {file_id}") from e
+
+    def put_file(self, path: Path, name: Optional[str] = None) -> str:
+        '''
+        Uploads the content of path as a new file, returns the storage's description of it.
+        '''
+        try:
+            body = MultipartBody(self._get_upload_fields(name or path.name),
+                                 'file',
+                                 path,
+                                 path.name)
+            return self._make_request('POST',
+                                      self._files_list_url,
+                                      data=body,
+                                      headers={'Content-Type': body.content_type}).text
+        except (RequestException, OSError) as e:
+            raise StorageInteractionError(f"Can't upload file {path}") from e
+
+    def list_files(self, filters: Dict[str, QueryArg]) -> Iterator[File]:
+        for page in self.list_files_pages(filters):
+            yield from page
+
+    def list_files_pages(self, filters: Dict[str, QueryArg]) -> Iterator[FilesPage]:
+        return self._list_pages(filters, None, to_file)
+
+    def list_files_rows(self,
+                        filters: Dict[str, QueryArg],
+                        fields: List[str]) -> Iterator[List[Row]]:
+        '''
+        Only the fields of the files, projected into rows as the listing is decoded. The storages
+        which can select the fields of a listing are asked for these fields only.
+        '''
+        return self._list_pages(filters, fields, functools.partial(_to_row, fields=fields))
 
     def list_files_tabular(self,
                            middle_columns: List[str],
                            filters: Dict[str, QueryArg]) -> TabularFileList:
-        return _list_files_tabular(
-            self._request_files_list(filters),
-            [*self._leading_columns, *(middle_columns or []), *self._trailing_columns])
+        fields = self.get_tabular_fields(middle_columns)
+        return self.list_files_rows(filters, fields), fields
+
+    def get_tabular_fields(self, middle_columns: List[str]) -> List[str]:
+        return [*self._leading_columns, *(middle_columns or []), *self._trailing_columns]
 
     @property
     @abstractmethod
@@ -59,43 +185,193 @@ class BaseStorage():
     def _trailing_columns(self) -> List[str]:
         pass
 
+    def close(self) -> None:
+        if self._owns_session:
+            self._session.close()
+
+    @property
     @abstractmethod
-    def _request_files_list(self, filters: Dict[str, QueryArg]) -> requests.Response:
+    def _files_list_url(self) -> str:
         pass
 
+    @abstractmethod
+    def _get_files_list_params(self, filters: Dict[str, QueryArg]) -> Dict[str, str]:
+        pass
+
+    @abstractmethod
+    def _delete_file(self, file_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def _get_file_url(self, file_id: str) -> str:
+        pass
+
+    @abstractmethod
+    def _get_upload_fields(self, name: str) -> Dict[str, str]:
+        pass
+
+    def _get_file_data_url(self, file_id: str) -> str:
+        return f'{self._get_file_url(file_id)}/data'
+
+    def _get_fields_params(self, _: List[str]) -> Dict[str, str]:
+        return {}
+
+    def _get_first_page_cursor(self,
+                               filters: Dict[str, QueryArg],
+                               fields: Optional[List[str]] = None) -> 'PageCursor':
+        return PageCursor(self._files_list_url,
+                          {'limit': str(_PAGE_SIZE),
+                           **self._get_files_list_params(filters),
+                           **(self._get_fields_params(fields) if fields else {})})
+
+    def _list_pages(self,
+                    filters: Dict[str, QueryArg],
+                    fields: Optional[List[str]],
+                    to_record: Callable[[Any], T]) -> Iterator[List[T]]:
+        cursor = self._get_first_page_cursor(filters, fields)
+        while cursor.url:
+            try:
+                response = self._make_request('GET', cursor.url, params=cursor.params, stream=True)
+            except RequestException as e:
+                raise StorageInteractionError("Can't get list of files.") from e
+            # the files are decoded as the body arrives, a huge page is never held whole
+            items = ItemsStream(response.iter_content(_LIST_CHUNK_SIZE))
+            try:
+                yield from _batch_records(items, to_record)
+            except RequestException as e:
+                raise StorageInteractionError("Can't get list of files.") from e
+            except ValueError as e:
+                raise StorageInteractionError('Invalid file list JSON.') from e
+            finally:
+                response.close()
+            cursor.advance(items.document, items.count)
+
+    def _get_endpoint(self, url: str) -> str:
+        path = urlsplit(url).path
+        if path == urlsplit(self._files_list_url).path:
+            return 'files'
+        return 'file_data' if path.endswith('/data') else 'file'
+
+    def _record_error(self, method: str, endpoint: str, started: float, retry: bool) -> None:
+        '''
+        An attempt which got no response at all.
+        '''
+        self._metrics.record(method, endpoint, ERROR_STATUS, started, retry=retry)
+        self._concurrency.record_error(time.monotonic() - started)
+
     def _make_request(self,
                       method: str,
                       url: str,
                       **kwargs: Any) -> requests.Response:
-        response = requests.request(method,
-                                    url,
-                                    allow_redirects=True,
-                                    auth=CxAuth(self._token),
-                                    timeout=_TIMEOUT,
-                                    **kwargs)
-        if self._show_curl:
-            print(curlify.to_curl(response.request), file=sys.stderr)
-        response.raise_for_status()
-        return response
+        retrier = Retrier(method, url, self._retry_policy, self._retry_stats)
+        endpoint = self._get_endpoint(url)
+        cache_url = self._get_cache_url(method, endpoint, url, kwargs.get('params'))
+        cached = self._cache.load(self._context, cache_url) if self._cache and cache_url else None
+        if cached:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **cached.validators}
+        while True:
+            retrier.before_attempt()
+            if isinstance(kwargs.get('data'), MultipartBody):
+                # a retried upload is sent from the start
+                kwargs['data'].seek(0)
+            try:
+                started = time.monotonic()
+                try:
+                    response = self._session.request(method,
+                                                     url,
+                                                     auth=self._auth,
+                                                     allow_redirects=True,
+                                                     timeout=REQUEST_TIMEOUT,
+                                                     **kwargs)
+                except (RequestsConnectionError, Timeout) as e:
+                    self._record_error(method, endpoint, started, retrier.attempt > 0)
+                    delay = retrier.on_error(e)
+                    if delay is None:
+                        raise
+                else:
+                    if kwargs.get('stream'):
+                        # a streamed body is not read yet, it is counted as it is read
+                        response.raw = _CountingBody(response.raw, self._metrics.record_received)
+                    self._metrics.record(method,
+                                         endpoint,
+                                         str(response.status_code),
+                                         started,
+                                         bytes_received=0 if kwargs.get('stream')
+                                         else len(response.content),
+                                         bytes_sent=_get_sent_bytes(response.request),
+                                         retry=retrier.attempt > 0)
+                    self._concurrency.record_response(response.status_code,
+                                                      time.monotonic() - started)
+                    self._pass_through_cache(method, url, cache_url, response,
+                                             cached=cached,
+                                             stream=kwargs.get('stream'))
+                    if self._show_curl:
+                        print(curlify.to_curl(response.request), file=sys.stderr)
+                    delay = retrier.on_status(response.status_code,
+                                              response.headers.get('Retry-After'))
+                    if delay is None:
+                        response.raise_for_status()
+                        return response
+            finally:
+                # any other error ends the attempt as a failure
+                retrier.after_attempt()
+            time.sleep(delay)
+
+    def _get_cache_url(self,
+                       method: str,
+                       endpoint: str,
+                       url: str,
+                       params: Optional[Dict[str, str]]) -> Optional[str]:
+        # the contents are downloaded in ranges, they are not worth caching
+        if self._cache is None or method != 'GET' or endpoint == 'file_data':
+            return None
+        return get_cache_url(url, params)
+
+    def _pass_through_cache(self, # pylint: disable=too-many-arguments
+                            method: str,
+                            url: str,
+                            cache_url: Optional[str],
+                            response: requests.Response,
+                            *,
+                            cached: Optional[CachedResponse],
+                            stream: Optional[bool]) -> None:
+        if self._cache is None:
+            return
+        if cache_url is None:
+            if method != 'GET' and response.ok:
+                # a deleted file is not served from the cache by the next show
+                self._cache.forget(self._context, url)
+        elif response.status_code == 304 and cached:
+            cached.fill(response)
+        elif response.status_code == 200:
+            self._cache.keep(self._context, cache_url, response, stream)
+        elif response.status_code in _GONE_STATUSES:
+            self._cache.forget(self._context, cache_url)
 
 class FccStorage(BaseStorage):
-    def __init__(self, config: StorageConfig, context: Context, show_curl: bool=False):
-        super().__init__(config, show_curl)
+    def __init__(self,
+                 config: StorageConfig,
+                 context: Context,
+                 show_curl: bool=False,
+                 session: Optional[requests.Session] = None,
+                 cache: Optional[HttpCache] = None):
+        super().__init__(config, context, show_curl, session, cache)
         self._owner = context.user
 
     @property
     def supported_filters(self) -> List[Filter]:
         return get_fcc_filters()
 
+    @property
+    def changed_field(self) -> str:
+        return 'date_changed'
+
     def show_file(self, file_id: str) -> str:
         try:
-            return self._make_request('GET', f'{self._storage_url}/files/{file_id}').text
+            return self._make_request('GET', self._get_file_url(file_id)).text
         except RequestException as e:
             raise StorageInteractionError(f"Can't get fcc file details for {file_id}") from e
 
-    def delete_files(self, file_ids: List[str]) -> None:
-        ThreadPool(processes=_THREAD_POOL_SIZE).map(self._delete_file, file_ids)
-
     @property
     def _leading_columns(self) -> List[str]:
         return ['id', 'name', 'batch', 'date_changed']
@@ -104,41 +380,56 @@ class FccStorage(BaseStorage):
     def _trailing_columns(self) -> List[str]:
         return ['date_created']
 
-    def _request_files_list(self, filters: Dict[str, QueryArg]) -> requests.Response:
-        try:
-            return self._make_request('GET',
-                                      f'{self._storage_url}/files',
-                                      params={
-                                          'ordering': '-date_changed',
-                                          **self._owner_param(),
-                                          **to_fcc_qs_params(filters),
-                                      })
-        except RequestException as e:
-            raise StorageInteractionError("Can't get list of files.") from e
+    @property
+    def _files_list_url(self) -> str:
+        return f'{self._storage_url}/files'
+
+    def _get_files_list_params(self, filters: Dict[str, QueryArg]) -> Dict[str, str]:
+        return {
+            'ordering': '-date_changed',
+            **self._owner_param(),
+            **to_fcc_qs_params(filters),
+        }
 
     def _delete_file(self, file_id: str) -> None:
         try:
-            self._make_request('DELETE', f'{self._storage_url}/files/{file_id}')
+            self._make_request('DELETE', self._get_file_url(file_id))
         except RequestException as e:
             raise StorageInteractionError(f"Can't delete fcc file {file_id}") from e
 
+    def _get_file_url(self, file_id: str) -> str:
+        return f'{self._storage_url}/files/{file_id}'
+
+    def _get_upload_fields(self, name: str) -> Dict[str, str]:
+        return {'name': name, **self._owner_param()}
+
     def _owner_param(self) -> Dict[str, str]:
         return {'owner': self._owner} if self._owner else {}
 
 class CxStorage(BaseStorage):
-    def __init__(self, config: StorageConfig, context: Context, show_curl: bool=False):
-        super().__init__(config, show_curl)
+    def __init__(self,
+                 config: StorageConfig,
+                 context: Context,
+                 show_curl: bool=False,
+                 session: Optional[requests.Session] = None,
+                 cache: Optional[HttpCache] = None):
+        super().__init__(config, context, show_curl, session, cache)
         self._container_sid = context.user
 
+    @property
+    def supported_filters(self) -> List[Filter]:
+        return get_cx_filters()
+
+    @property
+    def changed_field(self) -> str:
+        return 'date_modified'
+
     def show_file(self, file_id: str) -> str:
         try:
-            return self._make_request('GET', f'{self._get_files_base_url()}/{file_id}').text
+            return self._make_request('GET', self._get_file_url(file_id)).text
         except RequestException as e:
             raise StorageInteractionError(f"Can't get cx file details for {file_id}") from e
 
-    def delete_files(self, file_ids: List[str]) -> None:
-        ThreadPool(processes=_THREAD_POOL_SIZE).map(self._delete_file, file_ids)
-
     @property
     def _leading_columns(self) -> List[str]:
         return ['file_sid', 'name', 'type', 'mime_type']
@@ -147,22 +438,31 @@ class CxStorage(BaseStorage):
     def _trailing_columns(self) -> List[str]:
         return ['date_modified']
 
-    def _request_files_list(self, filters: Dict[str, QueryArg]) -> requests.Response:
-        try:
-            return self._make_request('GET',
-                                      self._get_files_base_url(),
-                                      params={
-                                          'filter': f'container_sid eq {self._container_sid}',
-                                      })
-        except RequestException as e:
-            raise StorageInteractionError("Can't get list of files.") from e
+    @property
+    def _files_list_url(self) -> str:
+        return self._get_files_base_url()
+
+    def _get_files_list_params(self, filters: Dict[str, QueryArg]) -> Dict[str, str]:
+        return {
+            'filter': ' and '.join([f'container_sid eq {self._container_sid}',
+                                    *to_cx_filter(filters)]),
+        }
+
+    def _get_fields_params(self, fields: List[str]) -> Dict[str, str]:
+        return {'include_fields': ','.join(fields)}
 
     def _delete_file(self, file_id: str) -> None:
         try:
-            self._make_request('DELETE', f'{self._get_files_base_url()}/{file_id}')
+            self._make_request('DELETE', self._get_file_url(file_id))
         except RequestException as e:
             raise StorageInteractionError(f"Can't delete cx file {file_id}") from e
 
+    def _get_file_url(self, file_id: str) -> str:
+        return f'{self._get_files_base_url()}/{file_id}'
+
+    def _get_upload_fields(self, name: str) -> Dict[str, str]:
+        return {'data': json.dumps({'container_sid': self._container_sid, 'name': name})}
+
     def _get_files_base_url(self) -> str:
         return f'{self._storage_url}/core/v2/storage/files'
 
@@ -174,14 +474,102 @@ class CxAuth(AuthBase):
         request.headers['Authorization'] = f'Bearer {self._token}'
         return request
 
-def _list_files_tabular(files_list_response: requests.Response,
-                        fields: List[str]) -> TabularFileList:
-    try:
-        files: List[File] = files_list_response.json()['items']
-    except Exception as e:
-        raise StorageInteractionError('Invalid file list JSON.') from e
-
-    return [_get_tabular_field_values(file, fields) for file in files], fields
-
-def _get_tabular_field_values(file: File, fields: List[str]) -> List[str]:
-    return [file.get(field, '') for field in fields]
+@dataclass
+class PageCursor:
+    '''
+    Where the next page of a files list is: follows next links when the storage
+    provides them, otherwise moves the offset while the storage reports more files.
+    '''
+    url: Optional[str]
+    params: Dict[str, str]
+    offset: int = 0
+
+    def advance(self, page: Dict[str, Any], count: int) -> None:
+        '''
+        Moves past the page of count files, the page holds the members besides the files.
+        '''
+        assert self.url is not None
+        next_url = _get_next_page_url(page)
+        if next_url:
+            # next link carries the whole query string including filters and limit
+            self.url, self.params = urljoin(self.url, next_url), {}
+        elif self.params and count and page.get('has_more'):
+            self.offset += count
+            self.params = {**self.params, 'offset': str(self.offset)}
+        else:
+            self.url = None
+
+def create_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def validate_files_page(page: Any) -> Dict[str, Any]:
+    if not isinstance(page, dict) or not isinstance(page.get('items'), list):
+        raise StorageInteractionError('Invalid file list JSON.')
+    return page
+
+def to_tabular_rows(pages: Iterable[FilesPage], fields: List[str]) -> Iterator[List[Row]]:
+    for files in pages:
+        yield [_to_row(file, fields) for file in files]
+
+def to_file(item: Any) -> File:
+    if not isinstance(item, dict):
+        raise ValueError(f'File {item!r} is not an object.')
+    return item
+
+class _CountingBody:
+    '''
+    Raw body of a streamed response, the bytes are counted as they are read and handed to
+    on_end once the body ends or is closed.
+    '''
+    def __init__(self, raw: Any, on_end: Callable[[int], None]):
+        self._raw = raw
+        self._on_end = on_end
+        self._received: Optional[int] = 0
+
+    def stream(self, amt: int, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            if self._received is not None:
+                self._received += len(chunk)
+            yield chunk
+        self._end()
+
+    def close(self) -> None:
+        # a body given up before its end counts what was read of it
+        self._end()
+        self._raw.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+    def _end(self) -> None:
+        if self._received is not None:
+            self._on_end(self._received)
+            self._received = None
+
+def _batch_records(items: Iterable[Any], to_record: Callable[[Any], T]) -> Iterator[List[T]]:
+    page: List[T] = []
+    for item in items:
+        page.append(to_record(item))
+        if len(page) == _PAGE_SIZE:
+            yield page
+            page = []
+    if page:
+        yield page
+
+def _to_row(item: Any, fields: List[str]) -> Row:
+    file = to_file(item)
+    return tuple(file.get(field, '') for field in fields)
+
+def _get_sent_bytes(request: requests.PreparedRequest) -> int:
+    body: Any = request.body
+    return len(body) if body is not None and hasattr(body, '__len__') else 0
+
+def _get_next_page_url(page: Dict[str, Any]) -> Optional[str]:
+    # cx nests the links under pagination, fcc puts them at the top level
+    pagination = page.get('pagination') or {}
+    next_url: Optional[str] = pagination.get('next') or page.get('next')
+    return next_url
@@ -4,19 +4,37 @@ import click
 
 from storcom import context as storcom_context, file
 
-context = storcom_context.load() or storcom_context.Context()
+def create_cli() -> click.Group:
+    '''
+    The commands for the current context, the file options depend on its storage.
+    '''
+    context = storcom_context.load() or storcom_context.Context()
+
+    @click.group('storcom')
+    @click.pass_context
+    def storcom_group(click_context: click.Context) -> None:
+        '''
+        A unified way of working with all your storages.
+        '''
+        click_context.obj = context
+
+    storcom_group.add_command(storcom_context.context_group)
+    storcom_group.add_command(file.create_group(context))
+    storcom_group.add_command(serve)
+    return storcom_group
 
-@click.group()
-@click.pass_context
-def storcom(click_context: click.Context) -> None:
+@click.command()
+def serve() -> None:
     '''
-    A unified way of working with all your storages.
+    Run the commands of storcom in this process until stopped with Ctrl-C. The parsed config
+    and the connection pools are kept warm between the commands, while it runs storcom sends
+    the commands here instead of starting from scratch.
     '''
-    click_context.obj = context
+    from storcom.daemon import Daemon # pylint: disable=import-outside-toplevel
+    Daemon(create_cli).run()
 
 try:
-    storcom.add_command(storcom_context.context_group)
-    storcom.add_command(file.create_group(context))
+    storcom = create_cli()
 except click.ClickException as e:
     e.show()
     sys.exit(e.exit_code)
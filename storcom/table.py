@@ -0,0 +1,61 @@
+import itertools
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+_SAMPLE_SIZE = 100
+# same as tabulate, so the streamed tables look like the small ones
+_HEADER_PADDING = 2
+_ELLIPSIS = '…'
+
+@dataclass
+class _Column:
+    width: int
+    numeric: bool
+
+    def fit(self, value: str) -> str:
+        value = _truncate(value, self.width)
+        return value.rjust(self.width) if self.numeric else value.ljust(self.width)
+
+def render_table(rows: Iterable[Sequence[Any]],
+                 headers: Sequence[str],
+                 max_width: Optional[int] = None,
+                 sample_size: int = _SAMPLE_SIZE) -> Iterator[str]:
+    '''
+    Yields the lines of a presto table as the rows arrive. A listing which fits in the sample
+    is rendered by tabulate, a longer one gets its column widths from the sample and the values
+    which don't fit are truncated. Values longer than max_width are always truncated.
+    '''
+    rows = iter(rows)
+    sample = [_to_cells(row, max_width) for row in itertools.islice(rows, sample_size + 1)]
+    if len(sample) <= sample_size:
+        # imported on use to keep startup fast
+        from tabulate import tabulate # pylint: disable=import-outside-toplevel
+        yield from tabulate(sample, headers, tablefmt='presto').splitlines()
+        return
+    columns = [_get_column(header, [row[i] for row in sample]) for i, header in enumerate(headers)]
+    yield _format_line(column.fit(header) for column, header in zip(columns, headers))
+    yield '+'.join('-' * (column.width + 2) for column in columns)
+    for row in itertools.chain(sample, (_to_cells(row, max_width) for row in rows)):
+        yield _format_line(column.fit(value) for column, value in zip(columns, row))
+
+def _to_cells(row: Sequence[Any], max_width: Optional[int]) -> List[str]:
+    cells = ['' if value is None else str(value) for value in row]
+    return [_truncate(c, max_width) for c in cells] if max_width else cells
+
+def _truncate(value: str, width: int) -> str:
+    return value[:width - 1] + _ELLIPSIS if len(value) > width else value
+
+def _get_column(header: str, values: List[str]) -> _Column:
+    width = max([len(header) + _HEADER_PADDING, *(len(value) for value in values)])
+    non_empty = [value for value in values if value]
+    return _Column(width, bool(non_empty) and all(_is_number(value) for value in non_empty))
+
+def _format_line(cells: Iterable[str]) -> str:
+    return (' ' + ' | '.join(cells) + ' ').rstrip()
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
@@ -0,0 +1,88 @@
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import storage as sync_storage
+from storcom.config import StorageConfig
+from storcom.retry import RetryPolicy
+from storcom.context import Context
+from storcom.errors import StorageInteractionError
+from storcom.fake_server import serve, make_files
+
+async_storage = pytest.importorskip('storcom.async_storage')
+
+def test_list_files_walks_all_pages(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(sync_storage, '_PAGE_SIZE', 10)
+    with serve(make_files(25)) as server:
+        storage = async_storage.AsyncCxStorage(StorageConfig(server.url, 'token'),
+                                               Context(storage='cx', user='container'))
+        try:
+            assert [f['file_sid'] for f in storage.list_files({})] == list(server.files)
+            assert server.requests == 3
+        finally:
+            storage.close()
+
+def test_list_files_rows() -> None:
+    with serve(make_files(3)) as server:
+        storage = async_storage.AsyncCxStorage(StorageConfig(server.url, 'token'),
+                                               Context(storage='cx', user='container'))
+        try:
+            assert list(storage.list_files_rows({}, ['name', 'file_sid'])) == [
+                [(f['name'], f['file_sid']) for f in server.files.values()],
+            ]
+        finally:
+            storage.close()
+
+def test_show_file() -> None:
+    with serve(make_files(2)) as server:
+        storage = async_storage.AsyncFccStorage(StorageConfig(server.url, 'token'),
+                                                Context(storage='fcc'))
+        try:
+            assert '"00000001"' in storage.show_file('00000001')
+            with pytest.raises(StorageInteractionError):
+                storage.show_file('missing')
+        finally:
+            storage.close()
+
+@pytest.mark.parametrize('ordered', [False, True])
+def test_show_files(ordered: bool) -> None:
+    with serve(make_files(30)) as server:
+        storage = async_storage.AsyncFccStorage(StorageConfig(server.url, 'token', workers=3),
+                                                Context(storage='fcc'))
+        file_ids = [*server.files, 'missing', '00000000']
+        try:
+            results = list(storage.show_files(iter(file_ids), ordered))
+        finally:
+            storage.close()
+        assert server.requests == 31
+        assert [r.item for r in results if r.error] == ['missing']
+        items = [r.item for r in results]
+        assert items == file_ids[:-1] if ordered else sorted(items) == sorted(file_ids[:-1])
+
+def test_delete_files_bounded_concurrency_and_report() -> None:
+    with serve(make_files(40)) as server:
+        storage = async_storage.AsyncFccStorage(StorageConfig(server.url, 'token', workers=4),
+                                                Context(storage='fcc'))
+        try:
+            report = storage.delete_files(iter([*server.files, 'missing']))
+        finally:
+            storage.close()
+        assert len(report.succeeded) == 40
+        assert list(report.failed) == ['missing']
+        assert not server.files
+        assert server.connections <= 4
+
+def test_transient_errors_are_retried() -> None:
+    with serve(make_files(1)) as server:
+        storage = async_storage.AsyncFccStorage(
+            StorageConfig(server.url, 'token', retry=RetryPolicy(backoff=0)),
+            Context(storage='fcc'))
+        server.inject_errors(503, count=2)
+        try:
+            report = storage.delete_files(['00000000'])
+        finally:
+            storage.close()
+        assert report.succeeded == ['00000000']
+        assert storage.retry_stats.retries == 2
+        assert storage.metrics.counts == {('DELETE', 'file', '503'): 2,
+                                          ('DELETE', 'file', '204'): 1}
+        assert storage.metrics.retries == 2
@@ -0,0 +1,179 @@
+import threading
+import time
+from typing import Iterator, List
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom.bulk import run_bulk, map_bulk, prefetch, BulkReport, BulkResult, Pacer
+from storcom.errors import BulkAbortedError, StorageInteractionError
+
+def test_run_bulk_reports_succeeded_and_failed() -> None:
+    def action(item: str) -> None:
+        if item.startswith('bad'):
+            raise StorageInteractionError(f"Can't process {item}")
+
+    report = run_bulk(action, ['good1', 'bad1', 'good2', 'bad2'], workers=2)
+    assert sorted(report.succeeded) == ['good1', 'good2']
+    assert sorted(report.failed) == ['bad1', 'bad2']
+    assert report.failed['bad1'] == "Can't process bad1"
+    assert report.processed == 4
+
+def test_run_bulk_failure_reason_includes_cause() -> None:
+    def action(item: str) -> None:
+        try:
+            raise ValueError('404 Not Found')
+        except ValueError as e:
+            raise StorageInteractionError(f"Can't process {item}") from e
+
+    report = run_bulk(action, ['a'], workers=1)
+    assert report.failed == {'a': "Can't process a: 404 Not Found"}
+
+def test_run_bulk_consumes_items_lazily() -> None:
+    consumed: List[int] = []
+    release = threading.Event()
+
+    def items() -> Iterator[str]:
+        for i in range(100):
+            consumed.append(i)
+            yield str(i)
+
+    def action(_: str) -> None:
+        release.wait()
+
+    progress: List[int] = []
+    def on_progress(report: BulkReport) -> None:
+        progress.append(report.processed)
+        # nothing beyond the bounded window is pulled before the first item finishes
+        if len(progress) == 1:
+            assert len(consumed) <= 2 * 2 + 1
+    threading.Timer(0.1, release.set).start()
+    report = run_bulk(action, items(), workers=2, on_progress=on_progress)
+    assert report.processed == 100
+    assert progress[-1] == 100
+
+def test_run_bulk_failing_items_keep_report() -> None:
+    def items() -> Iterator[str]:
+        yield from ['a', 'b', 'c']
+        raise StorageInteractionError("Can't get list of files.")
+
+    def action(item: str) -> None:
+        time.sleep(0.05)
+        if item == 'b':
+            raise StorageInteractionError(f"Can't process {item}")
+
+    with pytest.raises(BulkAbortedError, match="Can't get list of files.") as error:
+        run_bulk(action, items(), workers=2)
+    # the actions in flight when the items failed are waited for
+    assert sorted(error.value.report.succeeded) == ['a', 'c']
+    assert list(error.value.report.failed) == ['b']
+
+def test_run_bulk_empty_items() -> None:
+    assert run_bulk(lambda _: None, [], workers=3) == BulkReport()
+
+def test_run_bulk_paced_by_rate() -> None:
+    started: List[float] = []
+    started_lock = threading.Lock()
+
+    def action(_: str) -> None:
+        with started_lock:
+            started.append(time.monotonic())
+
+    report = run_bulk(action, [str(i) for i in range(11)], workers=4, rate=100)
+    assert report.processed == 11
+    assert max(started) - min(started) >= 0.1 - 0.01
+
+def test_pacer_spaces_starts(monkeypatch: MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    pacer = Pacer(10)
+    assert [pacer.reserve() for _ in range(3)] == pytest.approx([0, 0.1, 0.2])
+    # a slot missed while idle is not made up for with a burst
+    now[0] += 5
+    assert [pacer.reserve() for _ in range(2)] == pytest.approx([0, 0.1])
+
+def test_prefetch_reads_ahead_up_to_size() -> None:
+    consumed: List[int] = []
+
+    def items() -> Iterator[int]:
+        for i in range(20):
+            consumed.append(i)
+            yield i
+
+    ahead = prefetch(items(), 3)
+    assert next(ahead) == 0
+    time.sleep(0.1)
+    # the queue is full, the one taken by the caller and the one waiting for room aside
+    assert len(consumed) <= 1 + 3 + 1
+    assert list(ahead) == list(range(1, 20))
+
+def test_prefetch_raises_error_after_items_before_it() -> None:
+    def items() -> Iterator[int]:
+        yield 1
+        yield 2
+        raise StorageInteractionError("Can't get list of files.")
+
+    ahead = prefetch(items(), 5)
+    assert [next(ahead), next(ahead)] == [1, 2]
+    with pytest.raises(StorageInteractionError):
+        next(ahead)
+
+def test_prefetch_stops_reading_when_closed() -> None:
+    consumed: List[int] = []
+
+    def items() -> Iterator[int]:
+        for i in range(1000):
+            consumed.append(i)
+            yield i
+
+    ahead = prefetch(items(), 2)
+    assert next(ahead) == 0
+    ahead.close()
+    stopped_at = len(consumed)
+    time.sleep(0.1)
+    assert len(consumed) == stopped_at < 10
+
+def test_map_bulk_ordered_dedupes_and_reports_errors() -> None:
+    def action(item: str) -> str:
+        if item == 'bad':
+            raise StorageInteractionError(f"Can't process {item}")
+        # the later items complete first
+        time.sleep(0.01 * (5 - int(item)))
+        return f'value {item}'
+
+    results = list(map_bulk(action, ['1', '2', 'bad', '1', '3', '2'], workers=3, ordered=True))
+    assert results == [
+        BulkResult('1', value='value 1'),
+        BulkResult('2', value='value 2'),
+        BulkResult('bad', error="Can't process bad"),
+        BulkResult('3', value='value 3'),
+    ]
+
+def test_map_bulk_unordered_yields_as_completed() -> None:
+    def action(item: str) -> str:
+        time.sleep(0.05 * (5 - int(item)))
+        return item
+
+    results = list(map_bulk(action, ['1', '2', '3', '4'], workers=4))
+    assert [r.item for r in results] == ['4', '3', '2', '1']
+
+def test_map_bulk_reorder_buffer_bounded() -> None:
+    consumed: List[int] = []
+    release = threading.Event()
+
+    def items() -> Iterator[str]:
+        for i in range(50):
+            consumed.append(i)
+            yield str(i)
+
+    def action(item: str) -> str:
+        # the head of the line blocks, everything behind it completes
+        if item == '0':
+            release.wait()
+        return item
+
+    results = map_bulk(action, items(), workers=2, ordered=True)
+    threading.Timer(0.1, release.set).start()
+    assert next(results).item == '0'
+    assert len(consumed) <= 2 * 2 + 1
+    assert [r.item for r in results] == [str(i) for i in range(1, 50)]
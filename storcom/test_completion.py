@@ -0,0 +1,80 @@
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import completion
+from storcom.completion import complete, forget, remember, remember_pages
+from storcom.context import Context
+
+# a lookup serves a single Tab press, the rest of the budget goes to starting the cli
+_LOOKUP_BUDGET = 0.05
+_CONTEXT = Context('env', 'fcc', 'srv', 'usr')
+
+@pytest.fixture(autouse=True)
+def fixture_home(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setenv('STORCOM_HOME', str(tmp_path))
+
+def test_complete_by_id_and_name_prefix() -> None:
+    remember(_CONTEXT, {'a1': 'report.wav', 'a2': 'notes.txt', 'b1': 'recording.wav'})
+    assert complete(_CONTEXT, 'a') == [('a1', None), ('a2', None)]
+    assert complete(_CONTEXT, 're') == [('b1', 'recording.wav'), ('a1', 'report.wav')]
+    assert not complete(_CONTEXT, 'x')
+    assert sorted(file_id for file_id, _ in complete(_CONTEXT, '')) == ['a1', 'a2', 'b1']
+
+def test_complete_unknown_context() -> None:
+    assert not complete(Context('env', 'cx', 'srv', 'container'), '')
+
+def test_contexts_are_kept_apart() -> None:
+    other = Context('env', 'fcc', 'srv', 'other/user')
+    remember(_CONTEXT, {'a1': 'one'})
+    remember(other, {'a2': 'two'})
+    assert complete(_CONTEXT, 'a') == [('a1', None)]
+    assert complete(other, 'a') == [('a2', None)]
+
+def test_latest_files_make_room(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(completion, '_MAX_FILES', 3)
+    remember(_CONTEXT, {'old1': '', 'old2': ''})
+    remember(_CONTEXT, {'new1': '', 'new2': ''})
+    ids = [file_id for file_id, _ in complete(_CONTEXT, '')]
+    assert len(ids) == 3
+    assert {'new1', 'new2'} < set(ids)
+
+def test_forget_deleted_files() -> None:
+    remember(_CONTEXT, {'a1': 'one', 'a2': 'two'})
+    forget(_CONTEXT, ['a1', 'missing'])
+    assert complete(_CONTEXT, '') == [('a2', None)]
+    assert not complete(_CONTEXT, 'one')
+
+def test_values_which_break_lines_are_not_completed() -> None:
+    remember(_CONTEXT, {'a1': 'tab\tname', 'a2': 'new\nline', 'a3': 'file\x1cseparator'})
+    assert complete(_CONTEXT, 'a') == [('a1', None), ('a2', None), ('a3', None)]
+    assert complete(_CONTEXT, 'file') == [('a3', 'file\x1cseparator')]
+    assert not complete(_CONTEXT, 'tab')
+
+def test_remember_pages_passes_pages_through() -> None:
+    pages: List[List[Dict[str, str]]] = [[{'id': '1', 'name': 'one'}], [{'id': '2'}]]
+    listed = remember_pages(_CONTEXT, pages, lambda f: (f['id'], f.get('name', '')))
+    assert not complete(_CONTEXT, '')
+    assert list(listed) == pages
+    assert complete(_CONTEXT, '') == [('1', None), ('2', None)]
+    assert complete(_CONTEXT, 'o') == [('1', 'one')]
+
+def test_remember_pages_of_stopped_listing() -> None:
+    pages = iter([[('1', 'one')], [('2', 'two')]])
+    listed = remember_pages(_CONTEXT, pages, lambda row: row)
+    next(listed)
+    listed.close()
+    assert complete(_CONTEXT, '') == [('1', None)]
+
+def test_lookup_within_budget() -> None:
+    remember(_CONTEXT, {f'{i:08x}-4d3c-9a7b': f'recording-{i}.wav' for i in range(10000)})
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        completions = complete(_CONTEXT, '0000123')
+        timings.append(time.perf_counter() - started)
+    assert len(completions) == 16
+    assert min(timings) < _LOOKUP_BUDGET
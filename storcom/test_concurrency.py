@@ -0,0 +1,136 @@
+import threading
+import time
+from typing import List
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom.concurrency import AdaptiveConcurrency
+
+@pytest.fixture(name='clock')
+def fixture_clock(monkeypatch: MonkeyPatch) -> List[float]:
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+def test_fixed_concurrency_never_changes() -> None:
+    concurrency = AdaptiveConcurrency(5, 5, 5)
+    _saturate(concurrency)
+    concurrency.record_response(429, 0.01)
+    assert not concurrency.adaptive
+    assert concurrency.limit == 5
+
+def test_start_clamped_to_range() -> None:
+    assert AdaptiveConcurrency(5, 8, 16).limit == 8
+    assert AdaptiveConcurrency(50, 8, 16).limit == 16
+
+def test_grows_by_one_per_round_while_saturated() -> None:
+    concurrency = AdaptiveConcurrency(4, 1, 10)
+    for expected in (5, 6, 7):
+        _saturate(concurrency)
+        assert concurrency.limit == expected
+
+def test_does_not_grow_while_unused() -> None:
+    concurrency = AdaptiveConcurrency(4, 1, 10)
+    for _ in range(20):
+        concurrency.record_response(200, 0.01)
+    assert concurrency.limit == 4
+
+def test_grows_up_to_ceiling() -> None:
+    concurrency = AdaptiveConcurrency(4, 1, 6)
+    for _ in range(10):
+        _saturate(concurrency)
+    assert concurrency.limit == 6
+
+def test_halves_on_overload_once_per_round_trip(clock: List[float]) -> None:
+    concurrency = AdaptiveConcurrency(16, 1, 32)
+    concurrency.record_response(429, 0.1)
+    concurrency.record_error(0.1)
+    assert concurrency.limit == 8
+    clock[0] += 0.2
+    concurrency.record_response(503, 0.1)
+    assert concurrency.limit == 4
+    for _ in range(5):
+        clock[0] += 0.2
+        concurrency.record_error(0.1)
+    assert concurrency.limit == 1
+
+def test_shrinks_when_latency_climbs_above_baseline(clock: List[float]) -> None:
+    concurrency = AdaptiveConcurrency(10, 1, 32)
+    concurrency.record_response(200, 0.01)
+    concurrency.record_response(200, 0.015)
+    assert concurrency.limit == 10
+    concurrency.record_response(200, 0.05)
+    assert concurrency.limit == 9
+    # the server stays slow, the baseline catches up and the limit stops shrinking
+    _record_rounds(concurrency, clock, 0.05, rounds=10)
+    settled = concurrency.limit
+    _record_rounds(concurrency, clock, 0.05, rounds=10)
+    assert 1 < concurrency.limit == settled
+
+def test_acquire_waits_for_room() -> None:
+    concurrency = AdaptiveConcurrency(2, 1, 4)
+    concurrency.acquire()
+    assert concurrency.try_acquire()
+    assert not concurrency.try_acquire()
+    acquired = threading.Event()
+
+    def acquire() -> None:
+        concurrency.acquire()
+        acquired.set()
+
+    waiting = threading.Thread(target=acquire)
+    waiting.start()
+    assert not acquired.wait(0.05)
+    concurrency.release()
+    assert acquired.wait(1)
+    waiting.join()
+
+def test_limited_action_stays_within_limit() -> None:
+    concurrency = AdaptiveConcurrency(3, 3, 3)
+    in_flight: List[int] = [0, 0]
+    lock = threading.Lock()
+
+    def action(_: str) -> None:
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+
+    threads = [threading.Thread(target=concurrency.limited(action), args=(str(i),))
+               for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert in_flight[1] == 3
+
+def test_report_of_changes(clock: List[float]) -> None:
+    concurrency = AdaptiveConcurrency(4, 1, 10)
+    clock[0] += 1.5
+    _saturate(concurrency)
+    clock[0] += 1
+    concurrency.record_error(0.1)
+    assert concurrency.changes == [(0.0, 4), (1.5, 5), (2.5, 2)]
+    assert str(concurrency) == 'concurrency 4 to 2 (min 2, max 5): 4 at 0.0s, 5 at 1.5s, 2 at 2.5s'
+
+def _saturate(concurrency: AdaptiveConcurrency) -> None:
+    # a round of successful requests using the whole limit
+    limit = concurrency.limit
+    for _ in range(limit):
+        concurrency.acquire()
+    for _ in range(limit):
+        concurrency.record_response(200, 0.01)
+    for _ in range(limit):
+        concurrency.release()
+
+def _record_rounds(concurrency: AdaptiveConcurrency,
+                   clock: List[float],
+                   latency: float,
+                   rounds: int) -> None:
+    for _ in range(rounds):
+        clock[0] += 1
+        for _ in range(10):
+            concurrency.record_response(200, latency)
@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import Mock
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import config
+from storcom.config import ConfigError, read_shortcuts, read_storage_config
+from storcom.context import Context
+
+_CONFIG = '''
+[dev.fcc]
+storage_url = "http://fcc"
+workers = 7
+[dev.fcc.tokens]
+srv = "token"
+
+[shortcuts]
+f = "dev:fcc:srv:usr"
+'''
+
+@pytest.fixture(name='config_directory')
+def fixture_config_directory(monkeypatch: MonkeyPatch, tmp_path: Path) -> Iterator[Path]:
+    monkeypatch.setenv('STORCOM_HOME', str(tmp_path))
+    monkeypatch.setattr(config, '_parsed_config', None)
+    (tmp_path / 'config.toml').write_text(_CONFIG, encoding='utf-8')
+    yield tmp_path
+
+@pytest.fixture(name='parse')
+def fixture_parse(monkeypatch: MonkeyPatch) -> Mock:
+    mock = Mock(wraps=config._parse_config) # pylint: disable=protected-access
+    monkeypatch.setattr(config, '_parse_config', mock)
+    return mock
+
+def test_storage_config_read(config_directory: Path) -> None:
+    storage_config = read_storage_config(Context('dev', 'fcc', 'srv', 'usr'))
+    assert (storage_config.storage_url, storage_config.token, storage_config.workers) == \
+        ('http://fcc', 'token', 7)
+    assert read_shortcuts() == {'f': 'dev:fcc:srv:usr'}
+    assert (config_directory / '.config.pickle').is_file()
+
+def test_missing_token(config_directory: Path) -> None:
+    assert config_directory
+    with pytest.raises(ConfigError) as e:
+        read_storage_config(Context('dev', 'fcc', 'other', 'usr'))
+    assert e.value.message == 'Storage token missing for service: other'
+
+def test_config_parsed_once_per_process(config_directory: Path, parse: Mock) -> None:
+    assert config_directory
+    read_shortcuts()
+    read_storage_config(Context('dev', 'fcc', 'srv', 'usr'))
+    read_shortcuts()
+    parse.assert_called_once()
+
+def test_snapshot_reused_by_next_process(monkeypatch: MonkeyPatch,
+                                         config_directory: Path,
+                                         parse: Mock) -> None:
+    assert config_directory
+    read_shortcuts()
+    monkeypatch.setattr(config, '_parsed_config', None)
+    assert read_shortcuts() == {'f': 'dev:fcc:srv:usr'}
+    parse.assert_called_once()
+
+def test_snapshot_invalidated_by_config_change(monkeypatch: MonkeyPatch,
+                                               config_directory: Path) -> None:
+    read_shortcuts()
+    config_file = config_directory / 'config.toml'
+    config_file.write_text(_CONFIG.replace('f = ', 'g = '), encoding='utf-8')
+    stat = config_file.stat()
+    # the same size and mtime granularity could hide the change on some file systems
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert read_shortcuts() == {'g': 'dev:fcc:srv:usr'}
+    monkeypatch.setattr(config, '_parsed_config', None)
+    assert read_shortcuts() == {'g': 'dev:fcc:srv:usr'}
+
+def test_broken_snapshot_rebuilt(monkeypatch: MonkeyPatch,
+                                 config_directory: Path,
+                                 parse: Mock) -> None:
+    read_shortcuts()
+    (config_directory / '.config.pickle').write_bytes(b'garbage')
+    monkeypatch.setattr(config, '_parsed_config', None)
+    assert read_shortcuts() == {'f': 'dev:fcc:srv:usr'}
+    assert parse.call_count == 2
+
+def test_broken_config(config_directory: Path) -> None:
+    (config_directory / 'config.toml').write_text('[shortcuts', encoding='utf-8')
+    with pytest.raises(ConfigError) as e:
+        read_shortcuts()
+    assert e.value.message.startswith('Unable to decode')
+
+def test_worker_range(config_directory: Path) -> None:
+    context = Context('dev', 'fcc', 'srv', 'usr')
+    assert read_storage_config(context).worker_range == (7, 7)
+    config_file = config_directory / 'config.toml'
+    config_file.write_text(_CONFIG.replace('workers = 7', 'workers = 7\nmax_workers = 32'),
+                           encoding='utf-8')
+    assert read_storage_config(context).worker_range == (1, 32)
+    config_file.write_text(_CONFIG.replace('workers = 7', 'min_workers = 2\nmax_workers = 32\n'),
+                           encoding='utf-8')
+    assert read_storage_config(context).worker_range == (2, 32)
+
+@pytest.mark.parametrize('settings, message', [
+    ('min_workers = 2', 'min_workers needs max_workers'),
+    ('min_workers = 8\nmax_workers = 4', 'min_workers 8 is above max_workers 4'),
+    ('max_workers = 0', 'max_workers should be a positive integer, got: 0'),
+])
+def test_invalid_worker_range(config_directory: Path, settings: str, message: str) -> None:
+    (config_directory / 'config.toml').write_text(_CONFIG.replace('workers = 7', settings),
+                                                  encoding='utf-8')
+    with pytest.raises(ConfigError) as e:
+        read_storage_config(Context('dev', 'fcc', 'srv', 'usr'))
+    assert e.value.message == message
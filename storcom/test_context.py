@@ -3,6 +3,7 @@ from contextlib import contextmanager, ExitStack
 from unittest.mock import Mock
 from typing import Iterator, List, ContextManager, Generator, Dict, Optional
 
+import click
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
 
@@ -129,6 +130,37 @@ def test_parse_context_with_env_from_missing_shortcut(arrange: Mock) -> None:
     # missing shortcut is treated as stringified context and gets parsed
     _assert_context(actual, 'missing shortcut', '', '', '')
 
+@pytest.mark.parametrize('value, expected', [
+    ('dev_a', False),
+    ('env:stor:srv:usr', False),
+    ('dev_a,dev_b', True),
+    ('dev_*', True),
+    (None, False),
+])
+def test_is_many(value: Optional[str], expected: bool) -> None:
+    assert context.is_many(value) == expected
+
+def test_parse_many_expands_globs_and_drops_duplicates(arrange: Mock) -> None:
+    arrange.shortcuts({
+        'qa_b': 'qa:cx:srv:b',
+        'qa_a': 'qa:fcc:srv:a',
+        'dev_a': 'dev:fcc:srv:a',
+    })
+    actual = context.parse_many('qa_*, dev_a,qa_a,env:stor:srv:usr')
+    assert [label for label, _ in actual] == ['qa_a', 'qa_b', 'dev_a', 'env:stor:srv:usr']
+    _assert_context(actual[1][1], 'qa', 'cx', 'srv', 'b')
+    _assert_context(actual[3][1], 'env', 'stor', 'srv', 'usr')
+
+def test_parse_many_fails_when_glob_matches_nothing(arrange: Mock) -> None:
+    arrange.shortcuts({'dev_a': 'dev:fcc:srv:a'})
+    with pytest.raises(click.ClickException, match='No shortcuts match qa_*'):
+        context.parse_many('dev_a,qa_*')
+
+def test_complete_with_shortcuts_completes_last_item(arrange: Mock) -> None:
+    arrange.shortcuts({'dev_a': '', 'dev_b': '', 'qa_a': ''})
+    actual = context.complete_with_shortcuts(Mock(), '', 'qa_a,dev_')
+    assert actual == ['qa_a,dev_a', 'qa_a,dev_b']
+
 @contextmanager
 def _many(*context_managers: ContextManager[None]) -> Generator[List[None], None, None]:
     with ExitStack() as stack:
@@ -0,0 +1,152 @@
+import array
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import config
+from storcom.daemon import forward, get_socket_path
+from storcom.fake_server import FakeStorageServer, serve, make_files
+
+_WAIT = 10
+
+@pytest.fixture(name='home')
+def fixture_home(monkeypatch: MonkeyPatch, tmp_path: Path) -> Path:
+    monkeypatch.setenv('STORCOM_HOME', str(tmp_path))
+    monkeypatch.delenv('_STORCOM_COMPLETE', raising=False)
+    return tmp_path
+
+@pytest.fixture(name='server')
+def fixture_server(home: Path) -> Iterator[FakeStorageServer]:
+    with serve(make_files(30)) as server:
+        (home / 'config.toml').write_text(f'[dev.fcc]\nstorage_url = "{server.url}"\n'
+                                          '[dev.fcc.tokens]\nsrv = "token"\n', encoding='utf-8')
+        (home / '.context').write_text('environment=dev\nstorage=fcc\nservice=srv\nuser=usr\n',
+                                       encoding='utf-8')
+        yield server
+
+@pytest.fixture(name='daemon')
+def fixture_daemon(server: FakeStorageServer, # pylint: disable=unused-argument
+                   home: Path) -> Iterator[subprocess.Popen[str]]:
+    # the config of the server is written before the daemon starts
+    with subprocess.Popen([sys.executable, '-m', 'storcom', 'serve'],
+                          stderr=subprocess.PIPE, text=True) as daemon:
+        try:
+            assert 'Serving' in (daemon.stderr.readline() if daemon.stderr else '')
+            yield daemon
+        finally:
+            daemon.send_signal(signal.SIGTERM)
+            daemon.wait(_WAIT)
+    assert not (home / 'storcom.sock').exists()
+
+def test_socket_path_in_config_directory(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.delenv('STORCOM_HOME', raising=False)
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    assert get_socket_path() == str(config.get_or_create_config_directory() / 'storcom.sock')
+
+@pytest.mark.usefixtures('home')
+@pytest.mark.parametrize('argv', [['file', 'ls'], ['serve'], []])
+def test_forward_without_daemon(argv: List[str]) -> None:
+    assert forward(argv) is None
+
+def test_forward_busy_daemon(home: Path) -> None:
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(home / 'storcom.sock'))
+    listener.listen()
+
+    def reply_busy() -> None:
+        connection, _ = listener.accept()
+        with connection:
+            connection.recvmsg(1024, socket.CMSG_SPACE(64))
+            connection.sendall(json.dumps({'busy': True}).encode() + b'\n')
+
+    thread = threading.Thread(target=reply_busy)
+    thread.start()
+    try:
+        assert forward(['file', 'ls']) is None
+    finally:
+        thread.join(_WAIT)
+        listener.close()
+
+def test_commands_run_in_daemon_over_warm_connections(server: FakeStorageServer,
+                                                      daemon: subprocess.Popen[str],
+                                                      tmp_path: Path) -> None:
+    outputs = [_run_client(['file', 'ls'], cwd=tmp_path) for _ in range(2)]
+    assert [len(o.stdout.splitlines()) for o in outputs] == [30, 30]
+    # both commands went over the connection the daemon keeps open
+    assert server.connections == 1
+    failed = _run_client(['file', 'show', 'missing'])
+    assert failed.returncode == 1
+    assert "Can't get fcc file details for missing" in failed.stderr
+    deleted = _run_client(['file', 'rm', '-'], stdin='00000001\n')
+    assert json.loads(deleted.stdout)['succeeded'] == ['00000001']
+    assert daemon.poll() is None
+
+@pytest.mark.usefixtures('daemon')
+def test_interrupted_client_interrupts_command(server: FakeStorageServer) -> None:
+    server.latency = 1
+    with subprocess.Popen([sys.executable, '-m', 'storcom', 'file', 'ls'],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as client:
+        time.sleep(0.5)
+        client.send_signal(signal.SIGINT)
+        _, stderr = client.communicate(timeout=_WAIT)
+    assert client.returncode == 1
+    assert 'Aborted!' in stderr
+    server.latency = 0
+    assert _run_client(['file', 'show', '00000002']).returncode == 0
+
+@pytest.mark.parametrize('header', [
+    b'[]\n',
+    b'{"argv": ["file", "ls"], "environ": {}}\n',
+    b'{"argv": "file ls", "cwd": "/", "environ": {}}\n',
+    b'{"argv": [], "cwd": "/", "environ": {}, "encoding": "unknown"}\n',
+])
+def test_daemon_serves_after_bad_request(daemon: subprocess.Popen[str], header: bytes) -> None:
+    reply, _ = _send_request(header)
+    assert reply == b''
+    assert daemon.poll() is None
+    assert _run_client(['file', 'show', '00000002']).returncode == 0
+
+def test_command_in_missing_directory_fails(daemon: subprocess.Popen[str],
+                                            tmp_path: Path) -> None:
+    header = json.dumps({'argv': ['file', 'ls'],
+                         'cwd': str(tmp_path / 'missing'),
+                         'environ': {}}).encode() + b'\n'
+    reply, stderr = _send_request(header)
+    assert json.loads(reply) == {'exit': 1}
+    assert "can't run the command in" in stderr
+    assert daemon.poll() is None
+    assert _run_client(['file', 'show', '00000002']).returncode == 0
+
+def _send_request(header: bytes) -> Tuple[bytes, str]:
+    '''
+    The reply of the daemon to a header sent with the streams of a client, and what the
+    command wrote to its stderr.
+    '''
+    stderr_read, stderr_write = os.pipe()
+    with open(stderr_read, 'rb') as stderr, \
+            socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(_WAIT)
+        connection.connect(get_socket_path())
+        fds = array.array('i', [sys.stdin.fileno(), sys.stdout.fileno(), stderr_write])
+        connection.sendmsg([header], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+        os.close(stderr_write)
+        reply = connection.makefile('rb').readline()
+        connection.close()
+        return reply, stderr.read().decode()
+
+def _run_client(argv: List[str],
+                stdin: str = '',
+                cwd: Path = Path.cwd()) -> subprocess.CompletedProcess[str]:
+    return subprocess.run([sys.executable, '-m', 'storcom', *argv],
+                          input=stdin, capture_output=True, text=True, cwd=cwd,
+                          check=False, timeout=_WAIT)
@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from storcom.diff import diff_files_pages
+
+_LEFT = [[{'id': '1', 'name': 'a'}, {'id': '2', 'name': 'b'}], [{'id': '3', 'name': 'c'}, {}]]
+_RIGHT = [[{'file_sid': '2', 'name': 'a'}], [{'file_sid': '4', 'name': 'c'}]]
+
+@pytest.mark.parametrize('left_key, right_key, intersection, expected', [
+    ('id', 'file_sid', False, [{'id': '1', 'name': 'a'}, {'id': '3', 'name': 'c'}, {}]),
+    ('id', 'file_sid', True, [{'id': '2', 'name': 'b'}]),
+    ('name', 'name', False, [{'id': '2', 'name': 'b'}, {}]),
+    ('name', 'name', True, [{'id': '1', 'name': 'a'}, {'id': '3', 'name': 'c'}]),
+])
+def test_diff(left_key: str, right_key: str, intersection: bool, expected: List[Any]) -> None:
+    pages = diff_files_pages(_LEFT, _RIGHT, left_key, right_key, intersection)
+    assert [f for page in pages for f in page] == expected
+
+def test_left_pages_streamed_once_right_listing_is_over() -> None:
+    right_listed = threading.Event()
+    left_consumed: List[int] = []
+
+    def right_pages() -> Iterator[List[Dict[str, Any]]]:
+        yield [{'id': '1'}]
+        right_listed.set()
+
+    def left_pages() -> Iterator[List[Dict[str, Any]]]:
+        yield [{'id': '1'}, {'id': '2'}]
+        assert right_listed.wait(timeout=5)
+        # let the keys future complete after its listing is over
+        time.sleep(0.1)
+        left_consumed.append(1)
+        yield [{'id': '3'}]
+        left_consumed.append(2)
+        yield [{'id': '4'}]
+
+    pages = diff_files_pages(left_pages(), right_pages(), 'id', 'id')
+    assert next(pages) == [{'id': '2'}]
+    assert next(pages) == [{'id': '3'}]
+    assert left_consumed == [1]
+    assert list(pages) == [[{'id': '4'}]]
+
+def test_left_pages_held_back_up_to_bound() -> None:
+    bound_reached = threading.Event()
+    left_read: List[int] = []
+
+    def right_pages() -> Iterator[List[Dict[str, Any]]]:
+        assert bound_reached.wait(timeout=5)
+        time.sleep(0.1)
+        # the left listing is not read past the bound while the right one goes on
+        assert len(left_read) == 3
+        yield [{'id': '0'}]
+
+    def left_pages() -> Iterator[List[Dict[str, Any]]]:
+        for i in range(10):
+            left_read.append(i)
+            if i == 2:
+                bound_reached.set()
+            yield [{'id': str(i)}]
+
+    pages = diff_files_pages(left_pages(), right_pages(), 'id', 'id', max_held_back=3)
+    assert [f['id'] for page in pages for f in page] == [str(i) for i in range(1, 10)]
+
+def test_right_listing_error_raised() -> None:
+    def right_pages() -> Iterator[List[Dict[str, Any]]]:
+        raise ValueError('listing failed')
+        yield [] # pylint: disable=unreachable
+
+    with pytest.raises(ValueError):
+        list(diff_files_pages(_LEFT, right_pages(), 'id', 'id'))
@@ -0,0 +1,101 @@
+import io
+import json
+from typing import Any, Iterator, List
+
+import pytest
+
+from storcom.aliases import Row
+from storcom.errors import ExportError
+from storcom.export import Column, export_rows, get_fields, infer_columns
+
+_FIELDS = ['id', 'file_bytes', 'date_changed', 'duration', 'public', 'tags', 'name']
+_ROWS: List[Any] = [
+    ('1', '1024', '2023-01-18T00:00:01.000Z', 1.5, True, ['a'], 'one.wav'),
+    ('2', 0, '2023-01-18T00:00:02Z', 2, False, [], ''),
+    ('3', '', '', None, None, None, '2023'),
+]
+
+def test_columns_inferred_from_values() -> None:
+    assert infer_columns(_FIELDS, _ROWS) == [Column('id', 'string'),
+                                             Column('file_bytes', 'integer'),
+                                             Column('date_changed', 'date', zoned=True),
+                                             Column('duration', 'number'),
+                                             Column('public', 'boolean'),
+                                             Column('tags', 'json'),
+                                             Column('name', 'string')]
+    rows: List[Any] = [('2023-01-18 10:00', 1), ('2023-01-18', 2)]
+    assert infer_columns(['date', 'count'], rows) == [Column('date', 'string'),
+                                                      Column('count', 'integer')]
+    assert infer_columns(['date'], [('2023-01-18T10:00:00',)]) == [Column('date', 'date')]
+
+def test_fields_in_order_of_appearance() -> None:
+    files = [{'id': '1', 'name': 'a'}, {'id': '2', 'size': '3'}]
+    assert get_fields(files) == ['id', 'name', 'size']
+
+def test_ndjson_holds_typed_values() -> None:
+    output = io.BytesIO()
+    assert export_rows([_ROWS[:2], _ROWS[2:]], _FIELDS, output, 'ndjson', 2) == 3
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert lines[0] == {'id': '1', 'file_bytes': 1024, 'date_changed': '2023-01-18T00:00:01.000Z',
+                        'duration': 1.5, 'public': True, 'tags': ['a'], 'name': 'one.wav'}
+    assert lines[2]['file_bytes'] is None
+    assert lines[2]['name'] == '2023'
+
+def test_csv_has_header_and_json_cells() -> None:
+    output = io.BytesIO()
+    export_rows([_ROWS], _FIELDS, output, 'csv', 10)
+    assert output.getvalue().decode().splitlines() == [
+        'id,file_bytes,date_changed,duration,public,tags,name',
+        '1,1024,2023-01-18T00:00:01.000Z,1.5,True,"[""a""]",one.wav',
+        '2,0,2023-01-18T00:00:02Z,2.0,False,[],',
+        '3,,,,,,2023',
+    ]
+    assert not output.closed
+
+def test_empty_listing_has_header() -> None:
+    output = io.BytesIO()
+    assert export_rows([], ['id', 'name'], output, 'csv', 10) == 0
+    assert output.getvalue() == b'id,name\r\n'
+
+def test_value_against_inferred_type_fails() -> None:
+    with pytest.raises(ExportError, match='file_bytes'):
+        export_rows([[('1', '10')], [('2', 'big')]], ['id', 'file_bytes'], io.BytesIO(),
+                    'ndjson', 1)
+
+@pytest.mark.parametrize('value', [2.7, True, '2.5'])
+def test_integer_column_rejects_fractions_and_booleans(value: Any) -> None:
+    with pytest.raises(ExportError, match='file_bytes holds'):
+        Column('file_bytes', 'integer').convert(value)
+    assert Column('file_bytes', 'integer').convert(2.0) == 2
+
+def test_rows_written_before_listing_ends() -> None:
+    output = io.BytesIO()
+
+    def pages() -> Iterator[List[Row]]:
+        yield [('1',), ('2',)]
+        # the first batch is out before the next page is listed
+        assert output.getvalue().count(b'\n') == 2
+        yield [('3',)]
+
+    assert export_rows(pages(), ['id'], output, 'ndjson', 2) == 3
+
+@pytest.mark.parametrize('output_format', ['arrow', 'parquet'])
+def test_columnar_files_are_typed_and_batched(output_format: str) -> None:
+    pyarrow = pytest.importorskip('pyarrow')
+    output = io.BytesIO()
+    export_rows([_ROWS[:2], _ROWS[2:]], _FIELDS, output, output_format, 2)
+    output.seek(0)
+    if output_format == 'parquet':
+        parquet_file = pytest.importorskip('pyarrow.parquet').ParquetFile(output)
+        assert parquet_file.metadata.num_row_groups == 2
+        table = parquet_file.read()
+    else:
+        reader = pyarrow.ipc.open_file(output)
+        assert reader.num_record_batches == 2
+        table = reader.read_all()
+    assert str(table.schema.field('file_bytes').type) == 'int64'
+    assert str(table.schema.field('date_changed').type) == 'timestamp[us, tz=UTC]'
+    assert str(table.schema.field('public').type) == 'bool'
+    assert table.column('file_bytes').to_pylist() == [1024, 0, None]
+    assert table.column('tags').to_pylist() == ['["a"]', '[]', None]
+    assert table.column('date_changed').to_pylist()[1].isoformat() == '2023-01-18T00:00:02+00:00'
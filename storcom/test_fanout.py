@@ -0,0 +1,104 @@
+import threading
+from typing import Iterator, List, Tuple
+
+import pytest
+
+from storcom.aliases import FilesPage
+from storcom.errors import StorageInteractionError
+from storcom.fanout import Router, merge_pages, run_contexts
+
+def test_merge_pages_tags_pages_with_their_source() -> None:
+    actual = list(merge_pages({'a': lambda: [[{'id': '1'}], [{'id': '2'}]],
+                               'b': lambda: [[{'id': '3'}]]},
+                              parallel=2))
+    assert sorted((p.context, p.page[0]['id']) for p in actual) == [('a', '1'), ('a', '2'),
+                                                                      ('b', '3')]
+    # the pages of a source keep their order
+    assert [p.page[0]['id'] for p in actual if p.context == 'a'] == ['1', '2']
+    assert all(p.error is None for p in actual)
+
+def test_merge_pages_streams_before_sources_finish() -> None:
+    release = threading.Event()
+
+    def list_slow() -> Iterator[FilesPage]:
+        yield [{'id': 'slow'}]
+        assert release.wait(5)
+
+    pages = merge_pages({'slow': list_slow, 'fast': lambda: [[{'id': 'fast'}]]}, parallel=2)
+    first = [next(pages), next(pages)]
+    assert sorted(p.context for p in first) == ['fast', 'slow']
+    release.set()
+    assert not list(pages)
+
+def test_merge_pages_reports_failed_source_and_continues() -> None:
+    def list_failing() -> Iterator[FilesPage]:
+        yield [{'id': '1'}]
+        raise StorageInteractionError('boom')
+
+    actual = list(merge_pages({'a': list_failing, 'b': lambda: [[{'id': '2'}]]}, parallel=1))
+    errors = [p for p in actual if p.error is not None]
+    assert [(p.context, p.error) for p in errors] == [('a', 'boom')]
+    assert sorted(p.page[0]['id'] for p in actual if p.page) == ['1', '2']
+
+def test_merge_pages_stops_sources_when_closed() -> None:
+    listed: List[int] = []
+
+    def list_endless() -> Iterator[FilesPage]:
+        i = 0
+        while True:
+            listed.append(i)
+            yield [{'id': str(i)}]
+            i += 1
+
+    pages = merge_pages({'a': list_endless}, parallel=1)
+    next(pages)
+    pages.close()
+    # the source is blocked on the full queue and gives up once the consumer is gone
+    assert len(listed) < 5
+
+def test_run_contexts_returns_result_per_context() -> None:
+    actual = dict(run_contexts(str.upper, ['a', 'b', 'c'], parallel=2))
+    assert actual == {'a': 'A', 'b': 'B', 'c': 'C'}
+
+def test_run_contexts_raises_action_error() -> None:
+    def fail(context: str) -> str:
+        raise ValueError(context)
+
+    with pytest.raises(ValueError):
+        list(run_contexts(fail, ['a'], parallel=1))
+
+def test_router_streams_items_to_their_targets() -> None:
+    read: List[str] = []
+
+    def items() -> Iterator[str]:
+        for i in range(100):
+            read.append(str(i))
+            yield str(i)
+
+    def route(item: str) -> List[Tuple[str, str]]:
+        # the odd items go to both targets
+        return [('even', item)] if int(item) % 2 == 0 else [('even', item), ('odd', item)]
+
+    with Router(items(), route, ['even', 'odd'], size=2) as router:
+        odd = router.consume('odd')
+        assert next(odd) == '1'
+        # the reader waits for the even target, which is not consumed yet
+        assert len(read) < 10
+        actual = dict(run_contexts(lambda target: list(router.consume(target)) if target == 'even'
+                                   else ['1', *odd],
+                                   ['even', 'odd'],
+                                   parallel=2))
+    assert actual == {'even': [str(i) for i in range(100)],
+                      'odd': [str(i) for i in range(1, 100, 2)]}
+
+def test_router_raises_error_in_every_consumer() -> None:
+    def items() -> Iterator[str]:
+        yield 'a'
+        raise StorageInteractionError('boom')
+
+    with Router(items(), lambda item: [('x', item), ('y', item)], ['x', 'y'], size=10) as router:
+        for target in ['x', 'y']:
+            consumed = router.consume(target)
+            assert next(consumed) == 'a'
+            with pytest.raises(StorageInteractionError):
+                next(consumed)
@@ -0,0 +1,147 @@
+import itertools
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from click.testing import CliRunner, Result
+
+from storcom import file, storage as storcom_storage
+from storcom.aliases import FilesPage
+from storcom.errors import StorageInteractionError
+from storcom.fake_server import FakeStorageServer, serve, make_files
+from storcom.storage import BaseStorage
+from storcom.storage_commander import create_cli
+
+@pytest.fixture(name='server')
+def fixture_server(monkeypatch: MonkeyPatch, tmp_path: Path) -> Iterator[FakeStorageServer]:
+    monkeypatch.setenv('STORCOM_HOME', str(tmp_path))
+    # small pages, the deletes move the files which are not listed yet behind the offset
+    monkeypatch.setattr(storcom_storage, '_PAGE_SIZE', 10)
+    with serve(make_files(200)) as server:
+        (tmp_path / 'config.toml').write_text(f'[dev.cx]\nstorage_url = "{server.url}"\n'
+                                              '[dev.cx.tokens]\nsrv = "token"\n',
+                                              encoding='utf-8')
+        (tmp_path / '.context').write_text('environment=dev\nstorage=cx\nservice=srv\n'
+                                           'user=container\n', encoding='utf-8')
+        yield server
+
+def test_purge_deletes_matched_files_in_passes(server: FakeStorageServer) -> None:
+    result = _run(['file', '-w', '1', 'purge', '--type', 'audio'])
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.stdout)
+    assert report['deleted'] == 100
+    assert report['failed'] == {}
+    # the first pass missed files, the last one deleted none
+    assert report['passes'] > 2
+    assert sorted(server.files) == [f'{i:08d}' for i in range(0, 200, 2)]
+
+def test_purge_reports_failed_files(server: FakeStorageServer) -> None:
+    server.locked.update(['00000001', '00000151'])
+    result = _run(['file', 'purge', '--type', 'audio'])
+    assert result.exit_code == 1
+    report = json.loads(result.stdout)
+    assert report['deleted'] == 98
+    assert sorted(report['failed']) == ['00000001', '00000151']
+    assert 'Failed to delete 2 of 100 files.' in result.stderr
+    assert sorted(server.files.keys() - {f'{i:08d}' for i in range(0, 200, 2)}) == \
+        ['00000001', '00000151']
+
+def test_purge_dry_run_counts_files(server: FakeStorageServer) -> None:
+    result = _run(['file', 'purge', '--type', 'audio', '--dry_run'])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout) == {'matched': 100}
+    assert len(server.files) == 200
+
+def test_purge_at_rate_evicts_indexed_files(server: FakeStorageServer,
+                                            monkeypatch: MonkeyPatch) -> None:
+    rates: List[Optional[float]] = []
+    delete_files = BaseStorage.delete_files
+
+    def record_rate(storage: BaseStorage, *args: Any, **kwargs: Any) -> Any:
+        rates.append(kwargs.get('rate'))
+        return delete_files(storage, *args, **kwargs)
+
+    monkeypatch.setattr(BaseStorage, 'delete_files', record_rate)
+    assert len(_list_files(['file', 'ls', '--cached'])) == 200
+    result = _run(['file', 'purge', '--where', 'file_bytes lt 5120', '--rate', '1000'])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout)['deleted'] == 5
+    assert set(rates) == {1000}
+    requests = server.requests
+    # the index answers without the deleted files and without asking the storage
+    assert len(_list_files(['file', 'ls', '--cached'])) == 195
+    assert server.requests == requests
+
+def test_diff_rm_deletes_all_files_missing_from_other(server: FakeStorageServer) -> None:
+    other = [{**f, 'id': f'o{f["id"]}', 'file_sid': f'o{f["file_sid"]}'}
+             for f in make_files(50, container_sid='other')]
+    server.files.update({f['id']: f for f in other})
+    result = _run(['file', '-w', '1', 'diff', 'dev:cx:srv:other', '--key', 'name', '--rm'])
+    assert result.exit_code == 0, result.output
+    assert len(json.loads(result.stdout)['succeeded']) == 150
+    assert sorted(server.files) == [f'{i:08d}' for i in range(50)] + [f['id'] for f in other]
+
+def test_purge_reports_files_deleted_before_listing_failed(server: FakeStorageServer,
+                                                           monkeypatch: MonkeyPatch) -> None:
+    list_files_pages = file._list_files_pages # pylint: disable=protected-access
+
+    def fail_after_two_pages(*args: Any) -> Iterator[FilesPage]:
+        yield from itertools.islice(list_files_pages(*args), 2)
+        raise StorageInteractionError("Can't get list of files.")
+
+    assert len(_list_files(['file', 'ls', '--cached'])) == 200
+    with monkeypatch.context() as patched:
+        patched.setattr(file, '_list_files_pages', fail_after_two_pages)
+        result = _run(['file', 'purge', '--type', 'audio'])
+    assert result.exit_code == 1
+    assert json.loads(result.stdout) == {'deleted': 20, 'failed': {}, 'passes': 1}
+    assert "Can't get list of files." in result.stderr
+    assert len(server.files) == 180
+    # the deleted files are evicted from the index
+    assert len(_list_files(['file', 'ls', '--cached'])) == 180
+
+def test_fan_out_rm_sends_ids_to_their_contexts(server: FakeStorageServer) -> None:
+    other = [{**f, 'id': f'o{f["id"]}', 'file_sid': f'o{f["file_sid"]}'}
+             for f in make_files(10, container_sid='other')]
+    server.files.update({f['id']: f for f in other})
+    lines = [json.dumps({'context': 'dev:cx:srv:container', 'file_sid': f'{i:08d}'})
+             for i in range(150)]
+    lines += [json.dumps({'context': 'dev:cx:srv:other', 'file_sid': f['file_sid']})
+              for f in other[:5]]
+    # a plain id goes to both contexts, the fake server deletes it for the first one
+    lines.append('00000199')
+    result = _run(['file', '-c', 'dev:cx:srv:container,dev:cx:srv:other', 'rm', '-'],
+                  '\n'.join(lines))
+    assert result.exit_code == 1
+    reports = [json.loads(line) for line in result.stdout.splitlines()]
+    succeeded = {report['context']: set(report['succeeded']) for report in reports}
+    assert succeeded['dev:cx:srv:container'] - {'00000199'} == \
+        {f'{i:08d}' for i in range(150)}
+    assert succeeded['dev:cx:srv:other'] - {'00000199'} == {f['id'] for f in other[:5]}
+    assert len([ids for ids in succeeded.values() if '00000199' in ids]) == 1
+    assert [i for report in reports for i in report['failed']] == ['00000199']
+    assert sorted(server.files) == [f'{i:08d}' for i in range(150, 199)] + \
+        [f['id'] for f in other[5:]]
+
+def test_fan_out_rm_rejects_file_of_other_context(server: FakeStorageServer) -> None:
+    result = _run(['file', '-c', 'dev:cx:srv:container,dev:cx:srv:other', 'rm', '-'],
+                  '{"context": "dev:cx:srv:missing", "file_sid": "00000001"}')
+    assert result.exit_code == 1
+    assert 'Not a file of the contexts' in result.stderr
+    assert len(server.files) == 200
+
+@pytest.mark.usefixtures('server')
+def test_purge_rejects_async_engine() -> None:
+    result = _run(['file', '--engine', 'async', 'purge'])
+    assert result.exit_code == 1
+    assert 'purge runs on the thread engine only.' in result.stderr
+
+def _run(argv: List[str], stdin: Optional[str] = None) -> Result:
+    return CliRunner().invoke(create_cli(), argv, input=stdin)
+
+def _list_files(argv: List[str]) -> List[Dict[str, Any]]:
+    result = _run(argv)
+    assert result.exit_code == 0, result.output
+    return [json.loads(line) for line in result.stdout.splitlines()]
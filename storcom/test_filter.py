@@ -1,4 +1,4 @@
-from typing import Optional, Tuple, Callable, Iterator, ContextManager
+from typing import Optional, Tuple, Callable, Iterator, ContextManager, List, Dict
 from dataclasses import dataclass
 from contextlib import contextmanager
 from unittest.mock import Mock
@@ -8,6 +8,7 @@ import pytest
 from pytest import MonkeyPatch
 
 from storcom import filter as flt
+from storcom.aliases import QueryArg
 from storcom.errors import FilterError
 
 @dataclass
@@ -122,3 +123,41 @@ def test_to_fcc_qs_params_timedeltas_defaults(arrange: Arrangements,
                                               shifted: str) -> None:
     with arrange.utcnow(datetime(2023, 2, 2, 2, 2, 2, 222222)):
         assert flt.to_fcc_qs_params({'date_changed': (delta,)}) == {'date_changed': shifted}
+
+def test_supported_cx_filters() -> None:
+    assert [f.field for f in flt.get_cx_filters()] == \
+        ['name', 'type', 'mime_type', 'date_modified', 'file_bytes']
+
+@pytest.mark.parametrize('storage, expected', [
+    ('fcc', ['batch', 'date_changed', 'date_created']),
+    ('cx', ['name', 'type', 'mime_type', 'date_modified', 'file_bytes']),
+    ('s3', []),
+])
+def test_get_storage_filters(storage: str, expected: List[str]) -> None:
+    assert [f.field for f in flt.get_storage_filters(storage)] == expected
+
+@pytest.mark.parametrize('query_args, expected', [
+    ({}, []),
+    ({'name': 'test.wav'}, ['name eq "test.wav"']),
+    ({'name': 'ne "a b"'}, ['name ne "a b"']),
+    ({'mime_type': 'LIKE audio/%'}, ['mime_type like "audio/%"']),
+    ({'type': 'eq say "hi"'}, ['type eq "say \\"hi"']),
+    ({'file_bytes': ('gte 10', 'lt 20')}, ['file_bytes ge 10', 'file_bytes lt 20']),
+    ({'file_bytes': ('gt 10', 'gt 20')}, ['file_bytes gt 20']),
+    ({'date_modified': ('le 2023-01-01',)}, ['date_modified le "2023-01-01 00:00:00"']),
+])
+def test_to_cx_filter(query_args: Dict[str, QueryArg], expected: List[str]) -> None:
+    assert flt.to_cx_filter(query_args) == expected
+
+@pytest.mark.parametrize('query_args', [
+    {'file_bytes': ('like 1%',)},
+    {'file_bytes': ('gt many',)},
+    {'name': 'between a'},
+])
+def test_to_cx_filter_invalid_raises_filter_error(query_args: Dict[str, QueryArg]) -> None:
+    with pytest.raises(FilterError):
+        flt.to_cx_filter(query_args)
+
+def test_to_conditions_accepts_operator_aliases() -> None:
+    conditions = flt.to_conditions(flt.get_fcc_filters(), {'date_changed': ('ge 2023-01-01',)})
+    assert [(c.field, c.operator) for c in conditions] == [('date_changed', 'gte')]
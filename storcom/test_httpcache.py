@@ -0,0 +1,95 @@
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import pytest
+import requests
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom.context import Context
+from storcom.httpcache import HttpCache, get_cache_url
+
+_CONTEXT = Context('env', 'fcc', 'srv', 'usr')
+_URL = 'http://fcc/files/1'
+
+@pytest.fixture(name='cache')
+def fixture_cache(tmp_path: Path) -> HttpCache:
+    return HttpCache(tmp_path)
+
+def test_kept_response_is_loaded_with_its_validators(cache: HttpCache) -> None:
+    cache.keep(_CONTEXT, _URL, _make_response(b'{"id": "1"}', {'ETag': '"v1"'}))
+    cached = cache.load(_CONTEXT, _URL)
+    assert cached is not None
+    assert cached.body == b'{"id": "1"}'
+    assert cached.validators == {'If-None-Match': '"v1"'}
+
+def test_response_without_validators_is_not_kept(cache: HttpCache) -> None:
+    cache.keep(_CONTEXT, _URL, _make_response(b'{}'))
+    cache.keep(_CONTEXT, _URL, _make_response(b'{}', {'ETag': '"v1"', 'Cache-Control': 'no-store'}))
+    assert cache.load(_CONTEXT, _URL) is None
+
+def test_revalidated_response_is_filled_from_cache(cache: HttpCache) -> None:
+    cache.keep(_CONTEXT, _URL, _make_response(b'{"id": "1"}',
+                                              {'Last-Modified': 'Wed, 18 Jan 2023 00:00:00 GMT',
+                                               'Content-Type': 'application/json'}))
+    cached = cache.load(_CONTEXT, _URL)
+    assert cached is not None
+    assert cached.validators == {'If-Modified-Since': 'Wed, 18 Jan 2023 00:00:00 GMT'}
+    response = _make_response(b'', status=304)
+    cached.fill(response)
+    assert response.status_code == 200
+    assert response.json() == {'id': '1'}
+    assert response.headers['Content-Type'] == 'application/json'
+
+def test_contexts_are_kept_apart(cache: HttpCache) -> None:
+    other = Context('env', 'fcc', 'srv', 'other/user')
+    cache.keep(_CONTEXT, _URL, _make_response(b'mine', {'ETag': '"v1"'}))
+    assert cache.load(other, _URL) is None
+    cache.clear(_CONTEXT)
+    assert cache.load(_CONTEXT, _URL) is None
+
+def test_least_recently_used_responses_are_evicted(tmp_path: Path) -> None:
+    cache = HttpCache(tmp_path, max_bytes=2500)
+    for i in range(3):
+        cache.keep(_CONTEXT, f'{_URL}{i}', _make_response(b'x' * 500, {'ETag': f'"v{i}"'}))
+        # the modification times of the entries order them
+        for path in tmp_path.glob('*/*'):
+            os.utime(path, (path.stat().st_atime, path.stat().st_mtime - 1))
+    cached = cache.load(_CONTEXT, f'{_URL}0')
+    assert cached is not None
+    cached.fill(_make_response(b'', status=304))
+    cache.keep(_CONTEXT, f'{_URL}3', _make_response(b'x' * 1000, {'ETag': '"v3"'}))
+    assert [cache.load(_CONTEXT, f'{_URL}{i}') is not None for i in range(4)] == \
+        [True, False, False, True]
+
+def test_store_does_not_count_the_entries(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    HttpCache(tmp_path).keep(_CONTEXT, f'{_URL}0', _make_response(b'x' * 500, {'ETag': '"v0"'}))
+
+    def list_entries(_: HttpCache) -> None:
+        raise AssertionError('the entries are counted')
+
+    monkeypatch.setattr(HttpCache, '_list_entries', list_entries)
+    # a cache of another process goes on from the total the first one kept
+    cache = HttpCache(tmp_path, max_bytes=2500)
+    cache.keep(_CONTEXT, f'{_URL}1', _make_response(b'x' * 500, {'ETag': '"v1"'}))
+    cache.keep(_CONTEXT, f'{_URL}1', _make_response(b'x' * 600, {'ETag': '"v2"'}))
+    cache.clear(Context('env', 'fcc', 'srv', 'other'))
+    monkeypatch.undo()
+    assert int((tmp_path / '.total').read_text(encoding='utf-8')) == \
+        sum(path.stat().st_size for path in tmp_path.glob('*/*'))
+    cache.clear(_CONTEXT)
+    assert (tmp_path / '.total').read_text(encoding='utf-8') == '0'
+
+def test_cache_url_holds_the_query_string() -> None:
+    assert get_cache_url('http://fcc/files', {'limit': '10', 'offset': '20'}) == \
+        'http://fcc/files?limit=10&offset=20'
+    assert get_cache_url(_URL, None) == _URL
+
+def _make_response(body: bytes,
+                   headers: Optional[Dict[str, str]] = None,
+                   status: int = 200) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = body # pylint: disable=protected-access
+    return response
@@ -0,0 +1,111 @@
+from pathlib import Path
+from typing import Iterator, List, Any, Dict
+from unittest.mock import Mock
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import index as idx
+from storcom.config import StorageConfig
+from storcom.context import Context
+from storcom.index import FileIndex
+from storcom.storage import FccStorage, CxStorage, BaseStorage
+
+_FILES = [
+    {'id': '3', 'batch': 'b', 'date_changed': '2023-03-01T00:00:00.000Z'},
+    {'id': '2', 'batch': 'a', 'date_changed': '2023-02-01T00:00:00.000Z'},
+    {'id': '1', 'batch': 'a', 'date_changed': '2023-01-01T00:00:00.000Z'},
+]
+
+@pytest.fixture(name='index')
+def fixture_index(tmp_path: Path) -> Iterator[FileIndex]:
+    file_index = FileIndex(tmp_path / 'index.sqlite')
+    yield file_index
+    file_index.close()
+
+@pytest.fixture(name='fcc')
+def fixture_fcc() -> FccStorage:
+    return FccStorage(StorageConfig('http://fcc', 'token'), Context('env', 'fcc', 'srv', 'usr'))
+
+def test_first_listing_does_full_refresh(index: FileIndex, fcc: FccStorage) -> None:
+    list_files_pages = _arrange_pages(fcc, [_FILES[:2], _FILES[2:]])
+    assert _ids(index.list_files_pages(fcc, {}, max_age=300)) == ['3', '2', '1']
+    list_files_pages.assert_called_once_with({})
+
+def test_fresh_index_is_not_refreshed(index: FileIndex, fcc: FccStorage) -> None:
+    list_files_pages = _arrange_pages(fcc, [_FILES], [])
+    list(index.list_files_pages(fcc, {}, max_age=300))
+    assert _ids(index.list_files_pages(fcc, {}, max_age=60)) == ['3', '2', '1']
+    list_files_pages.assert_called_once()
+
+def test_stale_index_is_refreshed_from_watermark(index: FileIndex, fcc: FccStorage) -> None:
+    changed = {**_FILES[2], 'batch': 'c', 'date_changed': '2023-04-01T00:00:00.000Z'}
+    list_files_pages = _arrange_pages(fcc, [_FILES], [[changed]])
+    list(index.list_files_pages(fcc, {}, max_age=300))
+    assert _ids(index.list_files_pages(fcc, {}, max_age=0)) == ['1', '3', '2']
+    assert list_files_pages.call_args.args[0] == {
+        'date_changed': ('gte 2023-03-01T00:00:00.000Z',),
+    }
+
+def test_listing_without_change_dates_is_fully_refreshed(index: FileIndex) -> None:
+    cx = CxStorage(StorageConfig('http://cx', 'token'), Context('env', 'cx', 'srv', 'container'))
+    list_files_pages = _arrange_pages(cx,
+                                      [[{'file_sid': '1'}, {'file_sid': '2'}]],
+                                      [[{'file_sid': '2'}]])
+    list(index.list_files_pages(cx, {}, max_age=300))
+    assert _ids(index.list_files_pages(cx, {}, max_age=0), 'file_sid') == ['2']
+    assert list_files_pages.call_args.args[0] == {}
+
+@pytest.mark.parametrize('filters, expected', [
+    ({'batch': 'a'}, ['2', '1']),
+    ({'batch': 'gt a'}, ['3']),
+    ({'date_changed': ('gt 2023-01-15',)}, ['3', '2']),
+    ({'date_changed': ('gte 2023-01-01', 'lt 2023-02-01T00:00:00Z')}, ['1']),
+    ({'batch': 'a', 'date_changed': ('lte 2023-01-01',)}, ['1']),
+])
+def test_filters_answered_from_index(index: FileIndex,
+                                     fcc: FccStorage,
+                                     filters: Dict[str, Any],
+                                     expected: List[str]) -> None:
+    _arrange_pages(fcc, [_FILES])
+    assert _ids(index.list_files_pages(fcc, filters, max_age=300)) == expected
+
+def test_cx_filters_answered_from_index(index: FileIndex) -> None:
+    cx = CxStorage(StorageConfig('http://cx', 'token'), Context('env', 'cx', 'srv', 'container'))
+    _arrange_pages(cx, [[{'file_sid': '1', 'name': 'a.wav', 'file_bytes': 5},
+                         {'file_sid': '2', 'name': 'b.mp3', 'file_bytes': 50}]])
+    assert _ids(index.list_files_pages(cx, {'name': 'ne b.mp3'}, max_age=300), 'file_sid') == ['1']
+    assert _ids(index.list_files_pages(cx, {'name': 'like %.mp3', 'file_bytes': ('ge 50',)},
+                                       max_age=300), 'file_sid') == ['2']
+
+def test_numeric_filter_values_compared_as_numbers(index: FileIndex, fcc: FccStorage) -> None:
+    _arrange_pages(fcc, [[{'id': '1', 'batch': 9}, {'id': '2', 'batch': 10}]])
+    assert _ids(index.list_files_pages(fcc, {'batch': 'gt 9'}, max_age=300)) == ['2']
+
+def test_contexts_do_not_mix(index: FileIndex, fcc: FccStorage) -> None:
+    other = FccStorage(StorageConfig('http://fcc', 'token'), Context('env', 'fcc', 'srv', 'usr2'))
+    _arrange_pages(fcc, [_FILES])
+    _arrange_pages(other, [[{'id': '9'}]])
+    assert _ids(index.list_files_pages(other, {}, max_age=300)) == ['9']
+    assert _ids(index.list_files_pages(fcc, {}, max_age=300)) == ['3', '2', '1']
+
+def test_evict_and_invalidate(index: FileIndex, fcc: FccStorage) -> None:
+    list_files_pages = _arrange_pages(fcc, [_FILES], [_FILES[:1]])
+    list(index.list_files_pages(fcc, {}, max_age=300))
+    index.evict(fcc.context, ['2'])
+    assert _ids(index.list_files_pages(fcc, {}, max_age=300)) == ['3', '1']
+    index.invalidate(fcc.context)
+    assert _ids(index.list_files_pages(fcc, {}, max_age=300)) == ['3']
+    assert list_files_pages.call_args.args[0] == {}
+
+def test_open_existing_index_missing(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(idx, 'get_or_create_config_directory', Mock(return_value=tmp_path))
+    assert idx.open_existing_index() is None
+
+def _arrange_pages(storage: BaseStorage, *listings: List[List[Dict[str, Any]]]) -> Mock:
+    mock = Mock(side_effect=[iter(pages) for pages in listings])
+    storage.list_files_pages = mock # type: ignore
+    return mock
+
+def _ids(pages: Iterator[List[Dict[str, Any]]], id_field: str = 'id') -> List[str]:
+    return [f[id_field] for page in pages for f in page]
@@ -0,0 +1,88 @@
+import json
+from typing import Any, Iterator, List
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import jsonstream
+from storcom.jsonstream import ItemsStream
+
+_DOCUMENT = {
+    'pagination': {'next': '/files?page=2', 'sizes': [1, 2]},
+    'items': [
+        {'id': '1', 'name': 'a}b],{"c"', 'bytes': 10},
+        {'id': '2', 'name': 'ü€😀\\"', 'meta': {'tags': ['x', {'y': None}]}},
+        {'id': '3', 'flags': [True, False], 'ratio': -1.5e3},
+    ],
+    'has_more': True,
+}
+
+@pytest.fixture(name='backend', params=['default', 'json'])
+def fixture_backend(monkeypatch: MonkeyPatch, request: pytest.FixtureRequest) -> None:
+    if request.param == 'json':
+        monkeypatch.setattr(jsonstream, 'loads', json.loads)
+
+@pytest.mark.usefixtures('backend')
+@pytest.mark.parametrize('size', [1, 2, 7, 64 * 1024])
+def test_items_and_document_split_between_chunks(size: int) -> None:
+    body = json.dumps(_DOCUMENT, indent=2, ensure_ascii=False).encode()
+    items = ItemsStream(_split(body, size))
+    assert list(items) == _DOCUMENT['items']
+    assert items.count == 3
+    assert items.document == {'pagination': _DOCUMENT['pagination'], 'has_more': True}
+
+@pytest.mark.usefixtures('backend')
+@pytest.mark.parametrize('body, expected', [
+    (b'{"items": []}', []),
+    (b' { "items" : [ 1 , "two" , null ] } ', [1, 'two', None]),
+    (b'{"items": [[1], {}]}', [[1], {}]),
+])
+def test_items_of_any_type(body: bytes, expected: List[Any]) -> None:
+    assert list(ItemsStream(_split(body, 3))) == expected
+
+@pytest.mark.usefixtures('backend')
+@pytest.mark.parametrize('body', [
+    b'',
+    b'[]',
+    b'{}',
+    b'{"other": []}',
+    b'{"items": {}}',
+    b'{"items": [{"id": 1}',
+    b'{"items": [{"id": 1}] "next": null}',
+    b'{"items": [{"id": }]}',
+    b'{1: 2, "items": []}',
+])
+def test_invalid_json_raises_error(body: bytes) -> None:
+    with pytest.raises(ValueError):
+        list(ItemsStream(_split(body, 4)))
+
+def test_items_decoded_as_chunks_arrive() -> None:
+    read: List[bytes] = []
+
+    def read_chunks() -> Iterator[bytes]:
+        for chunk in _split(json.dumps(_DOCUMENT).encode(), 16):
+            read.append(chunk)
+            yield chunk
+
+    items = iter(ItemsStream(read_chunks()))
+    assert next(items)['id'] == '1'
+    assert len(read) < len(json.dumps(_DOCUMENT)) / 16 - 1
+
+@pytest.mark.parametrize('size', [1024, 64 * 1024])
+def test_nested_items_decoded_once(monkeypatch: MonkeyPatch, size: int) -> None:
+    decoded: List[int] = []
+
+    def loads(data: bytes) -> Any:
+        decoded.append(len(data))
+        return json.loads(data)
+
+    monkeypatch.setattr(jsonstream, 'loads', loads)
+    items = [{'id': str(i), 'name': '}}}}', 'meta': {'tags': [{'a': {'b': i}}]}}
+             for i in range(5000)]
+    body = json.dumps({'items': items}).encode()
+    assert list(ItemsStream(_split(body, size))) == items
+    # the time is linear when no byte is decoded twice
+    assert sum(decoded) < len(body) + 2 * len(decoded)
+
+def _split(body: bytes, size: int) -> List[bytes]:
+    return [body[i:i + size] for i in range(0, len(body), size)]
@@ -0,0 +1,62 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom.metrics import RequestMetrics, to_prometheus, write_metrics
+
+def _arrange_metrics(monkeypatch: MonkeyPatch) -> RequestMetrics:
+    now = time.monotonic()
+    # every request finishes at the same moment, the latencies are exact
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    metrics = RequestMetrics()
+    for i in range(1, 101):
+        metrics.record('GET', 'file', '200', now - i / 1000, bytes_received=10)
+    metrics.record('DELETE', 'file', '503', now - 1, bytes_sent=5)
+    metrics.record('DELETE', 'file', 'error', now - 2, retry=True)
+    return metrics
+
+def test_summary_percentiles_and_counts(monkeypatch: MonkeyPatch) -> None:
+    summary = _arrange_metrics(monkeypatch).summary()
+    assert summary['requests'] == 102
+    assert summary['retries'] == 1
+    assert summary['statuses'] == {'200': 100, '503': 1, 'error': 1}
+    assert summary['latency'] == {'p50': pytest.approx(0.051),
+                                  'p95': pytest.approx(0.097),
+                                  'p99': pytest.approx(1)}
+    assert summary['bytes_received'] == 1000
+    assert summary['bytes_sent'] == 5
+    assert summary['elapsed'] == pytest.approx(2)
+    assert summary['requests_per_second'] > 0
+
+def test_summary_empty() -> None:
+    summary = RequestMetrics().summary()
+    assert summary['requests'] == 0
+    assert summary['latency'] == {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    assert summary['requests_per_second'] == 0.0
+
+def test_prometheus_textfile(monkeypatch: MonkeyPatch) -> None:
+    text = to_prometheus([(_arrange_metrics(monkeypatch), {'storage': 'cx', 'user': 'a"b'}),
+                          (RequestMetrics(), {'storage': 'fcc', 'user': 'c'})])
+    lines = text.splitlines()
+    assert 'storcom_requests_total{storage="cx",user="a\\"b",method="GET",endpoint="file",' \
+           'status="200"} 100' in lines
+    assert 'storcom_request_retries_total{storage="cx",user="a\\"b"} 1' in lines
+    assert 'storcom_request_duration_seconds_count{storage="cx",user="a\\"b"} 102' in lines
+    assert any(line.startswith('storcom_request_duration_seconds{storage="cx",user="a\\"b",'
+                               'quantile="0.99"} ') for line in lines)
+    assert 'storcom_request_retries_total{storage="fcc",user="c"} 0' in lines
+    assert len([line for line in lines if line.startswith('# TYPE')]) == 6
+    assert all(line.startswith('#') or line.startswith('storcom_') for line in lines)
+
+def test_write_metrics_json(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    path = tmp_path / 'metrics.json'
+    write_metrics([(_arrange_metrics(monkeypatch), {'context': 'a'}),
+                   (RequestMetrics(), {'context': 'b'})],
+                  path,
+                  'json')
+    written = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(w['context'], w['requests']) for w in written] == [('a', 102), ('b', 0)]
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,107 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from storcom import predicate as prd
+from storcom.aliases import QueryArg
+from storcom.errors import FilterError
+from storcom.filter import get_cx_filters, get_fcc_filters
+
+_FILES: List[Dict[str, Any]] = [
+    {'id': '1', 'name': 'Call.WAV', 'file_bytes': 500, 'type': 'file', 'meta': {'lang': 'en'}},
+    {'id': '2', 'name': 'call.mp3', 'file_bytes': '5000', 'type': 'audio', 'public': True},
+    {'id': '3', 'name': 'notes.txt', 'file_bytes': 20, 'type': 'folder', 'meta': None},
+    {'id': '4', 'name': 'it\'s "x".txt'},
+]
+
+@pytest.mark.parametrize('expression, expected', [
+    ('id eq 1', ['1']),
+    ('file_bytes gt 100', ['1', '2']),
+    ('file_bytes ge 20 and file_bytes lte 500', ['1', '3']),
+    ('file_bytes lt 1000', ['1', '3']),
+    ('file_bytes eq "500"', ['1']),
+    ('type ne file', ['2', '3', '4']),
+    ('name glob *.txt', ['3', '4']),
+    ('name like CALL.%', ['1', '2']),
+    ('name like c_ll.mp3', ['2']),
+    ('name match "^[A-Z]"', ['1']),
+    ('name match "\\.(wav|mp3)$"', ['2']),
+    ('meta.lang eq en', ['1']),
+    ('public eq true', ['2']),
+    ('name eq \'it\\\'s "x".txt\'', ['4']),
+    ('not type eq file', ['2', '3', '4']),
+    ('type eq file or type eq folder', ['1', '3']),
+    ('NOT (type eq file OR type eq folder) and file_bytes gt 0', ['2']),
+    ('name glob \'*.txt\' and (file_bytes ge 10 or not type eq folder)', ['3', '4']),
+])
+def test_predicate(expression: str, expected: List[str]) -> None:
+    predicate = prd.compile_predicate(prd.parse(expression))
+    assert [f['id'] for page in prd.filter_pages([_FILES[:2], _FILES[2:]], predicate)
+            for f in page] == expected
+
+@pytest.mark.parametrize('expression', [
+    '',
+    'name',
+    'name eq',
+    'name between a',
+    '(name eq a',
+    'name eq a)',
+    'name eq a or',
+    '"name" eq a',
+    'name eq "a',
+    'name match (',
+    'name match "["',
+])
+def test_invalid_expression_raises_filter_error(expression: str) -> None:
+    with pytest.raises(FilterError):
+        prd.compile_predicate(prd.parse(expression))
+
+@pytest.mark.parametrize('expression, query_args, expected_query_args, expected_local', [
+    ('batch eq a', {}, {'batch': 'eq a'}, None),
+    ('batch eq a and batch eq b', {}, {'batch': 'eq a'}, ['batch eq b']),
+    ('batch eq a', {'batch': 'b'}, {'batch': 'b'}, ['batch eq a']),
+    ('batch eq a', {'batch': None}, {'batch': 'eq a'}, None),
+    ('date_changed ge 2023-01-01 and date_changed lt 2023-02-01', {},
+     {'date_changed': ('gte 2023-01-01', 'lt 2023-02-01')}, None),
+    ('date_changed gt 2023-01-01 and date_changed gt 2023-02-01', {},
+     {'date_changed': ('gt 2023-01-01',)}, ['date_changed gt 2023-02-01']),
+    ('batch like a% and name glob *.wav', {}, {}, ['batch like a%', 'name glob *.wav']),
+    ('batch eq a or batch eq b', {}, {}, ['batch eq a or batch eq b']),
+])
+def test_plan_pushes_down_supported_conjuncts(expression: str,
+                                              query_args: Dict[str, QueryArg],
+                                              expected_query_args: Dict[str, QueryArg],
+                                              expected_local: List[str]) -> None:
+    pushed, predicate = prd.plan(expression, get_fcc_filters(), query_args)
+    assert pushed == expected_query_args
+    if expected_local is None:
+        assert predicate is None
+    else:
+        assert predicate is not None
+        expected = prd.compile_predicate(prd.parse(' and '.join(expected_local)))
+        files = [*_FILES, {'batch': 'a'}, {'batch': 'b', 'name': 'b.wav'}]
+        assert list(prd.filter_pages([files], predicate)) == \
+            list(prd.filter_pages([files], expected))
+
+def test_plan_local_remainder_evaluated() -> None:
+    pushed, predicate = prd.plan('name like %.mp3 and name glob call.*', get_cx_filters(), {})
+    assert pushed == {'name': 'like %.mp3'}
+    assert predicate is not None
+    assert [f['id'] for page in prd.filter_pages([_FILES], predicate) for f in page] == ['2']
+
+@pytest.mark.parametrize('expression, expected', [
+    ('date_modified gt now-100000d or name eq x', ['1', '2']),
+    ('date_modified lt now-100000d or name eq x', []),
+    ('date_modified ge 2023-01-19 or name eq x', ['2']),
+    ('date_modified lt "2023-01-17T23:30:00-01:00" or name eq x', ['1']),
+    ('file_bytes gt now-1d or name eq x', []),
+])
+def test_local_datetimes_compared_as_pushed_down(expression: str, expected: List[str]) -> None:
+    files: List[Dict[str, Any]] = [
+        {'id': '1', 'date_modified': '2023-01-18T00:00:00.000Z', 'file_bytes': 1},
+        {'id': '2', 'date_modified': '2023-01-19T00:00:00Z', 'file_bytes': 2},
+    ]
+    pushed, predicate = prd.plan(expression, get_cx_filters(), {})
+    assert not pushed
+    assert predicate is not None
+    assert [f['id'] for page in prd.filter_pages([files], predicate) for f in page] == expected
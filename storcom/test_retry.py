@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Optional
+from unittest.mock import Mock
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import retry
+from storcom.retry import RetryPolicy, RetryStats, Retrier, CircuitBreaker
+from storcom.errors import CircuitOpenError
+
+@pytest.fixture(name='no_breakers', autouse=True)
+def fixture_no_breakers(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(retry, '_circuit_breakers', {})
+
+@pytest.mark.parametrize('attempt, ceiling', [(0, 0.5), (1, 1.0), (3, 4.0), (10, 30.0)])
+def test_get_delay_full_jitter_within_exponential_ceiling(attempt: int, ceiling: float) -> None:
+    policy = RetryPolicy(backoff=0.5, max_backoff=30)
+    delays = [policy.get_delay(attempt) for _ in range(100)]
+    assert all(0 <= delay <= ceiling for delay in delays)
+    assert len(set(delays)) > 1
+
+@pytest.mark.parametrize('retry_after, expected', [('3', 3), ('0', 0), ('120', 30)])
+def test_get_delay_honors_retry_after_seconds(retry_after: str, expected: float) -> None:
+    assert RetryPolicy(max_backoff=30).get_delay(0, retry_after) == expected
+
+def test_get_delay_honors_retry_after_http_date() -> None:
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    assert 8 <= RetryPolicy().get_delay(0, retry_at) <= 10
+
+@pytest.mark.parametrize('retry_after', [None, '', 'soon'])
+def test_get_delay_ignores_invalid_retry_after(retry_after: Optional[str]) -> None:
+    assert 0 <= RetryPolicy(backoff=1).get_delay(0, retry_after) <= 1
+
+@pytest.mark.parametrize('method', ['GET', 'DELETE', 'put'])
+@pytest.mark.parametrize('status', [429, 502, 503, 504])
+def test_retrier_retries_idempotent_methods(method: str, status: int) -> None:
+    stats = RetryStats()
+    retrier = Retrier(method, 'http://host/files', RetryPolicy(), stats)
+    assert retrier.on_status(status) is not None
+    assert stats.retries == 1
+    assert stats.reasons == {str(status): 1}
+
+@pytest.mark.parametrize('status', [200, 204, 400, 404, 500])
+def test_retrier_final_statuses(status: int) -> None:
+    retrier = Retrier('GET', 'http://host/files', RetryPolicy(), RetryStats())
+    assert retrier.on_status(status) is None
+
+def test_retrier_non_idempotent_method_only_retries_rejected_requests() -> None:
+    retrier = Retrier('POST', 'http://host/files', RetryPolicy(), RetryStats())
+    assert retrier.on_status(503) is None
+    assert retrier.on_error(ConnectionError()) is None
+    assert retrier.on_status(429) is not None
+
+def test_retrier_gives_up_after_max_attempts() -> None:
+    stats = RetryStats()
+    retrier = Retrier('GET', 'http://host/files', RetryPolicy(max_attempts=3), stats)
+    assert retrier.on_status(503) is not None
+    assert retrier.on_error(TimeoutError()) is not None
+    assert retrier.on_status(503) is None
+    assert stats.retries == 2
+    assert stats.reasons == {'503': 1, 'TimeoutError': 1}
+
+def test_retrier_rejected_by_open_circuit() -> None:
+    stats = RetryStats()
+    policy = RetryPolicy(max_attempts=1, breaker_threshold=2, breaker_cooldown=60)
+    for _ in range(2):
+        Retrier('GET', 'http://host/files', policy, stats).on_status(503)
+    with pytest.raises(CircuitOpenError):
+        Retrier('GET', 'http://host/files/1', policy, stats).before_attempt()
+    Retrier('GET', 'http://other/files', policy, stats).before_attempt()
+    assert stats.breaker_opened == 1
+    assert stats.breaker_rejected == 1
+
+def test_circuit_breaker_half_open_probe(monkeypatch: MonkeyPatch) -> None:
+    monotonic = Mock(return_value=100.0)
+    monkeypatch.setattr('storcom.retry.time.monotonic', monotonic)
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    assert breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check('host')
+    monotonic.return_value = 111.0
+    breaker.check('host')
+    # only a single probe is let through while it is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.check('host')
+    breaker.record_success()
+    breaker.check('host')
+
+def test_circuit_breaker_failed_probe_restarts_cooldown(monkeypatch: MonkeyPatch) -> None:
+    monotonic = Mock(return_value=100.0)
+    monkeypatch.setattr('storcom.retry.time.monotonic', monotonic)
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.record_failure()
+    monotonic.return_value = 111.0
+    breaker.check('host')
+    assert not breaker.record_failure()
+    monotonic.return_value = 115.0
+    with pytest.raises(CircuitOpenError):
+        breaker.check('host')
+
+def test_attempt_ended_by_other_error_releases_probe(monkeypatch: MonkeyPatch) -> None:
+    monotonic = Mock(return_value=100.0)
+    monkeypatch.setattr('storcom.retry.time.monotonic', monotonic)
+    stats = RetryStats()
+    policy = RetryPolicy(max_attempts=1, breaker_threshold=1, breaker_cooldown=10)
+    Retrier('GET', 'http://host/files', policy, stats).on_status(503)
+    monotonic.return_value = 111.0
+    probe = Retrier('GET', 'http://host/files', policy, stats)
+    probe.before_attempt()
+    # e.g. too many redirects, neither a response nor a connection error
+    probe.after_attempt()
+    with pytest.raises(CircuitOpenError):
+        Retrier('GET', 'http://host/files', policy, stats).before_attempt()
+    monotonic.return_value = 122.0
+    Retrier('GET', 'http://host/files', policy, stats).before_attempt()
+
+def test_attempt_with_response_is_not_counted_again() -> None:
+    policy = RetryPolicy(max_attempts=1, breaker_threshold=1)
+    retrier = Retrier('GET', 'http://host/files', policy, RetryStats())
+    retrier.before_attempt()
+    retrier.on_status(200)
+    retrier.after_attempt()
+    Retrier('GET', 'http://host/files', policy, RetryStats()).before_attempt()
+
+def test_circuit_breaker_disabled_with_zero_threshold() -> None:
+    breaker = CircuitBreaker(threshold=0, cooldown=10)
+    for _ in range(100):
+        assert not breaker.record_failure()
+    breaker.check('host')
+
+def test_retry_stats_summary() -> None:
+    stats = RetryStats()
+    stats.record_retry('503')
+    stats.record_retry('429')
+    stats.record_retry('503')
+    assert str(stats) == 'retried 3 requests (503: 2, 429: 1)'
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom.completion import remember
+from storcom.context import Context
+
+# heavy modules which none of the commands need for building the cli or completing it
+_LAZY_MODULES = ['requests', 'curlify', 'tabulate', 'dateutil', 'aiohttp', 'sqlite3', 'pyarrow']
+_COMPLETION_BUDGET = float(os.environ.get('STORCOM_COMPLETION_BUDGET', '0.5'))
+
+@pytest.fixture(name='env')
+def fixture_env(tmp_path: Path) -> Dict[str, str]:
+    (tmp_path / 'config.toml').write_text('[shortcuts]\n', encoding='utf-8')
+    return {**os.environ, 'STORCOM_HOME': str(tmp_path)}
+
+def test_cli_import_does_not_load_heavy_modules(env: Dict[str, str]) -> None:
+    code = ('import sys, storcom.storage_commander; '
+            f'print(*[m for m in {_LAZY_MODULES!r} if m in sys.modules])')
+    result = subprocess.run([sys.executable, '-c', code],
+                            env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == []
+
+def test_completion_within_budget(env: Dict[str, str]) -> None:
+    completion_env = {**env,
+                      '_STORCOM_COMPLETE': 'bash_complete',
+                      'COMP_WORDS': 'storcom file ',
+                      'COMP_CWORD': '2'}
+    code = 'from storcom.storage_commander import storcom; storcom(prog_name="storcom")'
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code],
+                                env=completion_env, capture_output=True, text=True, check=False)
+        timings.append(time.perf_counter() - started)
+    assert 'plain,ls' in result.stdout
+    assert min(timings) < _COMPLETION_BUDGET
+
+def test_file_id_completion_within_budget(env: Dict[str, str], monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv('STORCOM_HOME', env['STORCOM_HOME'])
+    context = Context('dev', 'fcc', 'srv', 'usr')
+    Path(env['STORCOM_HOME'], '.context').write_text(
+        ''.join(f'{key}={value}\n' for key, value in context.__dict__.items()), encoding='utf-8')
+    remember(context, {f'{i:08d}': f'file-{i}.bin' for i in range(10000)})
+    completion_env = {**env,
+                      '_STORCOM_COMPLETE': 'bash_complete',
+                      'COMP_WORDS': 'storcom file show 0000999',
+                      'COMP_CWORD': '3'}
+    # the lookup never touches the storage, the modules it would need stay unloaded
+    code = ('import atexit, sys; '
+            f'atexit.register(lambda: print(*[m for m in {_LAZY_MODULES!r} if m in sys.modules], '
+            'file=sys.stderr)); '
+            'from storcom.storage_commander import storcom; storcom(prog_name="storcom")')
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code],
+                                env=completion_env, capture_output=True, text=True, check=False)
+        timings.append(time.perf_counter() - started)
+    assert result.stdout.split() == [f'plain,0000999{i}' for i in range(10)]
+    assert result.stderr.split() == []
+    assert min(timings) < _COMPLETION_BUDGET
@@ -0,0 +1,296 @@
+import json
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from unittest.mock import Mock
+
+import pytest
+import requests
+from _pytest.monkeypatch import MonkeyPatch
+from requests.exceptions import ChunkedEncodingError
+
+from storcom.storage import BaseStorage, FccStorage, CxStorage
+from storcom.context import Context
+from storcom.config import StorageConfig
+from storcom.retry import RetryPolicy
+from storcom.errors import StorageInteractionError
+from storcom.fake_server import serve, make_files
+from storcom.httpcache import HttpCache
+
+@pytest.fixture(name='fcc')
+def fixture_fcc() -> FccStorage:
+    return FccStorage(StorageConfig('http://fcc', 'token'), Context('env', 'fcc', 'srv', 'usr'))
+
+@pytest.fixture(name='cx')
+def fixture_cx() -> CxStorage:
+    return CxStorage(StorageConfig('http://cx', 'token'), Context('env', 'cx', 'srv', 'container'))
+
+def test_list_files_single_page(monkeypatch: MonkeyPatch, fcc: FccStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, fcc, [{'items': [{'id': '1'}, {'id': '2'}]}])
+    assert list(fcc.list_files({})) == [{'id': '1'}, {'id': '2'}]
+    make_request.assert_called_once()
+
+def test_list_files_follows_top_level_next_link(monkeypatch: MonkeyPatch,
+                                                fcc: FccStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, fcc, [
+        {'items': [{'id': '1'}], 'next': '/files?page=2'},
+        {'items': [{'id': '2'}], 'next': None},
+    ])
+    assert list(fcc.list_files({})) == [{'id': '1'}, {'id': '2'}]
+    assert _called_urls_params(make_request) == [
+        ('http://fcc/files', {'limit': '1000', 'ordering': '-date_changed', 'owner': 'usr'}),
+        ('http://fcc/files?page=2', {}),
+    ]
+
+def test_list_files_follows_pagination_next_link(monkeypatch: MonkeyPatch, cx: CxStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, cx, [
+        {'items': [{'file_sid': '1'}], 'pagination': {'next': 'http://cx/next'}},
+        {'items': [{'file_sid': '2'}], 'pagination': {}},
+    ])
+    assert list(cx.list_files({})) == [{'file_sid': '1'}, {'file_sid': '2'}]
+    assert [url for url, _ in _called_urls_params(make_request)] == [
+        'http://cx/core/v2/storage/files',
+        'http://cx/next',
+    ]
+
+def test_list_files_pushes_cx_filters_down(monkeypatch: MonkeyPatch, cx: CxStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, cx, [{'items': []}])
+    list(cx.list_files({'name': 'like %.wav', 'file_bytes': ('gt 100',)}))
+    assert _called_urls_params(make_request)[0][1]['filter'] == \
+        'container_sid eq container and name like "%.wav" and file_bytes gt 100'
+
+def test_list_files_falls_back_to_offset(monkeypatch: MonkeyPatch, cx: CxStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, cx, [
+        {'items': [{'file_sid': '1'}, {'file_sid': '2'}], 'has_more': True},
+        {'items': [{'file_sid': '3'}], 'has_more': False},
+    ])
+    assert len(list(cx.list_files({}))) == 3
+    assert [params.get('offset') for _, params in _called_urls_params(make_request)] == [
+        None,
+        '2',
+    ]
+
+def test_list_files_pages_are_lazy(monkeypatch: MonkeyPatch, fcc: FccStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, fcc, [
+        {'items': [{'id': '1'}], 'next': 'http://fcc/files?page=2'},
+        {'items': [{'id': '2'}]},
+    ])
+    pages = fcc.list_files_pages({})
+    assert next(pages) == [{'id': '1'}]
+    make_request.assert_called_once()
+
+@pytest.mark.parametrize('body', [{}, {'items': None}, []])
+def test_list_files_invalid_json_raises_error(monkeypatch: MonkeyPatch,
+                                              fcc: FccStorage,
+                                              body: Any) -> None:
+    _arrange_pages(monkeypatch, fcc, [body])
+    with pytest.raises(StorageInteractionError):
+        list(fcc.list_files({}))
+
+def test_list_files_tabular_pages(monkeypatch: MonkeyPatch, cx: CxStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, cx, [
+        {'items': [{'file_sid': '1', 'name': 'a'}], 'has_more': True},
+        {'items': [{'file_sid': '2', 'size': '3'}]},
+    ])
+    pages, headers = cx.list_files_tabular(['size'], {})
+    assert headers == ['file_sid', 'name', 'type', 'mime_type', 'size', 'date_modified']
+    assert list(pages) == [
+        [('1', 'a', '', '', '', '')],
+        [('2', '', '', '', '3', '')],
+    ]
+    assert _called_urls_params(make_request)[0][1]['include_fields'] == \
+        'file_sid,name,type,mime_type,size,date_modified'
+
+def test_list_files_rows_projected_locally_by_fcc(monkeypatch: MonkeyPatch,
+                                                  fcc: FccStorage) -> None:
+    make_request = _arrange_pages(monkeypatch, fcc, [
+        {'items': [{'id': '1', 'name': 'a', 'batch': 'b'}, {'id': '2'}]},
+    ])
+    assert list(fcc.list_files_rows({}, ['name', 'id'])) == [[('a', '1'), ('', '2')]]
+    assert 'include_fields' not in _called_urls_params(make_request)[0][1]
+
+def test_requests_reuse_pooled_connection() -> None:
+    with serve(make_files(10)) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token'), Context(storage='fcc'))
+        for file_id in list(server.files):
+            storage.show_file(file_id)
+        assert server.requests == 10
+        assert server.connections == 1
+
+def test_delete_files_connections_bounded_by_workers() -> None:
+    with serve(make_files(50)) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token', workers=3), Context(storage='fcc'))
+        report = storage.delete_files(list(server.files))
+        assert not server.files
+        assert len(report.succeeded) == 50
+        assert server.connections <= 3
+
+def test_delete_files_concurrency_adapts_to_server() -> None:
+    with serve(make_files(300), latency=0.01) as server:
+        config = StorageConfig(server.url, 'token',
+                               retry=RetryPolicy(backoff=0),
+                               min_workers=2,
+                               max_workers=16)
+        storage = FccStorage(config, Context(storage='fcc'))
+        report = storage.delete_files(list(server.files)[:200])
+        assert len(report.succeeded) == 200
+        grown = storage.concurrency.limit
+        assert grown > 5
+        server.inject_errors(429, count=5)
+        storage.delete_files(list(server.files))
+        assert not server.files
+        assert min(limit for _, limit in storage.concurrency.changes) < grown
+        assert server.connections <= 16
+
+def test_show_files_ordered_over_pooled_connections() -> None:
+    with serve(make_files(30)) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token', workers=3), Context(storage='fcc'))
+        file_ids = [*server.files, 'missing', '00000000']
+        results = list(storage.show_files(file_ids, ordered=True))
+        assert [r.item for r in results] == file_ids[:-1]
+        assert [r.item for r in results if r.error] == ['missing']
+        assert '"00000001"' in (results[1].value or '')
+        assert server.requests == 31
+        assert server.connections <= 3
+
+def test_delete_files_reports_missing_files() -> None:
+    with serve(make_files(3)) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token'), Context(storage='fcc'))
+        report = storage.delete_files(['00000000', 'missing', '00000002'])
+        assert sorted(report.succeeded) == ['00000000', '00000002']
+        assert list(report.failed) == ['missing']
+
+def test_transient_errors_are_retried() -> None:
+    with serve(make_files(1)) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token', retry=RetryPolicy(backoff=0)),
+                             Context(storage='fcc'))
+        server.inject_errors(503, count=2)
+        server.inject_errors(429, headers={'Retry-After': '0'})
+        assert '00000000' in storage.show_file('00000000')
+        assert storage.retry_stats.retries == 3
+        assert server.requests == 4
+
+def test_requests_are_measured() -> None:
+    with serve(make_files(3)) as server:
+        storage = CxStorage(StorageConfig(server.url, 'token', retry=RetryPolicy(backoff=0)),
+                            Context(storage='cx', user='container'))
+        server.inject_errors(503)
+        assert len(list(storage.list_files({}))) == 3
+        storage.show_file('00000001')
+        with pytest.raises(StorageInteractionError):
+            storage.show_file('missing')
+        assert storage.metrics.counts == {('GET', 'files', '503'): 1,
+                                          ('GET', 'files', '200'): 1,
+                                          ('GET', 'file', '200'): 1,
+                                          ('GET', 'file', '404'): 1}
+        assert storage.metrics.retries == 1
+        assert len(storage.metrics.latencies) == 4
+        assert storage.metrics.bytes_received > 0
+        assert storage.metrics.bytes_sent == 0
+
+@pytest.mark.parametrize('chunk_size', [None, 1000])
+def test_streamed_listing_bytes_counted_as_read(chunk_size: Optional[int]) -> None:
+    with serve(make_files(2500)) as server:
+        server.chunk_size = chunk_size
+        cx = CxStorage(StorageConfig(server.url, 'token'), Context(storage='cx', user='container'))
+        assert len(list(cx.list_files({}))) == 2500
+        assert cx.metrics.bytes_received == server.bytes_sent
+        # a listing given up before its end counts what was read of it
+        files = cx.list_files({})
+        next(files)
+        del files
+        assert cx.metrics.bytes_received == server.bytes_sent
+
+def test_list_files_rows_select_fields_on_cx() -> None:
+    with serve(make_files(20)) as server:
+        cx = CxStorage(StorageConfig(server.url, 'token'), Context(storage='cx', user='container'))
+        assert len(list(cx.list_files({}))) == 20
+        full_bytes = cx.metrics.bytes_received
+        rows = [row for rows in cx.list_files_rows({}, ['file_sid', 'size']) for row in rows]
+        assert rows == [(file_sid, '') for file_sid in server.files]
+        assert cx.metrics.bytes_received - full_bytes < full_bytes / 4
+
+def test_list_files_filtered_and_ordered_by_fake_server() -> None:
+    with serve(make_files(200)) as server:
+        fcc = FccStorage(StorageConfig(server.url, 'token'), Context(storage='fcc', user='usr'))
+        files = list(fcc.list_files({'batch': 'batch-3',
+                                     'date_changed': ('gte 2023-01-18T00:01:00Z',)}))
+        assert [f['id'] for f in files] == [f'{i:08d}' for i in range(193, 60, -10)]
+        cx = CxStorage(StorageConfig(server.url, 'token'), Context(storage='cx', user='container'))
+        files = list(cx.list_files({'type': 'audio', 'file_bytes': ('lt 10240',)}))
+        assert [f['file_sid'] for f in files] == ['00000001', '00000003', '00000005',
+                                                  '00000007', '00000009']
+        other = CxStorage(StorageConfig(server.url, 'token'), Context(storage='cx', user='other'))
+        assert not list(other.list_files({}))
+
+def test_retries_exhausted_raises_error() -> None:
+    with serve(make_files(1)) as server:
+        storage = FccStorage(StorageConfig(server.url,
+                                           'token',
+                                           retry=RetryPolicy(max_attempts=2, backoff=0)),
+                             Context(storage='fcc'))
+        server.inject_errors(502, count=2)
+        with pytest.raises(StorageInteractionError):
+            storage.show_file('00000000')
+        assert server.requests == 2
+
+def test_probe_ended_by_other_error_closes_circuit_later(monkeypatch: MonkeyPatch) -> None:
+    with serve(make_files(1)) as server:
+        storage = FccStorage(StorageConfig(server.url,
+                                           'token',
+                                           retry=RetryPolicy(max_attempts=1,
+                                                             breaker_threshold=1,
+                                                             breaker_cooldown=0)),
+                             Context(storage='fcc'))
+        server.inject_errors(502, count=1)
+        with pytest.raises(StorageInteractionError):
+            storage.show_file('00000000')
+        with monkeypatch.context() as patched:
+            patched.setattr(requests.Session, 'request', Mock(side_effect=ChunkedEncodingError()))
+            with pytest.raises(StorageInteractionError):
+                storage.show_file('00000000')
+        # the failed probe did not leave the circuit open for good
+        assert '00000000' in storage.show_file('00000000')
+
+def test_unchanged_responses_are_revalidated(tmp_path: Path) -> None:
+    with serve(make_files(2500)) as server:
+        config = StorageConfig(server.url, 'token')
+        context = Context(storage='cx', user='container')
+        first = CxStorage(config, context, cache=HttpCache(tmp_path))
+        files = list(first.list_files({}))
+        details = first.show_file('00000001')
+        second = CxStorage(config, context, cache=HttpCache(tmp_path))
+        assert list(second.list_files({})) == files
+        assert second.show_file('00000001') == details
+        assert second.metrics.counts == {('GET', 'files', '304'): 3,
+                                         ('GET', 'file', '304'): 1}
+        assert second.metrics.bytes_received < first.metrics.bytes_received / 100
+        assert len(list(tmp_path.glob('*/*'))) == 4
+
+def test_changed_responses_are_fetched_again(tmp_path: Path) -> None:
+    with serve(make_files(3)) as server:
+        storage = FccStorage(StorageConfig(server.url, 'token'),
+                             Context(storage='fcc', user='usr'),
+                             cache=HttpCache(tmp_path))
+        storage.show_file('00000001')
+        server.files['00000001']['name'] = 'renamed.bin'
+        assert 'renamed.bin' in storage.show_file('00000001')
+        storage.delete_files(['00000001'])
+        with pytest.raises(StorageInteractionError):
+            storage.show_file('00000001')
+        assert storage.metrics.counts[('GET', 'file', '200')] == 2
+        assert storage.metrics.counts[('GET', 'file', '404')] == 1
+
+def _arrange_pages(monkeypatch: MonkeyPatch,
+                   storage: BaseStorage,
+                   pages: List[Any]) -> Mock:
+    # small chunks split the values of the body between them
+    mock = Mock(side_effect=[Mock(iter_content=Mock(return_value=_split(json.dumps(page).encode())))
+                             for page in pages])
+    monkeypatch.setattr(storage, '_make_request', mock)
+    return mock
+
+def _split(body: bytes, size: int = 5) -> List[bytes]:
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+def _called_urls_params(make_request: Mock) -> List[Tuple[str, Dict[str, str]]]:
+    return [(c.args[1], c.kwargs['params']) for c in make_request.call_args_list]
@@ -0,0 +1,46 @@
+from typing import Iterator, List, Optional
+
+import pytest
+from tabulate import tabulate
+
+from storcom.table import render_table
+
+_HEADERS = ['id', 'name', 'date_changed']
+
+def test_small_listing_rendered_by_tabulate() -> None:
+    rows: List[List[Optional[str]]] = [['1', 'a.bin', None], ['22', 'long-name.bin', '2023-01-01']]
+    assert list(render_table(rows, _HEADERS)) == \
+        tabulate([['1', 'a.bin', ''], ['22', 'long-name.bin', '2023-01-01']],
+                 _HEADERS,
+                 tablefmt='presto').splitlines()
+
+def test_empty_listing_has_headers() -> None:
+    assert list(render_table([], _HEADERS)) == [' id   | name   | date_changed',
+                                                '------+--------+----------------']
+
+@pytest.mark.parametrize('count', [5, 6, 50])
+def test_streamed_table_looks_like_tabulate(count: int) -> None:
+    rows = [[f'{i:04}', f'file-{i:04}.bin', '2023-01-01T00:00:00Z'] for i in range(count)]
+    assert list(render_table(rows, _HEADERS, sample_size=5)) == \
+        tabulate(rows, _HEADERS, tablefmt='presto').splitlines()
+
+def test_values_wider_than_sample_truncated() -> None:
+    rows = [['1', 'a', ''], ['2', 'b', ''], ['3', 'c', ''], ['4', 'much-longer', '']]
+    assert list(render_table(rows, _HEADERS, sample_size=2))[2:] == [
+        '    1 | a      |',
+        '    2 | b      |',
+        '    3 | c      |',
+        '    4 | much-… |',
+    ]
+
+def test_max_width_truncates_values() -> None:
+    rows = [['1', 'much-longer', '']]
+    assert list(render_table(rows, _HEADERS, max_width=6))[2] == '    1 | much-… |'
+
+def test_rows_rendered_before_listing_ends() -> None:
+    def rows() -> Iterator[List[str]]:
+        yield from ([str(i), 'name', ''] for i in range(4))
+        raise AssertionError('the listing is consumed ahead of the output')
+
+    lines = render_table(rows(), _HEADERS, sample_size=2)
+    assert [next(lines) for _ in range(6)][-1] == '    3 | name   |'
@@ -0,0 +1,108 @@
+import json
+from pathlib import Path
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from storcom import transfer
+from storcom.storage import BaseStorage, FccStorage, CxStorage
+from storcom.context import Context
+from storcom.config import StorageConfig
+from storcom.retry import RetryPolicy
+from storcom.errors import StorageInteractionError
+from storcom.fake_server import FakeStorageServer, serve
+
+_CONTENT = bytes(range(256)) * 40
+
+@pytest.mark.parametrize('storage_class, storage', [(FccStorage, 'fcc'), (CxStorage, 'cx')])
+def test_put_then_get_file(tmp_path: Path, storage_class: type, storage: str) -> None:
+    source = tmp_path / 'source.bin'
+    source.write_bytes(_CONTENT)
+    with serve() as server:
+        files = _create_storage(server, storage_class, storage)
+        created = json.loads(files.put_file(source, name='call.wav'))
+        assert created['name'] == 'call.wav'
+        assert server.contents[created['id']] == _CONTENT
+        assert files.get_file(created['id'], tmp_path / 'copy.bin') == len(_CONTENT)
+    assert (tmp_path / 'copy.bin').read_bytes() == _CONTENT
+    assert not list(tmp_path.glob('*.part*'))
+
+def test_get_file_ranged_in_parallel(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(transfer, '_PART_SIZE', 1000)
+    with serve() as server:
+        server.contents['1'] = _CONTENT
+        files = _create_storage(server, FccStorage, 'fcc', workers=4)
+        progress = []
+        files.get_file('1', tmp_path / 'copy.bin', lambda done, total: progress.append(total))
+        # a head and one request per part
+        assert server.requests == 1 + 11
+        assert server.connections <= 4
+    assert (tmp_path / 'copy.bin').read_bytes() == _CONTENT
+    assert set(progress) == {len(_CONTENT)}
+
+def test_interrupted_get_file_resumes(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(transfer, '_PART_SIZE', 1000)
+    destination = tmp_path / 'copy.bin'
+    with serve() as server:
+        server.contents['1'] = _CONTENT
+        files = _create_storage(server, FccStorage, 'fcc')
+        server.inject_errors(404, after=4)
+        with pytest.raises(StorageInteractionError):
+            files.get_file('1', destination)
+        assert not destination.exists()
+        done = json.loads((tmp_path / 'copy.bin.part.json').read_text())['done']
+        assert 3 <= len(done) < 11
+        server.requests = 0
+        files.get_file('1', destination)
+        assert server.requests == 1 + 11 - len(done)
+    assert destination.read_bytes() == _CONTENT
+    assert not list(tmp_path.glob('*.part*'))
+
+def test_changed_content_restarts_get_file(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(transfer, '_PART_SIZE', 1000)
+    destination = tmp_path / 'copy.bin'
+    with serve() as server:
+        server.contents['1'] = _CONTENT
+        files = _create_storage(server, FccStorage, 'fcc')
+        server.inject_errors(404, after=4)
+        with pytest.raises(StorageInteractionError):
+            files.get_file('1', destination)
+        server.contents['1'] = _CONTENT[::-1]
+        files.get_file('1', destination)
+    assert destination.read_bytes() == _CONTENT[::-1]
+
+def test_small_file_streamed_with_single_request(tmp_path: Path) -> None:
+    with serve() as server:
+        server.contents['1'] = b'abc'
+        files = _create_storage(server, CxStorage, 'cx')
+        assert files.get_file('1', tmp_path / 'copy.bin') == 3
+        assert server.requests == 2
+    assert (tmp_path / 'copy.bin').read_bytes() == b'abc'
+
+def test_retried_put_file_sends_whole_body(tmp_path: Path) -> None:
+    source = tmp_path / 'source.bin'
+    source.write_bytes(_CONTENT)
+    with serve() as server:
+        files = _create_storage(server, FccStorage, 'fcc')
+        server.inject_errors(429, headers={'Retry-After': '0'})
+        created = json.loads(files.put_file(source))
+        assert created['name'] == 'source.bin'
+        assert server.contents[created['id']] == _CONTENT
+        assert server.requests == 2
+
+def test_get_missing_file_raises_error(tmp_path: Path) -> None:
+    with serve() as server:
+        files = _create_storage(server, FccStorage, 'fcc')
+        with pytest.raises(StorageInteractionError):
+            files.get_file('missing', tmp_path / 'copy.bin')
+
+def _create_storage(server: FakeStorageServer,
+                    storage_class: type,
+                    storage: str,
+                    workers: int = 1) -> BaseStorage:
+    files: BaseStorage = storage_class(StorageConfig(server.url,
+                                                     'token',
+                                                     workers=workers,
+                                                     retry=RetryPolicy(backoff=0)),
+                                       Context(storage=storage, user='usr'))
+    return files
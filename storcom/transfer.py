@@ -0,0 +1,238 @@
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, TextIO
+
+import requests
+
+from storcom.errors import StorageInteractionError
+
+# size of a ranged part, smaller files are downloaded with a single request
+_PART_SIZE = 8 * 1024 * 1024
+_BLOCK_SIZE = 64 * 1024
+_PROGRESS_INTERVAL = 0.2
+
+# the storage's request method: retries, curl and error statuses are handled there
+Request = Callable[..., requests.Response]
+TransferCallback = Callable[[int, int], None]
+
+@dataclass
+class _DownloadState:
+    '''
+    Sidecar of a partial download, the parts listed as done are already in the .part file.
+    '''
+    url: str
+    size: int
+    etag: Optional[str]
+    done: List[int] = field(default_factory=list)
+
+class MultipartBody:
+    '''
+    multipart/form-data body which streams the file from disk. Its length is known upfront,
+    so it is sent with a Content-Length instead of chunked. seek(0) restarts it for a retry.
+    '''
+    def __init__(self, fields: Dict[str, str], file_field: str, path: Path, filename: str):
+        self._boundary = uuid.uuid4().hex
+        self._path = path
+        head = ''.join(f'--{self._boundary}\r\n'
+                       f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                       f'{value}\r\n' for name, value in fields.items())
+        head += (f'--{self._boundary}\r\n'
+                 f'Content-Disposition: form-data; name="{file_field}"; '
+                 f'filename="{_quote(filename)}"\r\n'
+                 'Content-Type: application/octet-stream\r\n\r\n')
+        self._head = head.encode()
+        self._tail = f'\r\n--{self._boundary}--\r\n'.encode()
+        self._length = len(self._head) + path.stat().st_size + len(self._tail)
+        self._parts: Optional[Iterator[bytes]] = None
+        self._buffer = b''
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self._boundary}'
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.seek(0)
+        return self._read_parts()
+
+    def seek(self, offset: int) -> None:
+        if offset != 0:
+            raise ValueError('Only rewinding is supported')
+        self._parts = None
+        self._buffer = b''
+
+    def read(self, size: int = -1) -> bytes:
+        if self._parts is None:
+            self._parts = self._read_parts()
+        while size < 0 or len(self._buffer) < size:
+            block = next(self._parts, None)
+            if block is None:
+                break
+            self._buffer += block
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_parts(self) -> Iterator[bytes]:
+        yield self._head
+        with open(self._path, 'rb') as f:
+            while block := f.read(_BLOCK_SIZE):
+                yield block
+        yield self._tail
+
+def show_progress(verb: str, stream: Optional[TextIO] = None) -> Optional[TransferCallback]:
+    '''
+    Throttled single-line byte counter on stderr, None when the stream is not a terminal.
+    '''
+    stream = stream or sys.stderr
+    if not stream.isatty():
+        return None
+    started = time.monotonic()
+    shown = [0.0]
+
+    def on_progress(transferred: int, total: int) -> None:
+        now = time.monotonic()
+        if now - shown[0] < _PROGRESS_INTERVAL and transferred < total:
+            return
+        shown[0] = now
+        rate = transferred / max(now - started, 1e-9) / 1024 / 1024
+        print(f'\r{verb} {transferred} of {total} bytes, {rate:.1f} MiB/s',
+              end='' if transferred < total else '\n',
+              file=stream,
+              flush=True)
+    return on_progress
+
+def download(request: Request,
+             url: str,
+             path: Path,
+             workers: int,
+             on_progress: Optional[TransferCallback] = None) -> int:
+    '''
+    Streams the content at url to path through path.part, returns the number of bytes.
+    When the server accepts ranges a big file is split into parts downloaded in parallel
+    straight into the preallocated .part file. The finished parts are recorded next to it,
+    an interrupted download carries on from them unless the content changed meanwhile.
+    '''
+    part_path = path.with_name(f'{path.name}.part')
+    state_path = path.with_name(f'{path.name}.part.json')
+    head = request('HEAD', url)
+    size = int(head.headers.get('Content-Length', -1))
+    if head.headers.get('Accept-Ranges') == 'bytes' and size > _PART_SIZE:
+        state = _load_state(state_path, url, size, head.headers.get('ETag'))
+        if not state or not part_path.is_file() or part_path.stat().st_size != size:
+            state = _DownloadState(url, size, head.headers.get('ETag'))
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+        _RangedDownload(request, part_path, state, on_progress).run(workers)
+    else:
+        size = _download_stream(request, url, part_path, on_progress)
+    os.replace(part_path, path)
+    state_path.unlink(missing_ok=True)
+    return size
+
+def _download_stream(request: Request,
+                     url: str,
+                     part_path: Path,
+                     on_progress: Optional[TransferCallback]) -> int:
+    response = request('GET', url, stream=True)
+    total = int(response.headers.get('Content-Length', 0))
+    transferred = 0
+    with response, open(part_path, 'wb') as f:
+        for block in response.iter_content(_BLOCK_SIZE):
+            f.write(block)
+            transferred += len(block)
+            if on_progress:
+                on_progress(transferred, max(total, transferred))
+    return transferred
+
+class _RangedDownload:
+    '''
+    Parts of a download fetched concurrently into their place in the mapped .part file.
+    '''
+    def __init__(self,
+                 request: Request,
+                 part_path: Path,
+                 state: _DownloadState,
+                 on_progress: Optional[TransferCallback]):
+        self._request = request
+        self._part_path = part_path
+        self._state_path = part_path.with_name(f'{part_path.name}.json')
+        self._state = state
+        self._on_progress = on_progress
+        self._lock = threading.Lock()
+        self._transferred = len(state.done) * _PART_SIZE
+
+    def run(self, workers: int) -> None:
+        parts = range((self._state.size + _PART_SIZE - 1) // _PART_SIZE)
+        with open(self._part_path, 'r+b') as f, mmap.mmap(f.fileno(), self._state.size) as mapped:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._download_part, part, mapped)
+                           for part in parts if part not in self._state.done]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    # the finished parts are kept for a resume, the queued ones are not started
+                    for future in futures:
+                        future.cancel()
+                    raise
+            mapped.flush()
+
+    def _download_part(self, part: int, mapped: mmap.mmap) -> None:
+        start = part * _PART_SIZE
+        end = min(start + _PART_SIZE, self._state.size)
+        headers = {'Range': f'bytes={start}-{end - 1}'}
+        if self._state.etag:
+            # a changed content comes back whole with 200 instead of the part
+            headers['If-Range'] = self._state.etag
+        with self._request('GET', self._state.url, headers=headers, stream=True) as response:
+            if response.status_code != 206:
+                raise StorageInteractionError(f'The content changed or ranges are not supported, '
+                                              f'remove {self._part_path} and retry')
+            offset = start
+            for block in response.iter_content(_BLOCK_SIZE):
+                if offset + len(block) > end:
+                    raise StorageInteractionError(f'Unexpected length of the range {start}-{end}')
+                mapped[offset:offset + len(block)] = block
+                offset += len(block)
+                self._on_block(len(block))
+            if offset != end:
+                raise StorageInteractionError(f'Incomplete range {start}-{end}')
+        with self._lock:
+            self._state.done.append(part)
+            _save_state(self._state_path, self._state)
+
+    def _on_block(self, length: int) -> None:
+        with self._lock:
+            self._transferred += length
+            if self._on_progress:
+                self._on_progress(min(self._transferred, self._state.size), self._state.size)
+
+def _load_state(state_path: Path,
+                url: str,
+                size: int,
+                etag: Optional[str]) -> Optional[_DownloadState]:
+    try:
+        state = _DownloadState(**json.loads(state_path.read_text(encoding='utf-8')))
+    except (OSError, ValueError, TypeError):
+        return None
+    return state if (state.url, state.size, state.etag) == (url, size, etag) else None
+
+def _save_state(state_path: Path, state: _DownloadState) -> None:
+    temporary_path = state_path.with_name(f'{state_path.name}.tmp')
+    temporary_path.write_text(json.dumps(asdict(state)), encoding='utf-8')
+    os.replace(temporary_path, state_path)
+
+def _quote(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')